@@ -0,0 +1,93 @@
+import logging
+import threading
+import time
+from typing import Callable, FrozenSet, Iterable, Optional
+from uuid import UUID
+
+from sqlalchemy import select
+
+from .database import SessionLocal
+from .metrics import CANDIDATE_CATALOG_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+def load_candidate_ids() -> FrozenSet[UUID]:
+    """IDs of every row of the candidates table."""
+    from ..models.database_models import Candidate # Models import core.database: avoid an import cycle
+    with SessionLocal() as session:
+        return frozenset(session.execute(select(Candidate.id)).scalars())
+
+
+class CandidateCatalog:
+    """
+    In-memory set of valid candidate IDs, so votes for unknown candidates are rejected by the API
+    before publishing and by the worker before opening a transaction (instead of a users upsert,
+    an FK violation and a rollback).
+
+    The set is reloaded every `refresh_seconds` by its owner (refresh_due / refresh()). A lookup
+    that misses may reload it early, at most once per `miss_refresh_seconds`, so candidates added
+    since the last refresh are accepted within seconds while junk traffic cannot cause a reload storm.
+    Until the first successful load the catalog knows nothing (contains() returns None) and votes
+    are let through: the DB foreign key still rejects unknown candidates.
+    """
+
+    def __init__(self, load: Callable[[], Iterable[UUID]], refresh_seconds: float, miss_refresh_seconds: float):
+        self._load = load
+        self._refresh_seconds = refresh_seconds
+        self._miss_refresh_seconds = miss_refresh_seconds
+        self._lock = threading.Lock()
+        self._ids: Optional[FrozenSet[UUID]] = None
+        self._attempted_at = 0.0 # time.monotonic() of the last load attempt, successful or not
+        self._miss_refresh_at = 0.0
+
+    @property
+    def loaded(self) -> bool:
+        return self._ids is not None
+
+    @property
+    def ids(self) -> FrozenSet[UUID]:
+        """Known candidate IDs (empty until the first load)."""
+        return self._ids or frozenset()
+
+    @property
+    def refresh_due(self) -> bool:
+        interval = self._refresh_seconds if self.loaded else self._miss_refresh_seconds # Retry a failed first load sooner
+        return time.monotonic() - self._attempted_at >= interval
+
+    def refresh(self) -> bool:
+        """Reloads the set (blocking DB query). On failure the previous set is kept. Returns whether it loaded."""
+        self._attempted_at = time.monotonic()
+        try:
+            ids = frozenset(self._load())
+        except Exception as e:
+            logger.warning(f"Could not load the candidate catalog, keeping the previous one: {e!r}")
+            return False
+        with self._lock:
+            self._ids = ids
+        CANDIDATE_CATALOG_SIZE.set(len(ids))
+        return True
+
+    def contains(self, candidate_id: UUID) -> Optional[bool]:
+        """Whether the candidate exists, from memory only; None if the catalog was never loaded."""
+        ids = self._ids
+        if ids is None:
+            return None
+        return candidate_id in ids
+
+    def claim_miss_refresh(self) -> bool:
+        """True if the caller may reload the catalog after a miss (then it must call refresh())."""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._miss_refresh_at < self._miss_refresh_seconds:
+                return False
+            self._miss_refresh_at = now
+            return True
+
+    def check(self, candidate_id: UUID) -> Optional[bool]:
+        """contains(), reloading the catalog once on a miss if allowed. May block on the DB."""
+        known = self.contains(candidate_id)
+        if known is False and self.claim_miss_refresh():
+            self.refresh()
+            known = self.contains(candidate_id)
+        return known
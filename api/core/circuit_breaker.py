@@ -0,0 +1,150 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from .config import settings
+from .metrics import CIRCUIT_STATE, CIRCUIT_TRANSITIONS, CIRCUIT_REJECTED
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Circuit states; the numeric value is what the vote_circuit_state gauge reports
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+# The call was interrupted, not answered: says nothing about the dependency's health
+_INTERRUPTIONS = (asyncio.CancelledError, KeyboardInterrupt, SystemExit)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit is open."""
+
+    def __init__(self, name: str):
+        super().__init__(f"Circuit '{name}' is open; dependency is failing, call not attempted.")
+        self.name = name
+
+
+class CircuitBreaker:
+    """
+    Fails fast while a dependency (RabbitMQ, Redis, PostgreSQL) is down instead of
+    paying a timeout or retry loop on every call.
+
+    - closed: calls go through; `failure_threshold` consecutive failures open the circuit.
+    - open: calls are rejected for `reset_timeout_seconds`.
+    - half_open: up to `half_open_max_calls` probe calls go through; one success closes
+      the circuit, one failure opens it again.
+
+    Use `call(fn, ...)` (`call_async` for coroutine functions), or `allow_request()` plus `record_success()` / `record_failure()`
+    when the call site handles errors itself. `is_failure` decides which exceptions count
+    against the dependency (e.g. an IntegrityError is the data's fault, not the DB's).
+    """
+
+    def __init__(self, name: str, failure_threshold: Optional[int] = None, reset_timeout_seconds: Optional[float] = None,
+                 half_open_max_calls: Optional[int] = None, is_failure: Callable[[BaseException], bool] = lambda e: True):
+        self.name = name
+        self.failure_threshold = failure_threshold or settings.CIRCUIT_FAILURE_THRESHOLD
+        self.reset_timeout = reset_timeout_seconds or settings.CIRCUIT_RESET_TIMEOUT_SECONDS
+        self.half_open_max_calls = half_open_max_calls or settings.CIRCUIT_HALF_OPEN_MAX_CALLS
+        self.is_failure = is_failure
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        CIRCUIT_STATE.labels(breaker=name).set(_STATE_VALUES[CLOSED])
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def _transition(self, state: str):
+        # Caller holds the lock
+        if state == self._state:
+            return
+        logger.warning("Circuit '%s' %s -> %s.", self.name, self._state, state)
+        self._state = state
+        CIRCUIT_STATE.labels(breaker=self.name).set(_STATE_VALUES[state])
+        CIRCUIT_TRANSITIONS.labels(breaker=self.name, state=state).inc()
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+        elif state == HALF_OPEN:
+            self._half_open_calls = 0
+        else:
+            self._failures = 0
+
+    def _maybe_half_open(self):
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._transition(HALF_OPEN)
+
+    def allow_request(self) -> bool:
+        """True if the call may go ahead. Every allowed call must be followed by record_success/record_failure (or release)."""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and self._half_open_calls < self.half_open_max_calls:
+                self._half_open_calls += 1
+                return True
+        CIRCUIT_REJECTED.labels(breaker=self.name).inc()
+        return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            if self._state == HALF_OPEN:
+                self._transition(CLOSED)
+
+    def release(self):
+        """Ends an allowed call that was interrupted before the dependency answered; records nothing."""
+        with self._lock:
+            if self._state == HALF_OPEN and self._half_open_calls > 0:
+                self._half_open_calls -= 1 # Free the probe slot, or the circuit could never close again
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                self._transition(OPEN)
+
+    def call(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        """Calls fn through the breaker. Raises CircuitOpenError without calling fn while open."""
+        if not self.allow_request():
+            raise CircuitOpenError(self.name)
+        try:
+            result = fn(*args, **kwargs)
+        except _INTERRUPTIONS:
+            self.release()
+            raise
+        except BaseException as e:
+            if self.is_failure(e):
+                self.record_failure()
+            else:
+                self.record_success() # The dependency answered; the error is the caller's
+            raise
+        self.record_success()
+        return result
+
+    async def call_async(self, fn: Callable[..., Awaitable[T]], *args, **kwargs) -> T:
+        """call() for coroutine functions (e.g. redis.asyncio commands)."""
+        if not self.allow_request():
+            raise CircuitOpenError(self.name)
+        try:
+            result = await fn(*args, **kwargs)
+        except _INTERRUPTIONS:
+            self.release()
+            raise
+        except BaseException as e:
+            if self.is_failure(e):
+                self.record_failure()
+            else:
+                self.record_success() # The dependency answered; the error is the caller's
+            raise
+        self.record_success()
+        return result
@@ -3,15 +3,113 @@ from typing import Optional
 
 class Settings(BaseSettings):
     DATABASE_URL: str
+    DATABASE_EXPORT_URL: Optional[str] = None # Database read by vote exports (e.g. a read replica); defaults to DATABASE_URL
+    EXPORT_MAX_CONCURRENT: int = 2 # Connections of the export engine = exports that can run at once (per process)
+    EXPORT_CHUNK_ROWS: int = 5000 # Rows fetched from the server-side cursor and written per chunk
+    ARCHIVE_DIR: str = "/var/lib/vote-archive" # Parquet archives of closed rounds (see core/vote_archive.py)
+    ARCHIVE_BATCH_ROWS: int = 50000 # Rows fetched from the server-side cursor per Parquet record batch
+    ARCHIVE_FILE_ROWS: int = 1000000 # Rows per archive file
+    ARCHIVE_DELETE_BATCH: int = 5000 # Votes deleted from the hot table per transaction
+    ADMIN_API_TOKEN: str = "" # Bearer token for /api/v1/admin endpoints; empty disables them
     RABBITMQ_URL: str
     RABBITMQ_QUEUE_NAME: str
     RABBITMQ_DLX_EXCHANGE: str = "vote_dlx" # Default DLX name
     RABBITMQ_DLQ_QUEUE: str = "vote_dlq"   # Default DLQ name
+    RABBITMQ_ROUTING_MODE: str = "single" # 'single', 'sharded' or 'consistent_hash' (see core/queue_topology.py)
+    RABBITMQ_SHARD_COUNT: int = 4 # Number of vote queue shards in sharded modes
+    RABBITMQ_SHARD_EXCHANGE: str = "vote_shards" # x-consistent-hash exchange used in 'consistent_hash' mode
+    RABBITMQ_QUEUE_TYPE: str = "classic" # 'classic', 'quorum' (replicated) or 'stream' (replicated log)
+    RABBITMQ_PUBLISHER_CONFIRMS: bool = False # Wait for the broker to confirm each publish
     REDIS_URL: str
     JWT_SECRET_KEY: str
     JWT_ALGORITHM: str
     RESULTS_CACHE_TTL_SECONDS: int = 60
-    WORKER_RECONNECT_DELAY_SECONDS: int = 5 # Delay for worker reconnects
+    RESULTS_CACHE_REPLICAS: int = 4 # Copies of the results cache under different cluster slots (see redis_keys)
+    VOTE_COUNTER_SHARDS: int = 16 # Redis hashes the vote counts are spread over (see redis_keys)
+    RESULTS_SNAPSHOT_REFRESH_SECONDS: float = 5.0 # Background refresh of the in-memory results snapshot
+    RESULTS_SNAPSHOT_MAX_STALENESS_SECONDS: float = 300.0 # Older snapshots are not served; /results answers 503
+    VOTE_BATCH_MAX_ITEMS: int = 500 # Max votes per POST /votes:batch request
+    IDEMPOTENCY_TTL_SECONDS: int = 3600 # How long an Idempotency-Key's response is replayed
+    IDEMPOTENCY_PENDING_TTL_SECONDS: int = 30 # Claim on a key whose request is still in flight
+    IDEMPOTENCY_LRU_SIZE: int = 10000 # Keys remembered in process memory (per API process)
+    CANDIDATE_CATALOG_REFRESH_SECONDS: float = 60.0 # Reload of the in-memory set of valid candidates (API and workers)
+    CANDIDATE_CATALOG_MISS_REFRESH_SECONDS: float = 5.0 # Min interval between early reloads after an unknown candidate
+    VOTE_RECEIPT_TTL_SECONDS: int = 86400 # How long GET /vote/{receipt} knows a vote's outcome
+    VOTE_RECEIPT_BUCKET_SECONDS: int = 3600 # Receipts issued in the same window share Redis hashes (see redis_keys)
+    ROLLUP_MINUTE_TTL_SECONDS: int = 172800 # How long per-minute vote rollups stay in Redis
+    ROLLUP_HOUR_TTL_SECONDS: int = 2592000 # How long per-hour vote rollups stay in Redis
+    ROLLUP_MIRROR_INTERVAL_SECONDS: float = 60.0 # How often a worker refreshes the vote_rollups table
+    ROLLUP_MIRROR_LOOKBACK_SECONDS: int = 900 # Minutes of vote_timestamp recomputed on each refresh (covers late votes)
+    ROLLUP_TIMELINE_MINUTE_MAX_SECONDS: int = 21600 # /results/timeline uses minute buckets for ranges up to this long
+    ROLLUP_TIMELINE_MAX_BUCKETS: int = 10000 # Longest range /results/timeline reads, in buckets
+    WORKER_METRICS_PORT: int = 9100 # Port for the worker's Prometheus HTTP exporter
+    WORKER_SHARDS: str = "" # Comma-separated shard indices this worker consumes (empty = all shards)
+    WORKER_STREAM_OFFSET: str = "next" # Where a stream consumer starts: 'first', 'last', 'next' or an offset
+    WORKER_RETRY_DELAYS_SECONDS: str = "2,10,60" # Delay queue tiers for votes whose DB write failed transiently
+    WORKER_COUNTER_SHARD: int = -1 # Vote counter shard this worker increments (-1 = a random shard per batch)
+    # Adaptive flow control: prefetch and DB batch size move between these bounds
+    WORKER_PREFETCH_INITIAL: int = 10
+    WORKER_PREFETCH_MIN: int = 5
+    WORKER_PREFETCH_MAX: int = 500
+    WORKER_BATCH_SIZE_INITIAL: int = 10
+    WORKER_BATCH_SIZE_MIN: int = 1
+    WORKER_BATCH_SIZE_MAX: int = 200
+    WORKER_BATCH_MAX_WAIT_SECONDS: float = 0.05 # Flush a partial batch after this long
+    WORKER_FLOW_CONTROL_INTERVAL_SECONDS: float = 5.0 # How often queue depth is sampled and limits adjusted
+    WORKER_DB_TARGET_LATENCY_SECONDS: float = 0.25 # Back off when smoothed batch commit latency exceeds this
+    WORKER_DB_MAX_ERROR_RATE: float = 0.2 # Back off when the smoothed batch error rate exceeds this
+    # Abuse detection in the worker (workers/abuse_detector.py); counts and thresholds are per worker process
+    ABUSE_ACTION: str = "flag" # 'flag' (store as 'validating'), 'quarantine' (also is_valid=false, not counted) or 'off'
+    ABUSE_WINDOW_SECONDS: int = 60 # Sliding window over vote_timestamp
+    ABUSE_WINDOW_BUCKETS: int = 6 # Sub-windows the window slides by
+    ABUSE_SKETCH_WIDTH: int = 16384 # Counters per sketch row; more = fewer overestimates
+    ABUSE_SKETCH_DEPTH: int = 4 # Sketch rows (hash functions)
+    ABUSE_IP_THRESHOLD: int = 30 # Votes per window from one source IP before its votes are flagged (0 = never)
+    ABUSE_IP_BLOCK_THRESHOLD: int = 300 # Same for one /24 (IPv6: /48) network
+    ABUSE_USER_AGENT_THRESHOLD: int = 0 # Same for one User-Agent string (0 = only tracked and logged)
+    ABUSE_TOP_K: int = 10 # Heaviest sources kept per dimension for the offender log
+    # Background (re)connection to RabbitMQ and Redis (see core/connections.py)
+    RECONNECT_BACKOFF_INITIAL_SECONDS: float = 0.5
+    RECONNECT_BACKOFF_MAX_SECONDS: float = 30.0
+    CONNECTION_CHECK_INTERVAL_SECONDS: float = 5.0 # How often a held connection is checked
+    REDIS_SOCKET_TIMEOUT_SECONDS: float = 1.0 # Connect/read timeout for Redis calls
+    RABBITMQ_SOCKET_TIMEOUT_SECONDS: float = 2.0 # API's RabbitMQ socket connect timeout (the whole handshake gets twice that)
+    RABBITMQ_BLOCKED_CONNECTION_TIMEOUT_SECONDS: float = 5.0 # API drops a connection the broker blocks (e.g. memory alarm) this long
+    REDIS_POOL_MAX_CONNECTIONS: int = 50 # Per API process, shared by all concurrent requests
+    REDIS_CALL_TIMEOUT_SECONDS: float = 0.5 # Bound on one API cache/rate limit call
+    # API server (gunicorn with uvicorn workers, see api/gunicorn_conf.py)
+    API_BIND: str = "0.0.0.0:8000"
+    API_WORKERS: int = 0 # Worker processes; 0 = one per CPU core
+    API_PRELOAD: bool = True # Import the app once in the master before forking workers
+    API_GRACEFUL_TIMEOUT_SECONDS: int = 30 # Time workers get to finish in-flight requests on shutdown
+    API_KEEPALIVE_SECONDS: int = 5
+    API_MAX_REQUESTS: int = 0 # Recycle a worker after this many requests (0 = never)
+    # Health probes behind /healthz and /readyz (see services/health_service.py)
+    HEALTH_PROBE_INTERVAL_SECONDS: float = 2.0 # Probes run in the background; endpoints serve the cached result
+    HEALTH_PROBE_TIMEOUT_SECONDS: float = 1.0 # A probe slower than this counts as failed
+    HEALTH_REQUIRED_CHECKS: str = "rabbitmq,db_pool" # Checks that must pass for /readyz (of rabbitmq, redis, db, db_pool)
+    HEALTH_DB_POOL_MAX_UTILIZATION: float = 0.9 # db_pool fails above this share of checked-out connections
+    # Circuit breakers around RabbitMQ, Redis and PostgreSQL (see core/circuit_breaker.py)
+    CIRCUIT_FAILURE_THRESHOLD: int = 5 # Consecutive failures that open a circuit
+    CIRCUIT_RESET_TIMEOUT_SECONDS: float = 10.0 # Time a circuit stays open before a probe call is let through
+    CIRCUIT_HALF_OPEN_MAX_CALLS: int = 1 # Concurrent probe calls allowed while half-open
+    # Local spool at the API for votes the broker cannot accept (see services/vote_spool.py)
+    VOTE_SPOOL_ENABLED: bool = True
+    VOTE_SPOOL_DIR: str = "vote_spool"
+    VOTE_SPOOL_SEGMENT_BYTES: int = 16 * 1024 * 1024 # Size of one memory-mapped segment file
+    VOTE_SPOOL_MAX_BYTES: int = 1024 * 1024 * 1024 # Disk budget; votes are refused with 503 beyond it
+    VOTE_SPOOL_FSYNC_INTERVAL_SECONDS: float = 0.1 # Max time an accepted vote stays unflushed
+    VOTE_SPOOL_FSYNC_BATCH: int = 100 # Flush after this many appends, whichever comes first
+    VOTE_SPOOL_REPLAY_INTERVAL_SECONDS: float = 1.0 # How often the spool is drained to the broker
+    VOTE_SPOOL_REPLAY_BATCH: int = 500 # Max votes replayed per drain step
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "text" # 'text' or 'json' (structured)
+    LOG_SUMMARY_INTERVAL_SECONDS: int = 30 # How often per-vote event counts are logged at INFO
+    LOG_EVENT_SAMPLE_RATE: float = 1.0 # Fraction of per-vote DEBUG events actually emitted
+    TRACING_EXPORTER: str = "none" # 'none', 'otlp' (collector over HTTP) or 'file' (JSON lines)
+    TRACING_OTLP_ENDPOINT: str = "http://localhost:4318/v1/traces"
+    TRACING_FILE_PATH: str = "traces.jsonl"
+    TRACING_SAMPLE_RATIO: float = 1.0 # Fraction of vote requests traced at the API; workers follow the parent
 
     model_config = SettingsConfigDict(env_file=".env", extra='ignore') # 'ignore' for unknown fields
 
@@ -0,0 +1,153 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Generic, Optional, TypeVar
+
+from .config import settings
+from .metrics import DEPENDENCY_UP
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class Backoff:
+    """Exponential backoff with full jitter: delays grow from `initial` up to `maximum` until reset()."""
+
+    def __init__(self, initial: Optional[float] = None, maximum: Optional[float] = None):
+        self.initial = initial or settings.RECONNECT_BACKOFF_INITIAL_SECONDS
+        self.maximum = maximum or settings.RECONNECT_BACKOFF_MAX_SECONDS
+        self._attempt = 0
+
+    def next_delay(self) -> float:
+        ceiling = min(self.maximum, self.initial * (2 ** self._attempt))
+        self._attempt += 1
+        return random.uniform(ceiling / 2, ceiling) # Jitter spreads reconnects of many processes
+
+    def reset(self):
+        self._attempt = 0
+
+
+class ConnectionThread:
+    """
+    The one thread allowed to touch a connection that is not thread-safe (pika.BlockingConnection):
+    connecting, publishing, servicing heartbeats and closing all run here, in submission order.
+    call() blocks the calling thread; call_async() lets the event loop carry on meanwhile.
+    Calls made from the thread itself (e.g. a publish that invalidates the connection) run inline.
+    """
+
+    def __init__(self, name: str):
+        self._ident: Optional[int] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name, initializer=self._register)
+
+    def _register(self):
+        self._ident = threading.get_ident()
+
+    def call(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        if threading.get_ident() == self._ident:
+            return fn(*args, **kwargs)
+        return self._executor.submit(fn, *args, **kwargs).result()
+
+    async def call_async(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        context = contextvars.copy_context() # Keep the request's trace context, like asyncio.to_thread
+        future = self._executor.submit(functools.partial(context.run, fn, *args, **kwargs))
+        return await asyncio.wrap_future(future)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+
+class ConnectionManager(Generic[T]):
+    """
+    Owns the connection to one dependency and keeps it up from a background thread.
+
+    Nothing connects at construction: start() returns immediately and the thread
+    connects with backoff, so a dependency that is down at boot neither delays startup
+    nor stays disconnected forever. `current` is the live connection or None (callers
+    degrade or fail fast); `ready` reports whether it is usable, for readiness checks.
+    The thread re-checks the connection every `check_interval` seconds with `is_alive`
+    and reconnects when it fails or a caller reports it broken with invalidate().
+    """
+
+    def __init__(self, name: str, connect: Callable[[], T], close: Optional[Callable[[T], None]] = None,
+                 is_alive: Optional[Callable[[T], bool]] = None, check_interval: Optional[float] = None):
+        self.name = name
+        self._connect = connect
+        self._close = close
+        self._is_alive = is_alive
+        self._check_interval = check_interval or settings.CONNECTION_CHECK_INTERVAL_SECONDS
+        self._backoff = Backoff()
+        self._current: Optional[T] = None
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        DEPENDENCY_UP.labels(dependency=name).set(0)
+
+    @property
+    def current(self) -> Optional[T]:
+        return self._current
+
+    @property
+    def ready(self) -> bool:
+        return self._current is not None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=f"{self.name}-connection", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stopping.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._drop(self._current)
+
+    def invalidate(self, connection: Optional[T] = None):
+        """Reports the connection as broken (e.g. after a failed call); the thread reconnects."""
+        if connection is None or connection is self._current:
+            self._drop(self._current)
+            self._wake.set()
+
+    def _drop(self, connection: Optional[T]):
+        if connection is None:
+            return
+        if connection is self._current:
+            self._current = None
+            DEPENDENCY_UP.labels(dependency=self.name).set(0)
+        if self._close is not None:
+            try:
+                self._close(connection)
+            except Exception as e:
+                logger.debug("Error closing %s connection: %s", self.name, e)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            connection = self._current
+            if connection is None:
+                try:
+                    self._current = self._connect()
+                    self._backoff.reset()
+                    DEPENDENCY_UP.labels(dependency=self.name).set(1)
+                    logger.info("Connected to %s.", self.name)
+                    continue
+                except Exception as e:
+                    delay = self._backoff.next_delay()
+                    logger.warning("Connecting to %s failed: %r. Retrying in %.1fs.", self.name, e, delay)
+                    self._stopping.wait(delay)
+                    continue
+
+            self._wake.wait(self._check_interval)
+            self._wake.clear()
+            if self._is_alive is not None and self._current is connection:
+                try:
+                    alive = self._is_alive(connection)
+                except Exception:
+                    alive = False
+                if not alive:
+                    logger.warning("Lost connection to %s. Reconnecting.", self.name)
+                    self._drop(connection)
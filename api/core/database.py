@@ -1,4 +1,5 @@
 from sqlalchemy import create_engine
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError, TimeoutError as PoolTimeoutError
 from sqlalchemy.orm import sessionmaker, declarative_base
 from .config import settings
 import logging
@@ -11,10 +12,12 @@ SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL.replace("postgresql://", "postgr
 
 # Create SQLAlchemy engine
 # pool_size and max_overflow should be tuned based on load and database limits
+DB_POOL_SIZE = 10 # Adjust pool size based on expected load
+DB_MAX_OVERFLOW = 20 # Allow overflow connections up to this limit
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
-    pool_size=10, # Adjust pool size based on expected load
-    max_overflow=20, # Allow overflow connections up to this limit
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
     pool_timeout=30, # Time in seconds before giving up establishing a connection
     # Add other connection parameters if necessary, e.g., connect_args={"options": "-c timezone=utc"}
 )
@@ -24,6 +27,22 @@ engine = create_engine(
 # autoflush=False: Objects are not flushed to the database automatically
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# SQLSTATEs of transactions PostgreSQL aborted only because of concurrent ones
+_RETRYABLE_SQLSTATES = {"40001", "40P01"} # serialization_failure, deadlock_detected
+
+def is_transient_db_error(e: BaseException) -> bool:
+    """
+    DB/connection errors worth retrying: lost or unusable connections, an exhausted pool,
+    serialization failures and deadlocks. Anything else (IntegrityError, DataError such as a
+    malformed INET, ProgrammingError, ...) fails again on retry and is never transient.
+    Also decides which errors count against the PostgreSQL circuit breaker.
+    """
+    if isinstance(e, (OperationalError, InterfaceError, PoolTimeoutError)):
+        return True
+    if isinstance(e, DBAPIError):
+        return e.connection_invalidated or getattr(e.orig, "pgcode", None) in _RETRYABLE_SQLSTATES
+    return False
+
 # Base class for SQLAlchemy models
 Base = declarative_base()
 
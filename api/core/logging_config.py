@@ -0,0 +1,141 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+from .config import settings
+
+# Attributes every LogRecord has; anything else was passed via `extra=` and is emitted as a structured field
+_STANDARD_RECORD_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None)).keys()) | {"message", "asctime"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as single-line JSON, including any `extra=` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(service_name: str):
+    """
+    Configures root logging once per process.
+    Records are handed to a QueueHandler so the calling thread never blocks on
+    stream/disk I/O; a QueueListener thread does the actual formatting and writing.
+    """
+    global _listener
+    if _listener is not None:
+        return # Already configured in this process
+
+    if settings.LOG_FORMAT == "json":
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter("%(asctime)s %(levelname)s [%(name)s] %(message)s")
+
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(formatter)
+
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(-1) # Unbounded: never block the hot path
+    root = logging.getLogger()
+    root.handlers.clear()
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(settings.LOG_LEVEL.upper())
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(lambda: _listener.stop()) # Flush queued records on interpreter exit
+    # The listener thread does not survive fork (e.g. gunicorn --preload): restart it in the child
+    os.register_at_fork(after_in_child=_restart_listener_after_fork)
+
+    logging.getLogger(__name__).info("Logging configured for %s (level=%s, format=%s).",
+                                     service_name, settings.LOG_LEVEL, settings.LOG_FORMAT)
+
+
+def _restart_listener_after_fork():
+    """Gives a forked child its own queue and listener thread, writing to the same handlers."""
+    global _listener
+    if _listener is None:
+        return
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(-1) # The parent's queue may hold a lock taken at fork
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, logging.handlers.QueueHandler):
+            handler.queue = log_queue
+    _listener = logging.handlers.QueueListener(log_queue, *_listener.handlers, respect_handler_level=True)
+    _listener.start()
+
+
+class EventLog:
+    """
+    Cheap per-vote event logging for hot paths.
+
+    `event()` always counts the event; the per-event DEBUG line is only formatted
+    when DEBUG is enabled and the event is sampled. Counts are emitted as a single
+    aggregated INFO line every `LOG_SUMMARY_INTERVAL_SECONDS`, so INFO log volume
+    stays constant regardless of vote rate. The summary is emitted by the first
+    event after the interval elapses, or by flush(), which owners call on a timer
+    (so a burst is reported once traffic stops) and with force=True at shutdown.
+    """
+
+    def __init__(self, logger: logging.Logger, name: str):
+        self._logger = logger
+        self._name = name
+        self._interval = settings.LOG_SUMMARY_INTERVAL_SECONDS
+        self._sample_rate = settings.LOG_EVENT_SAMPLE_RATE
+        self._counts: Dict[str, int] = {}
+        self._window_started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take_summary(self, force: bool = False) -> Optional[Tuple[Dict[str, int], float]]:
+        """Ends the window if it is over (or `force`). Must be called with the lock held."""
+        now = time.monotonic()
+        if not force and now - self._window_started < self._interval:
+            return None
+        summary, elapsed = self._counts, now - self._window_started
+        self._counts, self._window_started = {}, now
+        return (summary, elapsed) if summary else None
+
+    def _log_summary(self, summary: Dict[str, int], elapsed: float):
+        self._logger.info(
+            "%s summary over %.0fs: %s", self._name, elapsed,
+            ", ".join(f"{k}={v}" for k, v in sorted(summary.items())),
+            extra={"event": "summary", "counts": summary},
+        )
+
+    def event(self, event: str, msg: Optional[str] = None, *args):
+        """Counts `event` and logs `msg % args` at DEBUG for a sample of events."""
+        with self._lock:
+            self._counts[event] = self._counts.get(event, 0) + 1
+            summary = self._take_summary()
+
+        if msg is not None and self._logger.isEnabledFor(logging.DEBUG) \
+                and (self._sample_rate >= 1.0 or random.random() < self._sample_rate):
+            self._logger.debug(msg, *args, extra={"event": event})
+
+        if summary:
+            self._log_summary(*summary)
+
+    def flush(self, force: bool = False):
+        """Logs the summary if the interval has elapsed (or right away with `force`) and there is anything to report."""
+        with self._lock:
+            summary = self._take_summary(force)
+        if summary:
+            self._log_summary(*summary)
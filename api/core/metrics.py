@@ -0,0 +1,113 @@
+import functools
+
+from prometheus_client import Counter, Gauge, Histogram
+
+# Prometheus metrics shared by the API and the workers.
+# Both processes import this module; each exposes its own registry
+# (API via /metrics, worker via the standalone HTTP exporter).
+# Under gunicorn the API workers share PROMETHEUS_MULTIPROC_DIR and /metrics aggregates them;
+# gauges then carry a `pid` label unless their multiprocess_mode says how to combine them.
+
+
+def time_async(histogram):
+    """Decorator timing a coroutine function (Histogram.time() as a decorator would only time creating the coroutine)."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with histogram.time():
+                return await fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# Buckets tuned for sub-second hot-path operations (seconds)
+FAST_OPERATION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+# Queue lag can be much longer than a single operation when a backlog builds up
+QUEUE_LAG_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0)
+
+# --- API ---
+PUBLISH_LATENCY = Histogram(
+    "vote_publish_duration_seconds",
+    "Time spent publishing a vote message to RabbitMQ (including retries).",
+    buckets=FAST_OPERATION_BUCKETS,
+)
+RATE_LIMIT_LATENCY = Histogram(
+    "rate_limit_check_duration_seconds",
+    "Time spent in the Redis rate limit check.",
+    buckets=FAST_OPERATION_BUCKETS,
+)
+CACHE_OPERATION_LATENCY = Histogram(
+    "results_cache_operation_duration_seconds",
+    "Time spent reading or writing the results cache.",
+    ["operation"], # get_results | get_results_raw | set_results
+    buckets=FAST_OPERATION_BUCKETS,
+)
+RESULTS_CACHE_REQUESTS = Counter(
+    "results_cache_requests_total",
+    "Results cache lookups by outcome.",
+    ["result"], # hit | miss | error
+)
+IDEMPOTENT_REPLAYS = Counter(
+    "vote_idempotent_replays_total",
+    "POST /vote retries answered from a stored Idempotency-Key response instead of publishing again.",
+    ["source"], # memory | redis
+)
+RESULTS_STALE_SERVED = Counter(
+    "results_stale_served_total",
+    "Results pages served from the in-memory snapshot because Redis or the DB was unavailable.",
+)
+RESULTS_SNAPSHOT_AGE = Gauge(
+    "results_snapshot_age_seconds",
+    "Age of the in-memory results snapshot when last refreshed or served.",
+)
+
+# --- Worker ---
+MESSAGE_HANDLING_LATENCY = Histogram(
+    "vote_message_handling_duration_seconds",
+    "Time spent handling a single vote message in the consumer callback.",
+    buckets=FAST_OPERATION_BUCKETS,
+)
+DB_TRANSACTION_LATENCY = Histogram(
+    "vote_db_transaction_duration_seconds",
+    "Time spent in the vote DB transaction (including retries).",
+    buckets=FAST_OPERATION_BUCKETS,
+)
+REDIS_INCREMENT_LATENCY = Histogram(
+    "vote_redis_increment_duration_seconds",
+    "Time spent incrementing the candidate vote counter in Redis.",
+    buckets=FAST_OPERATION_BUCKETS,
+)
+QUEUE_LAG = Histogram(
+    "vote_queue_lag_seconds",
+    "Delay between the API accepting a vote and the worker receiving it.",
+    buckets=QUEUE_LAG_BUCKETS,
+)
+VOTE_MESSAGES = Counter(
+    "vote_messages_total",
+    "Vote messages handled by the worker, by outcome.",
+    # processed | duplicate: acked after the DB transaction
+    # retry: DB write failed transiently, message moved to a delay queue
+    # failed: DB processing failed (permanently or after the last retry), message rejected to the DLQ
+    # dlq: message rejected to the DLQ before processing (malformed payload, bad token, unknown candidate)
+    ["outcome"],
+)
+VOTE_BATCH_SIZE = Histogram(
+    "vote_batch_size",
+    "Number of votes written per DB batch.",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500),
+)
+QUEUE_DEPTH = Gauge("vote_queue_depth", "Messages ready in the vote queue, as last sampled by the worker.")
+WORKER_PREFETCH = Gauge("vote_worker_prefetch", "Current consumer prefetch count chosen by flow control.")
+WORKER_BATCH_SIZE = Gauge("vote_worker_batch_size", "Current DB batch size chosen by flow control.")
+SPOOL_APPENDED = Counter("vote_spool_appended_total", "Votes written to the local spool because the broker was unavailable.")
+SPOOL_REPLAYED = Counter("vote_spool_replayed_total", "Spooled votes successfully published to the broker.")
+SPOOL_REJECTED = Counter("vote_spool_rejected_total", "Votes refused because the spool disk budget was exhausted.")
+SPOOL_BYTES = Gauge("vote_spool_bytes", "Bytes of spooled votes waiting for replay.", multiprocess_mode="livesum")
+CIRCUIT_STATE = Gauge("vote_circuit_state", "Circuit breaker state per dependency (0=closed, 1=half-open, 2=open).", ["breaker"])
+CIRCUIT_TRANSITIONS = Counter("vote_circuit_transitions_total", "Circuit breaker state changes, by new state.", ["breaker", "state"])
+CIRCUIT_REJECTED = Counter("vote_circuit_rejected_total", "Calls rejected without reaching the dependency because its circuit was open.", ["breaker"])
+DEPENDENCY_UP = Gauge("vote_dependency_up", "Whether this process currently holds a live connection to the dependency.", ["dependency"])
+HEALTH_CHECK_STATUS = Gauge("vote_health_check_ok", "Result of the latest background health probe (1=ok, 0=failing).", ["check"])
+CANDIDATE_CATALOG_SIZE = Gauge("vote_candidate_catalog_size", "Candidates in the in-memory catalog used to validate votes.", multiprocess_mode="livemax")
+UNKNOWN_CANDIDATE_VOTES = Counter("vote_unknown_candidate_total", "Votes rejected because their candidate is not in the catalog, by where they were stopped.", ["stage"])
+ABUSE_FLAGGED_VOTES = Counter("vote_abuse_flagged_total", "Votes whose source exceeded an abuse detection threshold, by dimension (ip, ip_block, user_agent).", ["dimension"])
+DB_POOL_UTILIZATION = Gauge("vote_db_pool_utilization", "Share of the SQLAlchemy pool capacity (size + overflow) checked out.")
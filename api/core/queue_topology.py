@@ -0,0 +1,143 @@
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+from .config import settings
+
+# RabbitMQ layout for vote messages, shared by the API (publisher) and the workers (consumers).
+#
+# RABBITMQ_ROUTING_MODE:
+# - 'single': one durable queue RABBITMQ_QUEUE_NAME on the default exchange (original layout).
+# - 'sharded': RABBITMQ_SHARD_COUNT queues '<queue>.shard.<n>'; the API picks the shard
+#   from a stable hash of the user key and publishes through the default exchange.
+# - 'consistent_hash': the same shard queues, bound with equal weight to an
+#   'x-consistent-hash' exchange (rabbitmq_consistent_hash_exchange plugin) that routes
+#   on the user key; the broker does the hashing.
+# In both sharded modes all votes of one user land in the same queue, which preserves
+# per-user ordering and keeps duplicate detection for that user on one consumer.
+#
+# RABBITMQ_QUEUE_TYPE selects the queue implementation ('classic', 'quorum' or 'stream');
+# see vote_queue_arguments().
+#
+# Retries: a vote whose DB write failed transiently is re-published by the worker to a delay
+# queue '<queue>.retry.<seconds>' (one per WORKER_RETRY_DELAYS_SECONDS tier). Delay queues have
+# no consumers; when the message TTL expires the broker dead-letters the vote back to '<queue>'
+# through the default exchange. RETRY_ATTEMPT_HEADER counts the retries so far; after the last
+# tier the vote is rejected to the DLQ.
+#
+# Rejections: the worker puts a copy of a rejected vote on RABBITMQ_DLQ_QUEUE with
+# REJECTION_REASON_HEADER (why) and ORIGINAL_QUEUE_HEADER (where it was consumed from), and
+# acks the original once the broker confirms the copy. The DLQ replayer archives votes rejected
+# for a PERMANENT_REJECTION_REASONS reason, re-publishes the others to their original queue and
+# counts its re-publishes in REPLAY_COUNT_HEADER.
+
+RETRY_ATTEMPT_HEADER = "x-vote-retry-attempt"
+REJECTION_REASON_HEADER = "x-vote-rejection-reason"
+ORIGINAL_QUEUE_HEADER = "x-vote-original-queue"
+REPLAY_COUNT_HEADER = "x-vote-replay-count"
+
+# Reprocessing cannot change the outcome: the message itself is bad (see InvalidVoteMessage),
+# names no known candidate, or the DB refused it for good (e.g. a DataError)
+PERMANENT_REJECTION_REASONS = frozenset({"bad_json", "missing_fields", "bad_data", "bad_jwt", "unknown_candidate", "db_rejected"})
+
+ROUTING_MODES = ("single", "sharded", "consistent_hash")
+
+
+def is_sharded() -> bool:
+    return settings.RABBITMQ_ROUTING_MODE in ("sharded", "consistent_hash")
+
+
+def shard_queue_name(shard: int) -> str:
+    return f"{settings.RABBITMQ_QUEUE_NAME}.shard.{shard}"
+
+
+def vote_queue_names() -> List[str]:
+    """All queues vote messages can be published to."""
+    if not is_sharded():
+        return [settings.RABBITMQ_QUEUE_NAME]
+    return [shard_queue_name(shard) for shard in range(settings.RABBITMQ_SHARD_COUNT)]
+
+
+def worker_queue_names() -> List[str]:
+    """Queues this worker consumes from: the shards in WORKER_SHARDS (e.g. '0,2'), or all of them."""
+    if not is_sharded() or not settings.WORKER_SHARDS.strip():
+        return vote_queue_names()
+    shards = sorted({int(part) for part in settings.WORKER_SHARDS.split(",") if part.strip()})
+    invalid = [shard for shard in shards if not 0 <= shard < settings.RABBITMQ_SHARD_COUNT]
+    if invalid:
+        raise ValueError(f"WORKER_SHARDS {invalid} out of range for RABBITMQ_SHARD_COUNT={settings.RABBITMQ_SHARD_COUNT}")
+    return [shard_queue_name(shard) for shard in shards]
+
+
+def shard_for_key(key: str) -> int:
+    """Stable shard for a routing key (crc32; Python's hash() is randomized per process)."""
+    return zlib.crc32(key.encode("utf-8")) % settings.RABBITMQ_SHARD_COUNT
+
+
+def publish_target(user_key: str) -> Tuple[str, str]:
+    """Returns (exchange, routing_key) to publish a vote of the given user."""
+    mode = settings.RABBITMQ_ROUTING_MODE
+    if mode == "sharded":
+        return "", shard_queue_name(shard_for_key(user_key))
+    if mode == "consistent_hash":
+        return settings.RABBITMQ_SHARD_EXCHANGE, user_key
+    return "", settings.RABBITMQ_QUEUE_NAME # Default exchange for direct-to-queue
+
+
+def vote_queue_arguments() -> Dict[str, str]:
+    """
+    Declaration arguments of the vote queues for RABBITMQ_QUEUE_TYPE ('classic', 'quorum' or 'stream').
+    Quorum queues replicate across the cluster and survive a node loss; streams are replicated,
+    append-only logs. Streams do not dead-letter, so rejected votes are not routed to the DLQ there.
+    Changing the type of an existing queue requires deleting it first (the broker refuses the redeclare).
+    """
+    arguments = {}
+    if settings.RABBITMQ_QUEUE_TYPE != "classic":
+        arguments['x-queue-type'] = settings.RABBITMQ_QUEUE_TYPE
+    if settings.RABBITMQ_QUEUE_TYPE != "stream":
+        arguments['x-dead-letter-exchange'] = settings.RABBITMQ_DLX_EXCHANGE # Route rejected messages to DLX
+    return arguments
+
+
+def retry_delays() -> List[int]:
+    """Delay in seconds of each retry tier, in attempt order (e.g. '2,10,60' -> [2, 10, 60])."""
+    return [int(part) for part in settings.WORKER_RETRY_DELAYS_SECONDS.split(",") if part.strip()]
+
+
+def retry_queue_name(queue_name: str, delay_seconds: int) -> str:
+    return f"{queue_name}.retry.{delay_seconds}"
+
+
+def retry_queue_arguments(queue_name: str, delay_seconds: int) -> Dict[str, object]:
+    """A delay queue: messages expire after `delay_seconds` and are dead-lettered back to `queue_name`."""
+    arguments = {
+        'x-message-ttl': delay_seconds * 1000,
+        'x-dead-letter-exchange': '', # Default exchange: routes by queue name
+        'x-dead-letter-routing-key': queue_name,
+    }
+    if settings.RABBITMQ_QUEUE_TYPE == "quorum":
+        arguments['x-queue-type'] = 'quorum' # Same replication guarantees as the vote queue
+    return arguments
+
+
+def consume_arguments() -> Optional[Dict[str, str]]:
+    """basic_consume arguments: stream consumers must say where in the log to start."""
+    if settings.RABBITMQ_QUEUE_TYPE == "stream":
+        return {'x-stream-offset': settings.WORKER_STREAM_OFFSET}
+    return None
+
+
+def declare_topology(channel):
+    """
+    Declares DLX, DLQ, vote queues and (in consistent_hash mode) the sharding exchange
+    on a blocking pika channel. Declarations are idempotent.
+    """
+    channel.exchange_declare(exchange=settings.RABBITMQ_DLX_EXCHANGE, exchange_type='fanout', durable=True)
+    channel.queue_declare(settings.RABBITMQ_DLQ_QUEUE, durable=True)
+    channel.queue_bind(queue=settings.RABBITMQ_DLQ_QUEUE, exchange=settings.RABBITMQ_DLX_EXCHANGE, routing_key='#')
+    for queue_name in vote_queue_names():
+        channel.queue_declare(queue=queue_name, durable=True, arguments=vote_queue_arguments())
+    if settings.RABBITMQ_ROUTING_MODE == "consistent_hash":
+        channel.exchange_declare(exchange=settings.RABBITMQ_SHARD_EXCHANGE, exchange_type='x-consistent-hash', durable=True)
+        for queue_name in vote_queue_names():
+            # For x-consistent-hash the binding key is the shard's weight
+            channel.queue_bind(queue=queue_name, exchange=settings.RABBITMQ_SHARD_EXCHANGE, routing_key='1')
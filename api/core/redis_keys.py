@@ -0,0 +1,135 @@
+import ipaddress
+import random
+import time
+import uuid
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from .config import settings
+
+# Redis key layout for vote counters and the results cache, shared by the API and the workers.
+#
+# The layout is ready for Redis Cluster (no multi-key command spans two slots), but the API and
+# the workers still connect with single-node clients (redis.Redis / redis.asyncio.Redis): running
+# on a cluster also needs redis.cluster.RedisCluster clients. On one node the shards and replicas
+# only cost a few extra keys.
+#
+# Vote counts are split over VOTE_COUNTER_SHARDS hashes '{candidate_votes:<n>}'. The braces are
+# a Redis Cluster hash tag: each shard hashes to its own slot, so increments from many workers
+# spread over the cluster's nodes instead of all hitting one slot. A worker adds to any one
+# shard (WORKER_COUNTER_SHARD, or a random one per batch); the exact count of a candidate is
+# the sum of its field over all shards, plus the pre-sharding 'candidate_votes' hash.
+#
+# The full results cache is replicated the same way into RESULTS_CACHE_REPLICAS keys
+# '{voting_results:<n>}': writers set every replica, readers pick one at random.
+#
+# Vote receipts ('<bucket>-<uuid hex>', issued by POST /vote) map to the worker's outcome for
+# that vote. Instead of one key per vote they are fields of small hashes
+# '{vote_receipts:<bucket>:<first uuid digit>}': <bucket> is the hour (VOTE_RECEIPT_BUCKET_SECONDS)
+# the receipt was issued in, so a whole hash expires at once VOTE_RECEIPT_TTL_SECONDS after it.
+#
+# Distinct voters and source IPs are estimated with HyperLogLogs (12 KB at most each, ~0.81%
+# standard error) that the worker PFADDs to for every new vote: 'hll:voters', 'hll:source_ips',
+# 'hll:voters:candidate:<id>', 'hll:source_ips:candidate:<id>' and 'hll:voters:block:<ip block>'.
+#
+# Vote rollups: one hash per minute / hour of vote_timestamp, 'rollup:<granularity>:<bucket start>'
+# (unix time), mapping candidate ID -> new valid votes, incremented by the worker with the counters.
+# Each hash expires ROLLUP_<GRANULARITY>_TTL_SECONDS after its bucket starts; the vote_rollups
+# table keeps the full history (see core/vote_rollups.py).
+
+LEGACY_VOTE_COUNTER_KEY = "candidate_votes"
+
+
+def vote_counter_key(shard: int) -> str:
+    return f"{{{LEGACY_VOTE_COUNTER_KEY}:{shard}}}"
+
+
+def vote_counter_keys() -> List[str]:
+    """Every hash holding vote counts; read all of them and sum."""
+    return [vote_counter_key(shard) for shard in range(settings.VOTE_COUNTER_SHARDS)] + [LEGACY_VOTE_COUNTER_KEY]
+
+
+def vote_counter_write_key() -> str:
+    """Shard this worker increments for its next batch."""
+    shard = settings.WORKER_COUNTER_SHARD
+    if shard < 0:
+        shard = random.randrange(settings.VOTE_COUNTER_SHARDS)
+    return vote_counter_key(shard % settings.VOTE_COUNTER_SHARDS)
+
+
+def results_cache_keys() -> List[str]:
+    return [f"{{voting_results:{replica}}}" for replica in range(settings.RESULTS_CACHE_REPLICAS)]
+
+
+def results_cache_read_key() -> str:
+    return f"{{voting_results:{random.randrange(settings.RESULTS_CACHE_REPLICAS)}}}"
+
+
+VOTERS_HLL_KEY = "hll:voters"
+SOURCE_IPS_HLL_KEY = "hll:source_ips"
+
+
+def candidate_voters_hll_key(candidate_id) -> str:
+    return f"hll:voters:candidate:{candidate_id}"
+
+
+def candidate_source_ips_hll_key(candidate_id) -> str:
+    return f"hll:source_ips:candidate:{candidate_id}"
+
+
+def ip_block_voters_hll_key(block: str) -> str:
+    return f"hll:voters:block:{block}"
+
+
+def source_ip_block(source_ip: str) -> Optional[str]:
+    """The /24 (IPv4) or /48 (IPv6) network of an address, e.g. '203.0.113.0/24'; None if it is not an IP."""
+    try:
+        address = ipaddress.ip_address(source_ip)
+    except ValueError:
+        return None
+    prefix = 24 if address.version == 4 else 48
+    return str(ipaddress.ip_network(f"{address}/{prefix}", strict=False))
+
+
+ROLLUP_GRANULARITIES = {"minute": 60, "hour": 3600} # Bucket length in seconds
+ROLLUP_MIRROR_LOCK_KEY = "lock:rollup_mirror"
+
+
+def rollup_bucket(timestamp: float, granularity: str) -> int:
+    """Unix time the `granularity` bucket holding `timestamp` starts at."""
+    step = ROLLUP_GRANULARITIES[granularity]
+    return int(timestamp // step) * step
+
+
+def rollup_key(granularity: str, bucket: int) -> str:
+    return f"rollup:{granularity}:{bucket}"
+
+
+def rollup_ttl_seconds(granularity: str) -> int:
+    return settings.ROLLUP_MINUTE_TTL_SECONDS if granularity == "minute" else settings.ROLLUP_HOUR_TTL_SECONDS
+
+
+def new_vote_receipt_id() -> str:
+    bucket = int(time.time()) // settings.VOTE_RECEIPT_BUCKET_SECONDS
+    return f"{bucket:x}-{uuid.uuid4().hex}"
+
+
+def vote_receipt_location(receipt_id: str) -> Tuple[str, str, int]:
+    """(hash key, field, unix time the hash expires) of a receipt. Raises ValueError if it is malformed."""
+    bucket_hex, _, field = receipt_id.partition("-")
+    bucket = int(bucket_hex, 16)
+    if len(field) != 32:
+        raise ValueError(f"malformed vote receipt: {receipt_id!r}")
+    field = uuid.UUID(hex=field).hex # Validates and lowercases
+    expire_at = (bucket + 1) * settings.VOTE_RECEIPT_BUCKET_SECONDS + settings.VOTE_RECEIPT_TTL_SECONDS
+    return f"{{vote_receipts:{bucket:x}:{field[0]}}}", field, expire_at
+
+
+def vote_receipt_value(status: str) -> str:
+    """Hash value of a receipt: '<status>:<unix time>'."""
+    return f"{status}:{int(time.time())}"
+
+
+def parse_vote_receipt_value(value: str) -> Tuple[str, Optional[datetime]]:
+    status, _, updated_at = value.partition(":")
+    return status, datetime.utcfromtimestamp(int(updated_at)) if updated_at.isdigit() else None
@@ -0,0 +1,64 @@
+from opentelemetry import trace, propagate
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+from typing import Any, Dict, Optional
+import logging
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+_configured = False
+
+
+def configure_tracing(service_name: str):
+    """
+    Installs the OpenTelemetry tracer provider for this process.
+    With TRACING_EXPORTER='none' the default no-op provider is kept, so spans cost
+    (almost) nothing and no trace headers are injected into AMQP messages.
+    """
+    global _configured
+    if _configured or settings.TRACING_EXPORTER == "none":
+        return
+
+    if settings.TRACING_EXPORTER == "otlp":
+        # Imported lazily: only needed when shipping spans to a collector
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        exporter = OTLPSpanExporter(endpoint=settings.TRACING_OTLP_ENDPOINT)
+    elif settings.TRACING_EXPORTER == "file":
+        # One JSON span per line, appended to a local file
+        exporter = ConsoleSpanExporter(
+            out=open(settings.TRACING_FILE_PATH, "a", encoding="utf-8"),
+            formatter=lambda span: span.to_json(indent=None) + "\n",
+        )
+    else:
+        logger.error("Unknown TRACING_EXPORTER '%s'. Tracing disabled.", settings.TRACING_EXPORTER)
+        return
+
+    provider = TracerProvider(
+        resource=Resource.create({"service.name": service_name}),
+        sampler=ParentBased(TraceIdRatioBased(settings.TRACING_SAMPLE_RATIO)), # Workers follow the API's decision
+    )
+    provider.add_span_processor(BatchSpanProcessor(exporter)) # Export off the hot path
+    trace.set_tracer_provider(provider)
+    _configured = True
+    logger.info("Tracing enabled for %s (exporter=%s, sample_ratio=%s).",
+                service_name, settings.TRACING_EXPORTER, settings.TRACING_SAMPLE_RATIO)
+
+
+def get_tracer(name: str) -> trace.Tracer:
+    return trace.get_tracer(name)
+
+
+def inject_trace_headers(headers: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Adds W3C trace-context headers for the current span (used as AMQP message headers)."""
+    headers = headers if headers is not None else {}
+    propagate.inject(headers)
+    return headers
+
+
+def extract_trace_context(headers: Optional[Dict[str, Any]]):
+    """Returns the trace context carried in AMQP message headers (empty context if none)."""
+    return propagate.extract(headers or {})
@@ -0,0 +1,261 @@
+import json
+import logging
+import os
+import re
+import shutil
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional
+from uuid import UUID
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from sqlalchemy import delete, func, select
+
+from .config import settings
+from .database import SessionLocal
+from .vote_export import open_export_connection
+from ..models.database_models import Candidate, User, Vote
+
+logger = logging.getLogger(__name__)
+
+# Cold archive of closed election rounds. A round is a named vote_timestamp range [start, end)
+# that has ended. Archiving it:
+# 1. reads the round from one REPEATABLE READ snapshot (export engine, server-side cursor) and
+#    writes it to zstd-compressed Parquet files ARCHIVE_DIR/<round>/part-NNNNN.parquet;
+# 2. re-reads the files and checks their row and per-candidate counts against the snapshot,
+#    then writes ARCHIVE_DIR/<round>/manifest.json (counts included) and moves the round in place;
+# 3. optionally deletes the archived votes from the hot table, by the vote IDs in the files,
+#    in small committed batches. Votes written to the range after the snapshot are never deleted.
+# Archived rounds are read in place (manifest counts, filtered scans), never restored.
+
+ARCHIVE_SCHEMA = pa.schema([
+    ("vote_id", pa.string()),
+    ("user_identifier", pa.string()),
+    ("candidate_id", pa.string()),
+    ("vote_timestamp", pa.timestamp("us", tz="UTC")),
+    ("source_ip", pa.string()),
+    ("user_agent", pa.string()),
+    ("is_valid", pa.bool_()),
+    ("processing_status", pa.string()),
+    ("created_at", pa.timestamp("us", tz="UTC")),
+])
+MANIFEST_NAME = "manifest.json"
+_ROUND_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,63}$")
+
+
+class ArchiveError(Exception):
+    """The round cannot be archived (or read) as requested. Nothing was deleted."""
+
+
+def _round_directory(round_name: str, directory: Optional[str] = None) -> str:
+    if not _ROUND_NAME.match(round_name):
+        raise ArchiveError(f"Invalid round name: {round_name!r}")
+    return os.path.join(directory or settings.ARCHIVE_DIR, round_name)
+
+
+def _utc(value: datetime) -> datetime:
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def load_manifest(round_name: str, directory: Optional[str] = None) -> Dict[str, Any]:
+    path = os.path.join(_round_directory(round_name, directory), MANIFEST_NAME)
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        raise ArchiveError(f"Round {round_name!r} is not archived")
+
+
+def _write_manifest(round_directory: str, manifest: Dict[str, Any]):
+    path = os.path.join(round_directory, MANIFEST_NAME)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".tmp", path)
+
+
+def list_rounds(directory: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Manifests of every archived round (without the file list), oldest round first."""
+    directory = directory or settings.ARCHIVE_DIR
+    rounds = []
+    for name in sorted(os.listdir(directory)) if os.path.isdir(directory) else []:
+        if name.startswith(".") or not os.path.isfile(os.path.join(directory, name, MANIFEST_NAME)):
+            continue # In-progress (.<round>.tmp) or unrelated entries
+        manifest = load_manifest(name, directory)
+        rounds.append({key: value for key, value in manifest.items() if key not in ("files", "candidates")})
+    return sorted(rounds, key=lambda m: m["start"])
+
+
+# --- Writing ---
+def _snapshot_counts(connection, start: datetime, end: datetime) -> Dict[str, Dict[str, int]]:
+    rows = connection.execute(
+        select(Vote.candidate_id, func.count(), func.count().filter(Vote.is_valid.is_(True)))
+        .where(Vote.vote_timestamp >= start, Vote.vote_timestamp < end)
+        .group_by(Vote.candidate_id)
+    )
+    return {str(candidate_id): {"votes": votes, "valid_votes": valid} for candidate_id, votes, valid in rows}
+
+
+def _iter_record_batches(connection, start: datetime, end: datetime, batch_rows: int) -> Iterator[pa.RecordBatch]:
+    query = (
+        select(
+            Vote.id, User.user_identifier, Vote.candidate_id, Vote.vote_timestamp, Vote.source_ip,
+            Vote.user_agent, Vote.is_valid, Vote.processing_status, Vote.created_at,
+        )
+        .join(User, User.id == Vote.user_id)
+        .where(Vote.vote_timestamp >= start, Vote.vote_timestamp < end)
+        .order_by(Vote.vote_timestamp) # idx_votes_timestamp; also makes row groups prunable by time
+    )
+    result = connection.execution_options(stream_results=True, yield_per=batch_rows).execute(query)
+    for partition in result.partitions():
+        columns = list(zip(*partition))
+        yield pa.RecordBatch.from_arrays([
+            pa.array([str(v) for v in columns[0]], pa.string()),
+            pa.array(columns[1], pa.string()),
+            pa.array([str(v) for v in columns[2]], pa.string()),
+            pa.array(columns[3], ARCHIVE_SCHEMA.field("vote_timestamp").type),
+            pa.array([str(v) if v is not None else None for v in columns[4]], pa.string()),
+            pa.array(columns[5], pa.string()),
+            pa.array(columns[6], pa.bool_()),
+            pa.array([v.value for v in columns[7]], pa.string()),
+            pa.array(columns[8], ARCHIVE_SCHEMA.field("created_at").type),
+        ], schema=ARCHIVE_SCHEMA)
+
+
+def _write_files(batches: Iterator[pa.RecordBatch], directory: str, file_rows: int) -> List[Dict[str, Any]]:
+    """Writes the batches to part files of at most ~file_rows rows. Returns [{name, rows, bytes}]."""
+    files: List[Dict[str, Any]] = []
+    writer = None
+
+    def close_current():
+        writer.close()
+        path = os.path.join(directory, files[-1]["name"])
+        with open(path, "rb") as f:
+            os.fsync(f.fileno())
+        files[-1]["bytes"] = os.path.getsize(path)
+
+    for batch in batches:
+        if writer is None or files[-1]["rows"] >= file_rows:
+            if writer is not None:
+                close_current()
+            files.append({"name": f"part-{len(files):05d}.parquet", "rows": 0})
+            writer = pq.ParquetWriter(os.path.join(directory, files[-1]["name"]), ARCHIVE_SCHEMA, compression="zstd")
+        writer.write_batch(batch)
+        files[-1]["rows"] += batch.num_rows
+    if writer is not None:
+        close_current()
+    return files
+
+
+def _file_counts(directory: str, files: List[Dict[str, Any]]) -> Dict[str, Dict[str, int]]:
+    """Per-candidate counts read back from the written files."""
+    if not files:
+        return {}
+    table = ds.dataset([os.path.join(directory, f["name"]) for f in files], format="parquet").to_table(columns=["candidate_id", "is_valid"])
+    for f in files: # Row counts from each file's footer as well
+        if pq.ParquetFile(os.path.join(directory, f["name"])).metadata.num_rows != f["rows"]:
+            raise ArchiveError(f"{f['name']} holds a different number of rows than written")
+    grouped = table.append_column("valid", pc.cast(table["is_valid"], pa.int64())).group_by("candidate_id").aggregate([
+        ("candidate_id", "count"), ("valid", "sum"),
+    ])
+    return {
+        candidate_id: {"votes": votes, "valid_votes": valid}
+        for candidate_id, votes, valid in zip(grouped["candidate_id"].to_pylist(), grouped["candidate_id_count"].to_pylist(),
+                                              grouped["valid_sum"].to_pylist())
+    }
+
+
+def archive_round(round_name: str, start: datetime, end: datetime, directory: Optional[str] = None,
+                  batch_rows: Optional[int] = None, file_rows: Optional[int] = None) -> Dict[str, Any]:
+    """Writes and verifies the archive of a closed round (steps 1-2 above). Returns its manifest."""
+    start, end = _utc(start), _utc(end)
+    if start >= end:
+        raise ArchiveError("start must be before end")
+    if end > datetime.now(timezone.utc):
+        raise ArchiveError("The round has not ended yet")
+    round_directory = _round_directory(round_name, directory)
+    if os.path.exists(round_directory):
+        raise ArchiveError(f"Round {round_name!r} is already archived")
+    staging = os.path.join(os.path.dirname(round_directory), f".{round_name}.tmp")
+    shutil.rmtree(staging, ignore_errors=True) # Leftover of an interrupted run
+    os.makedirs(staging)
+
+    try:
+        connection = open_export_connection() # One read-only snapshot for counts and rows
+        try:
+            snapshot_at = connection.execute(select(func.now())).scalar()
+            expected = _snapshot_counts(connection, start, end)
+            names = {str(cid): name for cid, name in connection.execute(select(Candidate.id, Candidate.name))}
+            files = _write_files(
+                _iter_record_batches(connection, start, end, batch_rows or settings.ARCHIVE_BATCH_ROWS),
+                staging, file_rows or settings.ARCHIVE_FILE_ROWS,
+            )
+        finally:
+            connection.close()
+
+        written = _file_counts(staging, files)
+        if written != expected:
+            raise ArchiveError(f"Archived counts do not match the database: {written} != {expected}")
+        manifest = {
+            "round": round_name,
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "snapshot_at": snapshot_at.isoformat(),
+            "archived_at": datetime.now(timezone.utc).isoformat(),
+            "rows": sum(f["rows"] for f in files),
+            "bytes": sum(f["bytes"] for f in files),
+            "deleted_rows": None, # Set once the votes are removed from the hot table
+            "files": files,
+            "candidates": [
+                {"candidate_id": cid, "name": names.get(cid), **counts}
+                for cid, counts in sorted(expected.items(), key=lambda item: item[1]["valid_votes"], reverse=True)
+            ],
+        }
+        _write_manifest(staging, manifest)
+        os.replace(staging, round_directory)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    logger.info("Archived round %s: %d votes in %d file(s), %d bytes.", round_name, manifest["rows"], len(files), manifest["bytes"])
+    return manifest
+
+
+def delete_archived_votes(round_name: str, directory: Optional[str] = None, batch_size: Optional[int] = None) -> int:
+    """
+    Deletes the votes of an archived round from the hot table (step 3), in committed batches of
+    `batch_size` IDs read from the archive files. Safe to re-run. Returns the number of rows deleted.
+    """
+    round_directory = _round_directory(round_name, directory)
+    manifest = load_manifest(round_name, directory)
+    paths = [os.path.join(round_directory, f["name"]) for f in manifest["files"]]
+    deleted = 0
+    for path in paths:
+        for batch in pq.ParquetFile(path).iter_batches(columns=["vote_id"], batch_size=batch_size or settings.ARCHIVE_DELETE_BATCH):
+            ids = [UUID(vote_id) for vote_id in batch.column(0).to_pylist()]
+            with SessionLocal() as session:
+                deleted += session.execute(delete(Vote).where(Vote.id.in_(ids)).execution_options(synchronize_session=False)).rowcount
+                session.commit() # Short transactions: no long locks on the hot table
+    manifest["deleted_rows"] = (manifest["deleted_rows"] or 0) + deleted
+    _write_manifest(round_directory, manifest)
+    logger.info("Deleted %d archived votes of round %s from the votes table.", deleted, round_name)
+    return deleted
+
+
+# --- Reading ---
+def query_votes(round_name: str, candidate_id: Optional[UUID] = None, user_identifier: Optional[str] = None,
+                limit: int = 100, directory: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Votes of an archived round matching the filters, read from the Parquet files in place."""
+    round_directory = _round_directory(round_name, directory)
+    manifest = load_manifest(round_name, directory)
+    if not manifest["files"]:
+        return []
+    condition = None
+    for column, value in (("candidate_id", str(candidate_id) if candidate_id else None), ("user_identifier", user_identifier)):
+        if value is not None:
+            term = ds.field(column) == value
+            condition = term if condition is None else condition & term
+    dataset = ds.dataset([os.path.join(round_directory, f["name"]) for f in manifest["files"]], format="parquet")
+    return dataset.head(limit, filter=condition).to_pylist() # Row groups are pruned by their column statistics
@@ -0,0 +1,130 @@
+import csv
+import io
+import logging
+import zlib
+from datetime import datetime
+from typing import Iterator, Optional
+
+import orjson
+from sqlalchemy import create_engine, select
+from sqlalchemy.engine import Connection
+
+from .config import settings
+from .database import SQLALCHEMY_DATABASE_URL
+from ..models.database_models import Candidate, User, Vote
+
+logger = logging.getLogger(__name__)
+
+# Full vote dumps for auditors, streamed with constant memory:
+# - rows come from a server-side cursor (stream_results), EXPORT_CHUNK_ROWS at a time, in
+#   vote_timestamp order so a time range filter is served by idx_votes_timestamp;
+# - each chunk is formatted (CSV or NDJSON) and optionally gzip-compressed on the fly.
+# Exports use their own small engine (EXPORT_MAX_CONCURRENT connections, optionally on a read
+# replica via DATABASE_EXPORT_URL), so a long export never holds a connection of the request pool.
+
+FORMATS = ("csv", "ndjson")
+COLUMNS = (
+    "vote_id", "user_identifier", "candidate_id", "candidate_name", "vote_timestamp",
+    "source_ip", "user_agent", "is_valid", "processing_status", "created_at",
+)
+
+_export_engine = None
+
+
+def _get_export_engine():
+    global _export_engine
+    if _export_engine is None:
+        url = settings.DATABASE_EXPORT_URL or SQLALCHEMY_DATABASE_URL
+        _export_engine = create_engine(
+            url.replace("postgresql://", "postgresql+psycopg2://"),
+            pool_size=settings.EXPORT_MAX_CONCURRENT,
+            max_overflow=0,
+            pool_timeout=1, # A busy export pool means "try later", not a queue of waiting exports
+        )
+    return _export_engine
+
+
+def open_export_connection() -> Connection:
+    """
+    A read-only connection for one export, in a REPEATABLE READ transaction so the dump is one
+    consistent snapshot. Raises sqlalchemy.exc.TimeoutError while EXPORT_MAX_CONCURRENT exports run.
+    """
+    connection = _get_export_engine().connect()
+    return connection.execution_options(isolation_level="REPEATABLE READ", postgresql_readonly=True)
+
+
+def _iter_rows(connection: Connection, start: Optional[datetime], end: Optional[datetime], chunk_rows: int):
+    query = (
+        select(
+            Vote.id, User.user_identifier, Vote.candidate_id, Candidate.name, Vote.vote_timestamp,
+            Vote.source_ip, Vote.user_agent, Vote.is_valid, Vote.processing_status, Vote.created_at,
+        )
+        .join(User, User.id == Vote.user_id)
+        .join(Candidate, Candidate.id == Vote.candidate_id)
+        .order_by(Vote.vote_timestamp)
+    )
+    if start is not None:
+        query = query.where(Vote.vote_timestamp >= start)
+    if end is not None:
+        query = query.where(Vote.vote_timestamp < end)
+    result = connection.execution_options(stream_results=True, yield_per=chunk_rows).execute(query)
+    for partition in result.partitions():
+        yield [
+            (str(vote_id), user_identifier, str(candidate_id), name, vote_timestamp.isoformat(),
+             str(source_ip) if source_ip is not None else None, user_agent, is_valid,
+             processing_status.value, created_at.isoformat() if created_at else None)
+            for vote_id, user_identifier, candidate_id, name, vote_timestamp, source_ip, user_agent,
+                is_valid, processing_status, created_at in partition
+        ]
+
+
+def _format_csv(chunks) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    for rows in chunks:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8") # Header of an empty export
+
+
+def _format_ndjson(chunks) -> Iterator[bytes]:
+    for rows in chunks:
+        yield b"".join(orjson.dumps(dict(zip(COLUMNS, row))) + b"\n" for row in rows)
+
+
+def _gzip(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) # wbits=31: gzip container
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def stream_votes(connection: Connection, fmt: str = "csv", start: Optional[datetime] = None, end: Optional[datetime] = None,
+                 compress: bool = True, chunk_rows: Optional[int] = None) -> Iterator[bytes]:
+    """
+    Yields the export as byte chunks: votes with `start <= vote_timestamp < end`, joined with their
+    user and candidate. Consumes and closes `connection` (from open_export_connection).
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt!r}")
+    exported = 0
+
+    def counted(chunks):
+        nonlocal exported
+        for rows in chunks:
+            exported += len(rows)
+            yield rows
+
+    try:
+        rows = counted(_iter_rows(connection, start, end, chunk_rows or settings.EXPORT_CHUNK_ROWS))
+        body = _format_csv(rows) if fmt == "csv" else _format_ndjson(rows)
+        yield from (_gzip(body) if compress else body)
+        logger.info("Exported %d votes (%s, %s to %s).", exported, fmt, start or "start", end or "now")
+    finally:
+        connection.close() # Also ends the transaction and the server-side cursor
@@ -0,0 +1,111 @@
+import logging
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import delete, func, literal, literal_column, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from .database import SessionLocal
+from .redis_keys import ROLLUP_GRANULARITIES
+from ..models.database_models import Vote, VoteRollup
+
+logger = logging.getLogger(__name__)
+
+# Votes over time per candidate, for trend charts, without grouping the votes table per request.
+# - Redis: the worker increments 'rollup:<granularity>:<bucket>' hashes with every batch of new
+#   votes (see redis_keys); they expire after ROLLUP_<GRANULARITY>_TTL_SECONDS.
+# - vote_rollups table: the full history. A worker recomputes the minute rows of the last
+#   ROLLUP_MIRROR_LOOKBACK_SECONDS from the votes table every ROLLUP_MIRROR_INTERVAL_SECONDS
+#   (an index range scan of a few minutes of votes), then the hour rows from the minute rows.
+#   The rows of the refreshed range are replaced, not incremented (stale ones, e.g. of votes since
+#   marked invalid, are deleted in the same transaction), so a refresh can run any number of times.
+# Both count valid votes by vote_timestamp (when the API accepted them), in UTC buckets.
+
+Rollups = Dict[int, Dict[str, int]] # Bucket start (unix time) -> candidate ID -> votes
+
+
+def _bucket_start(column, granularity: str):
+    """SQL expression: start of the UTC bucket holding `column` (epoch arithmetic, whatever the session time zone)."""
+    step = literal_column(str(ROLLUP_GRANULARITIES[granularity])) # Inlined so SELECT and GROUP BY render identically
+    return func.to_timestamp(func.floor(func.extract("epoch", column) / step) * step)
+
+
+def _upsert(rows):
+    statement = pg_insert(VoteRollup).from_select(["granularity", "bucket_start", "candidate_id", "votes"], rows)
+    return statement.on_conflict_do_update(
+        index_elements=[VoteRollup.granularity, VoteRollup.bucket_start, VoteRollup.candidate_id],
+        set_={"votes": statement.excluded.votes, "updated_at": func.now()},
+    )
+
+
+def _delete_range(granularity: str, start: datetime, end: datetime):
+    return delete(VoteRollup).where(
+        VoteRollup.granularity == granularity, VoteRollup.bucket_start >= start, VoteRollup.bucket_start < end,
+    )
+
+
+def mirror_rollups(start: datetime, end: datetime) -> int:
+    """
+    Recomputes the minute rows of [start, end) from the votes table and the hour rows of every hour
+    they touch from the minute rows, replacing the rows of that range in one transaction.
+    The range is widened to whole buckets: a bucket is only ever rebuilt from all of its votes.
+    Returns the number of minute rows written.
+    """
+    start_ts, end_ts = start.timestamp(), end.timestamp()
+    start = datetime.fromtimestamp(start_ts - start_ts % 60, timezone.utc)
+    hour_start = datetime.fromtimestamp(start_ts - start_ts % 3600, timezone.utc)
+    end = datetime.fromtimestamp(end_ts + (-end_ts % 60), timezone.utc)
+    hour_end = datetime.fromtimestamp(end_ts + (-end_ts % 3600), timezone.utc)
+    minute = _bucket_start(Vote.vote_timestamp, "minute")
+    minute_rows = (
+        select(literal("minute"), minute, Vote.candidate_id, func.count())
+        .where(Vote.is_valid.is_(True), Vote.vote_timestamp >= start, Vote.vote_timestamp < end) # idx_votes_timestamp
+        .group_by(minute, Vote.candidate_id)
+    )
+    hour = _bucket_start(VoteRollup.bucket_start, "hour")
+    hour_rows = (
+        select(literal("hour"), hour, VoteRollup.candidate_id, func.sum(VoteRollup.votes))
+        .where(VoteRollup.granularity == "minute", VoteRollup.bucket_start >= hour_start, VoteRollup.bucket_start < hour_end)
+        .group_by(hour, VoteRollup.candidate_id)
+    )
+    with SessionLocal() as session:
+        session.execute(_delete_range("minute", start, end)) # Buckets left without valid votes
+        written = session.execute(_upsert(minute_rows)).rowcount
+        session.execute(_delete_range("hour", hour_start, hour_end))
+        session.execute(_upsert(hour_rows))
+        session.commit()
+    logger.debug("Refreshed %d minute rollup(s) from %s to %s.", written, start, end)
+    return written
+
+
+def read_rollups(granularity: str, start: int, end: int, candidate_id: Optional[UUID] = None) -> Rollups:
+    """Rollups of the buckets starting in [start, end) (unix times) from the vote_rollups table."""
+    query = select(VoteRollup.bucket_start, VoteRollup.candidate_id, VoteRollup.votes).where(
+        VoteRollup.granularity == granularity,
+        VoteRollup.bucket_start >= datetime.fromtimestamp(start, timezone.utc),
+        VoteRollup.bucket_start < datetime.fromtimestamp(end, timezone.utc),
+    )
+    if candidate_id is not None:
+        query = query.where(VoteRollup.candidate_id == candidate_id)
+    rollups: Rollups = {}
+    with SessionLocal() as session:
+        for bucket_start, cid, votes in session.execute(query):
+            rollups.setdefault(int(bucket_start.timestamp()), {})[str(cid)] = votes
+    return rollups
+
+
+def downsample(rollups: Rollups, start: int, end: int, step: int) -> Tuple[List[int], Dict[str, List[int]]]:
+    """
+    Sums the rollups into points of `step` seconds from `start` (both bucket-aligned) to `end`.
+    Returns the point start times and, per candidate with votes, one count per point.
+    """
+    points = list(range(start, end, step))
+    series: Dict[str, List[int]] = {}
+    for bucket, counts in rollups.items():
+        index = (bucket - start) // step
+        if not 0 <= index < len(points):
+            continue
+        for candidate_id, votes in counts.items():
+            series.setdefault(candidate_id, [0] * len(points))[index] += int(votes)
+    return points, series
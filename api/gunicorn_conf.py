@@ -0,0 +1,42 @@
+import multiprocessing
+import os
+import shutil
+
+from api.core.config import settings
+
+# Gunicorn settings for the API: one master, API_WORKERS uvicorn worker processes.
+# Usage: gunicorn api.main:app -c api/gunicorn_conf.py
+#
+# Each worker is a separate process with its own event loop, so it needs its own
+# RabbitMQ/Redis connections, DB pool and spool. Those are created in the app lifespan
+# (VoteService), i.e. after the fork. With API_PRELOAD the app module is imported once in
+# the master: the DB engine is created there and its inherited pool is dropped in post_fork,
+# and the logging listener thread is restarted in the child (see logging_config).
+
+# Prometheus: every worker writes its samples to PROMETHEUS_MULTIPROC_DIR and /metrics
+# aggregates them. Must be set before prometheus_client is first imported, and the directory
+# is emptied here rather than in on_starting because preload_app imports the app before that hook.
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/vote_api_metrics")
+shutil.rmtree(os.environ["PROMETHEUS_MULTIPROC_DIR"], ignore_errors=True) # Samples of a previous run would be summed in
+os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+bind = settings.API_BIND
+workers = settings.API_WORKERS or multiprocessing.cpu_count()
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = settings.API_PRELOAD
+graceful_timeout = settings.API_GRACEFUL_TIMEOUT_SECONDS
+keepalive = settings.API_KEEPALIVE_SECONDS
+max_requests = settings.API_MAX_REQUESTS
+max_requests_jitter = settings.API_MAX_REQUESTS // 10 # Workers do not all restart at once
+
+
+def post_fork(server, worker):
+    # Connections inherited from the master must not be shared with it or other workers
+    from api.core.database import engine
+    engine.dispose(close=False)
+
+
+def child_exit(server, worker):
+    # Drops the live gauges of the dead worker; its counters keep counting in the aggregate
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
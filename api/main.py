@@ -1,13 +1,62 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from .routers import vote, auth
+from prometheus_client import generate_latest, CollectorRegistry, CONTENT_TYPE_LATEST, multiprocess
+from .routers import vote, auth, health, admin
 from .core.config import settings
+from .core.logging_config import configure_logging
+from .core.tracing import configure_tracing
+from .services.vote_service import VoteService
+from .services.health_service import HealthMonitor
+import asyncio
 import logging
+import os
 
-logging.basicConfig(level=logging.INFO)
+configure_logging("api")
+configure_tracing("voting-api")
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Creates the VoteService and starts its background work; connections are made asynchronously."""
+    logger.info("API startup initiated.")
+    vote_service = VoteService()
+    vote_service.start() # Returns immediately; RabbitMQ connects (and reconnects) in the background
+    app.state.vote_service = vote_service
+    redis_monitor_task = asyncio.create_task(vote_service.run_redis_monitor())
+    # Drain votes spooled while RabbitMQ was unavailable (no-op when the spool is disabled)
+    spool_replay_task = asyncio.create_task(vote_service.run_spool_replay())
+    # Keep a last known good results snapshot for Redis/DB outages
+    snapshot_task = asyncio.create_task(vote_service.run_results_snapshot_refresh())
+    # Valid candidate IDs, checked before a vote is published
+    catalog_task = asyncio.create_task(vote_service.run_candidate_catalog_refresh())
+    # Periodic per-vote event summaries, also after traffic stops
+    event_log_task = asyncio.create_task(vote_service.run_event_log_flush())
+    # Dependency probes for /readyz, cached between rounds
+    app.state.health_monitor = HealthMonitor(vote_service)
+    health_task = asyncio.create_task(app.state.health_monitor.run())
+
+    yield
+
+    logger.info("API shutdown initiated.")
+    health_task.cancel()
+    spool_replay_task.cancel()
+    snapshot_task.cancel()
+    catalog_task.cancel()
+    event_log_task.cancel()
+    redis_monitor_task.cancel()
+    await vote_service.stop() # Closes RabbitMQ/Redis and seals the spool
+    # SQLAlchemy engine connection pool is typically cleaned up automatically on process exit,
+    # but explicit dispose can be added here if necessary:
+    # from .core.database import engine
+    # engine.dispose()
+    logger.info("API shutdown complete.")
+
+
 app = FastAPI(
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse, # orjson serializes several times faster than the stdlib json module
     title="High-Load Voting System API",
     version="1.0.0",
     description="API for accepting votes and retrieving results.",
@@ -28,40 +77,15 @@ app.add_middleware(
 # Include routers
 app.include_router(vote.router, prefix="/api/v1", tags=["voting"])
 app.include_router(auth.router, prefix="/api/v1/auth", tags=["authentication"])
+app.include_router(admin.router, prefix="/api/v1/admin", tags=["admin"])
+app.include_router(health.router, include_in_schema=False)
 
-# Add startup and shutdown events for graceful handling of external connections
-@app.on_event("startup")
-async def startup_event():
-    logger.info("API startup initiated.")
-    # Potential place for initial DB connectivity check
-    # from .core.database import engine
-    # try:
-    #      with engine.connect() as connection:
-    #           logger.info("Database connection test successful.")
-    # except Exception as e:
-    #      logger.error(f"Database connection test failed: {e}")
-    #      # Decide if startup should fail or log a warning
-
-
-@app.on_event("shutdown")
-async def shutdown_event():
-     logger.info("API shutdown initiated.")
-     # Gently close RabbitMQ connection managed by VoteService if it's blocking
-     # If using aio-pika, the library/connection pool handles this better
-     if vote.vote_service.rabbitmq_connection and vote.vote_service.rabbitmq_connection.is_open:
-         try:
-              vote.vote_service.rabbitmq_connection.close() # Might block
-              logger.info("RabbitMQ connection closed.")
-         except Exception as e:
-              logger.error(f"Error closing RabbitMQ connection: {e}")
-
-     # Redis client managed by CacheService doesn't usually need explicit close with redis-py
-
-     # SQLAlchemy engine connection pool is typically cleaned up automatically on process exit,
-     # but explicit dispose can be added here if necessary:
-     # from .core.database import engine
-     # engine.dispose()
-     # logger.info("SQLAlchemy engine disposed.")
-
-     logger.info("API shutdown complete.")
-
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Expose Prometheus metrics (publish latency, cache hit rate, rate limit timing, ...)."""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        # Under gunicorn: aggregate the samples of all worker processes, not just this one
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return Response(content=generate_latest(registry), headers={"Content-Type": CONTENT_TYPE_LATEST})
+    return Response(content=generate_latest(), headers={"Content-Type": CONTENT_TYPE_LATEST})
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, UUID, String, Text, DateTime, Index, Boolean, ForeignKey, Enum as SQLEnum, UniqueConstraint
+from sqlalchemy import Column, UUID, String, Text, DateTime, Index, Integer, Boolean, ForeignKey, Enum as SQLEnum, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from sqlalchemy.dialects.postgresql import INET
@@ -73,4 +73,15 @@ class Vote(Base):
 
     # Relationships (optional but good practice)
     user = relationship("User") # No backref needed if not querying votes from user model
-    candidate = relationship("Candidate") # No backref needed if not querying votes from candidate model
\ No newline at end of file
+    candidate = relationship("Candidate") # No backref needed if not querying votes from candidate model
+
+
+class VoteRollup(Base):
+    """Valid votes per candidate and minute / hour of vote_timestamp, refreshed by the worker (see core/vote_rollups.py)."""
+    __tablename__ = 'vote_rollups'
+
+    granularity = Column(String(16), primary_key=True) # 'minute' or 'hour'
+    bucket_start = Column(DateTime(timezone=True), primary_key=True)
+    candidate_id = Column(UUID(as_uuid=True), ForeignKey('candidates.id'), primary_key=True)
+    votes = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
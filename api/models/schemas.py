@@ -12,6 +12,32 @@ class VoteResponse(BaseModel):
     status: str
     message: str
     timestamp: datetime
+    receipt_id: Optional[str] = None # Look up the vote's outcome with GET /vote/{receipt_id}
+
+class VoteReceiptStatus(BaseModel):
+    """Schema for the processing status of a vote, by receipt."""
+    receipt_id: str
+    status: str # pending | processed | duplicate | retry | failed | dlq
+    updated_at: Optional[datetime] = None # When the worker recorded the status (None while pending)
+
+class VoteBatchRequest(BaseModel):
+    """Schema for a bulk vote submission (e.g. votes collected offline by a kiosk)."""
+    votes: List[VotePayload] = Field(..., min_length=1, description="Votes to submit, each with its own user token.")
+
+class VoteBatchItemResult(BaseModel):
+    """Outcome of one vote of a batch, in request order."""
+    index: int
+    status: str # accepted | queued | rejected
+    status_code: int # What POST /vote would have answered: 202, 401, 429, 503 ...
+    message: str
+    receipt_id: Optional[str] = None # Set for accepted / queued votes
+
+class VoteBatchResponse(BaseModel):
+    """Schema for the bulk vote submission response."""
+    accepted: int
+    rejected: int
+    results: List[VoteBatchItemResult]
+    timestamp: datetime
 
 class CandidateResult(BaseModel):
     """Schema for a single candidate's result."""
@@ -23,6 +49,35 @@ class ResultsResponse(BaseModel):
     """Schema for the voting results response."""
     results: List[CandidateResult]
     last_updated: datetime
+    stale: bool = False # True when served from the in-memory snapshot during a Redis/DB outage
+
+class CandidateCardinality(BaseModel):
+    """Estimated distinct voters and source IPs of one candidate."""
+    candidate_id: UUID4
+    distinct_voters: int
+    distinct_source_ips: int
+
+class CardinalityResponse(BaseModel):
+    """HyperLogLog estimates of distinct voters and source IPs (Redis HyperLogLog standard error: 0.81%)."""
+    distinct_voters: int
+    distinct_source_ips: int
+    candidates: List[CandidateCardinality]
+    ip_block: Optional[str] = None # Network of the requested `ip`
+    ip_block_distinct_voters: Optional[int] = None
+    standard_error: float = 0.0081
+
+class CandidateTimeline(BaseModel):
+    """Votes of one candidate per timeline point."""
+    candidate_id: UUID4
+    votes: List[int] # One count per entry of TimelineResponse.points
+
+class TimelineResponse(BaseModel):
+    """Valid votes over time per candidate, from the vote rollups."""
+    granularity: str # Rollup read: 'minute' or 'hour'
+    step_seconds: int # Length of one point (a multiple of the granularity when downsampled)
+    points: List[datetime] # Start of each point (UTC)
+    series: List[CandidateTimeline]
+    source: str # 'redis', 'database' or 'redis+database' (buckets missing from Redis read from the table)
 
 class ErrorResponse(BaseModel):
     """Schema for a standard error response."""
@@ -1,4 +1,5 @@
+from . import admin
 from . import auth
 from . import vote
 
-__all__ = ['auth', 'vote']
+__all__ = ['admin', 'auth', 'vote']
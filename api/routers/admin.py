@@ -0,0 +1,114 @@
+import hmac
+import logging
+from datetime import datetime, timezone
+from typing import Optional
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from sqlalchemy.exc import SQLAlchemyError, TimeoutError as PoolTimeoutError
+
+from ..core.config import settings
+from ..core.vote_archive import ArchiveError, list_rounds, load_manifest, query_votes
+from ..core.vote_export import open_export_connection, stream_votes
+from ..models.schemas import ErrorResponse
+
+logger = logging.getLogger(__name__)
+
+# Operator endpoints. Disabled (404) unless ADMIN_API_TOKEN is set; callers send it as a Bearer token.
+
+
+def require_admin(authorization: Optional[str] = Header(None)):
+    if not settings.ADMIN_API_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), settings.ADMIN_API_TOKEN.encode()):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid admin token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+_MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+def _utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Query times without an offset are UTC, so naive and aware values compare (and filter) alike."""
+    if value is None:
+        return None
+    return value.astimezone(timezone.utc) if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+@router.get(
+    "/votes/export",
+    response_class=StreamingResponse,
+    responses={
+        400: {"model": ErrorResponse},
+        401: {"model": ErrorResponse},
+        429: {"model": ErrorResponse},
+        503: {"model": ErrorResponse},
+    }
+)
+async def export_votes(format: str = Query("csv", pattern="^(csv|ndjson)$"),
+                       start: Optional[datetime] = Query(None, description="Votes with vote_timestamp >= start."),
+                       end: Optional[datetime] = Query(None, description="Votes with vote_timestamp < end."),
+                       compress: bool = True):
+    """
+    Streams every vote (joined with its user and candidate) as CSV or NDJSON, gzip-compressed
+    unless `compress=false`. Rows are read through a server-side cursor, so the dump is never
+    held in memory, and on the export engine rather than the request pool.
+    """
+    start, end = _utc(start), _utc(end)
+    if start is not None and end is not None and start >= end:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="start must be before end.")
+    try:
+        connection = await run_in_threadpool(open_export_connection)
+    except PoolTimeoutError:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"At most {settings.EXPORT_MAX_CONCURRENT} exports can run at once. Please try again later.",
+        )
+    except SQLAlchemyError as e:
+        logger.error(f"Could not open an export connection: {e}")
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Database is unavailable.")
+
+    filename = f"votes-{datetime.utcnow():%Y%m%dT%H%M%SZ}.{format}" + (".gz" if compress else "")
+    logger.info("Starting vote export %s (start=%s, end=%s).", filename, start, end)
+    return StreamingResponse(
+        stream_votes(connection, format, start, end, compress), # Iterated in the threadpool
+        media_type="application/gzip" if compress else _MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        # stream_votes closes the connection once iterated; a client gone before the body starts never iterates it
+        background=BackgroundTask(connection.close),
+    )
+
+
+@router.get("/archive/rounds")
+async def get_archived_rounds():
+    """Closed rounds moved to the cold archive, with their vote counts."""
+    return {"rounds": await run_in_threadpool(list_rounds)}
+
+
+@router.get("/archive/rounds/{round_name}", responses={404: {"model": ErrorResponse}})
+async def get_archived_round(round_name: str):
+    """Manifest of an archived round: time range, files and verified per-candidate counts (its results)."""
+    try:
+        return await run_in_threadpool(load_manifest, round_name)
+    except ArchiveError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+
+
+@router.get("/archive/rounds/{round_name}/votes", responses={404: {"model": ErrorResponse}})
+async def get_archived_votes(round_name: str, candidate_id: Optional[UUID] = None, user_identifier: Optional[str] = None,
+                             limit: int = Query(100, ge=1, le=1000)):
+    """Votes of an archived round, filtered by candidate and/or user, read from the Parquet files in place."""
+    try:
+        votes = await run_in_threadpool(query_votes, round_name, candidate_id, user_identifier, limit)
+    except ArchiveError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    return {"round": round_name, "votes": votes}
@@ -0,0 +1,34 @@
+from fastapi import APIRouter, Request, status
+from fastapi.responses import JSONResponse
+import time
+
+router = APIRouter()
+
+# Health endpoints for the orchestrator / load balancer. Both only read state kept in memory:
+# dependency checks run in the background (services/health_service.py), never per request.
+
+
+@router.get("/healthz")
+async def liveness():
+    """Liveness: the process is up and serving requests. Never depends on external services."""
+    return {"status": "ok"}
+
+
+@router.get("/readyz")
+async def readiness(request: Request):
+    """
+    Readiness: whether this replica should receive traffic, from the cached probe results.
+    Returns 503 while a required check (HEALTH_REQUIRED_CHECKS) fails or the probes have stalled.
+    """
+    monitor = request.app.state.health_monitor
+    snapshot = monitor.snapshot
+    ready = monitor.is_ready()
+    return JSONResponse(
+        status_code=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={
+            "status": "ready" if ready else "not_ready",
+            "checks": snapshot.checks,
+            "details": snapshot.details,
+            "checked_seconds_ago": round(time.monotonic() - snapshot.checked_at, 3) if snapshot.checked_at else None,
+        },
+    )
@@ -1,17 +1,25 @@
-from fastapi import APIRouter, Request, HTTPException, status, Depends
+from fastapi import APIRouter, Request, HTTPException, status, Depends, Header, Path, Query
+from fastapi.responses import ORJSONResponse
+from datetime import datetime
 from typing import Optional
 from uuid import UUID
 from sqlalchemy.orm import Session # Import Session type
+import logging
 
-from ..models.schemas import VotePayload, VoteResponse, ResultsResponse, ErrorResponse
+from ..models.schemas import VotePayload, VoteResponse, ResultsResponse, ErrorResponse, VoteBatchRequest, VoteBatchResponse, VoteReceiptStatus, CardinalityResponse, TimelineResponse
 from ..services.vote_service import VoteService
+from ..core.config import settings
+from ..core import redis_keys
 from ..core.database import get_db # Import DB dependency
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+
+def get_vote_service(request: Request) -> VoteService:
+    """The VoteService created in the application lifespan (see main.py)."""
+    return request.app.state.vote_service
 
-# Initialize VoteService. Dependencies like DB session and cache will be handled
-# by FastAPI's dependency injection in get_vote_results if needed there.
-vote_service = VoteService()
 
 @router.post(
     "/vote",
@@ -21,23 +29,29 @@ vote_service = VoteService()
         400: {"model": ErrorResponse},
         401: {"model": ErrorResponse},
         403: {"model": ErrorResponse},
+        409: {"model": ErrorResponse}, # Idempotency-Key still in flight
+        422: {"model": ErrorResponse}, # Idempotency-Key reused for a different vote
         429: {"model": ErrorResponse},
         500: {"model": ErrorResponse},
         503: {"model": ErrorResponse}, # Add 503 for service unavailable
     }
 )
-async def post_vote(request: Request, payload: VotePayload):
+async def post_vote(request: Request, payload: VotePayload, vote_service: VoteService = Depends(get_vote_service),
+                    idempotency_key: Optional[str] = Header(None, min_length=1, max_length=255)):
     """
     Accept a user's vote and queue it for processing.
     Basic validation and authentication check occurs here.
     Detailed validation and uniqueness check are done by asynchronous workers.
+    Clients that retry should send the same `Idempotency-Key` header: a repeat gets the
+    original 202 response back and the vote is not queued again.
     """
     source_ip = request.client.host
     user_agent = request.headers.get("User-Agent", "Unknown")
 
     try:
-        response = await vote_service.process_vote_request(payload, source_ip, user_agent)
-        return response
+        response = await vote_service.process_vote_request(payload, source_ip, user_agent, idempotency_key=idempotency_key)
+        # Built by the service from trusted values: serialize directly instead of re-validating against response_model
+        return ORJSONResponse(content=response.model_dump(), status_code=status.HTTP_202_ACCEPTED)
     except HTTPException as e:
         # Re-raise HTTPExceptions raised by the service layer (e.g., 401, 429, 503)
         raise e
@@ -51,6 +65,60 @@ async def post_vote(request: Request, payload: VotePayload):
         )
 
 
+@router.get(
+    "/vote/{receipt_id}",
+    response_model=VoteReceiptStatus,
+    responses={
+        404: {"model": ErrorResponse},
+        503: {"model": ErrorResponse},
+    }
+)
+async def get_vote_status(receipt_id: str = Path(..., pattern=r"^[0-9a-f]{1,16}-[0-9a-f]{32}$"),
+                          vote_service: VoteService = Depends(get_vote_service)):
+    """
+    Processing status of a submitted vote, by the `receipt_id` of its 202 response:
+    `pending` until a worker has handled it, then `processed`, `duplicate`, `retry`
+    (waiting in a retry queue), `failed` or `dlq`. Answered from Redis only.
+    """
+    response = await vote_service.get_vote_receipt(receipt_id)
+    return ORJSONResponse(content=response.model_dump())
+
+
+@router.post(
+    "/votes:batch",
+    response_model=VoteBatchResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+    responses={
+        413: {"model": ErrorResponse},
+        500: {"model": ErrorResponse},
+    }
+)
+async def post_vote_batch(request: Request, payload: VoteBatchRequest, vote_service: VoteService = Depends(get_vote_service)):
+    """
+    Accept many votes at once (e.g. replayed by an edge proxy or kiosk after being offline).
+    Always answers per vote: `results[i].status_code` is what POST /vote would have returned
+    for vote i, so clients retry only the votes rejected with 429 or 503.
+    """
+    if len(payload.votes) > settings.VOTE_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"A batch may contain at most {settings.VOTE_BATCH_MAX_ITEMS} votes.",
+        )
+    source_ip = request.client.host
+    user_agent = request.headers.get("User-Agent", "Unknown")
+
+    try:
+        return await vote_service.process_vote_batch(payload.votes, source_ip, user_agent)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        logger.error(f"Unhandled error in /votes:batch endpoint: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An unexpected error occurred during batch vote submission.",
+        )
+
+
 @router.get(
     "/results",
     response_model=ResultsResponse,
@@ -59,7 +127,8 @@ async def post_vote(request: Request, payload: VotePayload):
         503: {"model": ErrorResponse}, # Add 503 for service unavailable
     }
 )
-async def get_results(db: Session = Depends(get_db), candidate_id: Optional[UUID] = None, page: int = 1, limit: int = 100):
+async def get_results(db: Session = Depends(get_db), candidate_id: Optional[UUID] = None, page: int = 1, limit: int = 100,
+                      vote_service: VoteService = Depends(get_vote_service)):
     """
     Get the current aggregated results of the voting.
     Results are fetched from cache (Redis) or the database.
@@ -71,6 +140,11 @@ async def get_results(db: Session = Depends(get_db), candidate_id: Optional[UUID
         raise HTTPException(status_code=400, detail="Limit must be between 1 and 100.")
 
     try:
+        # Fast path: the cached page is returned as is (it was validated when cached)
+        cached_results = await vote_service.get_cached_results(candidate_id=candidate_id, page=page, limit=limit)
+        if cached_results is not None:
+            return ORJSONResponse(content=cached_results)
+
         # Pass the DB session dependency to the service method
         results = await vote_service.get_vote_results(db=db, candidate_id=candidate_id, page=page, limit=limit)
         return results
@@ -86,3 +160,47 @@ async def get_results(db: Session = Depends(get_db), candidate_id: Optional[UUID
             # Add error_code
         )
 
+
+
+@router.get(
+    "/results/cardinality",
+    response_model=CardinalityResponse,
+    responses={
+        400: {"model": ErrorResponse},
+        503: {"model": ErrorResponse},
+    }
+)
+async def get_results_cardinality(candidate_id: Optional[UUID] = None, ip: Optional[str] = None,
+                                  vote_service: VoteService = Depends(get_vote_service)):
+    """
+    Estimated number of distinct voters and distinct source IPs, overall and per candidate,
+    plus distinct voters from the /24 (IPv6: /48) network of `ip` if given.
+    Read from HyperLogLogs in Redis (about 0.81% standard error), never from the votes table.
+    """
+    ip_block = None
+    if ip is not None:
+        ip_block = redis_keys.source_ip_block(ip.split("/")[0])
+        if ip_block is None:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="ip must be an IPv4 or IPv6 address.")
+    return await vote_service.get_cardinality(candidate_id=candidate_id, ip_block=ip_block)
+
+
+@router.get(
+    "/results/timeline",
+    response_model=TimelineResponse,
+    responses={
+        400: {"model": ErrorResponse},
+        503: {"model": ErrorResponse},
+    }
+)
+async def get_results_timeline(candidate_id: Optional[UUID] = None,
+                               granularity: Optional[str] = Query(None, pattern="^(minute|hour)$"),
+                               start: Optional[datetime] = Query(None, description="Votes with vote_timestamp >= start (default: end - 24h)."),
+                               end: Optional[datetime] = Query(None, description="Votes with vote_timestamp < end (default: now)."),
+                               points: int = Query(120, ge=1, le=1000, description="Max points per series; buckets are summed to fit."),
+                               vote_service: VoteService = Depends(get_vote_service)):
+    """
+    Valid votes over time per candidate (or for `candidate_id` only), for trend charts.
+    Read from the per-minute / per-hour rollups the worker maintains, never from the votes table.
+    """
+    return await vote_service.get_timeline(candidate_id=candidate_id, granularity=granularity, start=start, end=end, points=points)
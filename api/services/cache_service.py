@@ -1,30 +1,142 @@
-import redis
-from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
+import asyncio
+import redis.asyncio as aioredis
+from redis.exceptions import ConnectionError as RedisConnectionError, ResponseError, TimeoutError as RedisTimeoutError
 from typing import Dict, Any, List, Optional
 from datetime import datetime
 import json
 import logging
+import orjson
 from uuid import UUID
 
 from ..models.schemas import ResultsResponse, CandidateResult # Assuming schemas are importable
+from ..core.config import settings
+from ..core import redis_keys
+from ..core.metrics import CACHE_OPERATION_LATENCY, RATE_LIMIT_LATENCY, RESULTS_CACHE_REQUESTS, time_async
+from ..core.circuit_breaker import CircuitBreaker, CircuitOpenError
 
 logger = logging.getLogger(__name__)
 
+# Fixed-window rate limit for several calls of one key.
+# KEYS[1]: rate limit key; ARGV[1]: limit, ARGV[2]: window seconds, ARGV[3]: calls requested.
+# Counts only the calls that fit in the window and returns how many were allowed.
+# One key per script call, so keys in different Redis Cluster slots never meet in one EVAL
+# (CROSSSLOT); allowed_calls pipelines one call per key instead.
+_RATE_LIMIT_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local used = tonumber(redis.call('GET', KEYS[1]) or '0')
+local granted = math.max(0, math.min(requested, limit - used))
+if granted > 0 then
+    if redis.call('INCRBY', KEYS[1], granted) == granted then
+        redis.call('EXPIRE', KEYS[1], window)
+    end
+end
+return granted
+"""
+
+
+def is_redis_failure(e: BaseException) -> bool:
+    """Errors that mean Redis itself is unavailable (counted by the Redis circuit breaker)."""
+    return isinstance(e, (RedisConnectionError, RedisTimeoutError))
+
+
+# Errors Redis returns for a command that can never work (a bug in our keys or commands)
+_MISUSE_ERROR_PREFIXES = ("CROSSSLOT", "WRONGTYPE")
+
+
+def is_redis_misuse(e: BaseException) -> bool:
+    """
+    A ResponseError caused by the command itself (keys in different cluster slots, a key of the wrong type),
+    not by the state of Redis (OOM, READONLY during a failover, LOADING, NOSCRIPT, ...).
+    Pipelines and scripts prefix the error with their own context ("...caused error: WRONGTYPE ...").
+    """
+    if not isinstance(e, ResponseError) or not e.args:
+        return False
+    message = str(e.args[0])
+    return any(message.startswith(prefix) or f": {prefix} " in message for prefix in _MISUSE_ERROR_PREFIXES)
+
+
 class CacheService:
-    def __init__(self, redis_client: redis.Redis, results_cache_ttl_seconds: int):
+    """
+    Results cache and rate limiting on a redis.asyncio client, so a slow Redis only delays the
+    requests waiting on it instead of blocking the event loop. Every command goes through the
+    Redis circuit breaker and is bounded by `call_timeout_seconds` (connecting included);
+    timeouts count as Redis failures. Callers keep the fail-open semantics:
+    cache reads return None and rate limits allow the request when Redis misbehaves.
+    """
+    def __init__(self, redis_client: aioredis.Redis, results_cache_ttl_seconds: int, breaker: Optional[CircuitBreaker] = None,
+                 call_timeout_seconds: Optional[float] = None):
         self._redis_client = redis_client
+        # While Redis is down, skip it at once instead of waiting for a socket error on each request
+        self._breaker = breaker or CircuitBreaker("redis", is_failure=is_redis_failure)
+        self._call_timeout = call_timeout_seconds or settings.REDIS_CALL_TIMEOUT_SECONDS
         self._results_cache_ttl = results_cache_ttl_seconds
-        self._results_cache_key = "voting_results"
         # Rate Limiting Config (Example)
         self._rate_limit_key_prefix = "rate_limit:"
         self._rate_limit_calls = 100 # Example: 100 calls
         self._rate_limit_window_seconds = 60 # Example: per 60 seconds
+        self._rate_limit_script = self._redis_client.register_script(_RATE_LIMIT_SCRIPT) if self._redis_client is not None else None
 
         if self._redis_client is None:
              logger.warning("CacheService initialized with no Redis client.")
 
+    async def _call(self, fn, *args, **kwargs):
+        """Runs one Redis command (coroutine function) through the breaker, within the call timeout."""
+        async def bounded():
+            try:
+                return await asyncio.wait_for(fn(*args, **kwargs), self._call_timeout)
+            except asyncio.TimeoutError:
+                raise RedisTimeoutError(f"Redis call timed out after {self._call_timeout}s")
+        return await self._breaker.call_async(bounded)
+
     # --- Results Caching ---
-    def get_results(self, candidate_id: Optional[UUID] = None, page: int = 1, limit: int = 100) -> Optional[ResultsResponse]:
+    @time_async(CACHE_OPERATION_LATENCY.labels(operation="get_results_raw"))
+    async def get_results_raw(self, candidate_id: Optional[UUID] = None, page: int = 1, limit: int = 100) -> Optional[Dict[str, Any]]:
+        """
+        Fast path of get_results for the /results endpoint: returns the cached payload as plain
+        JSON-ready data (filtered and paginated) without building or validating Pydantic models.
+        The cache is only ever written by set_results from validated models, already sorted.
+        Returns None on miss or error.
+        """
+        if self._redis_client is None:
+            return None
+
+        try:
+            # Replicated over several keys (see redis_keys) so cache reads spread over Redis Cluster nodes
+            cache_key = redis_keys.results_cache_read_key()
+            cached_results_json = await self._call(self._redis_client.get, cache_key)
+            if not cached_results_json:
+                RESULTS_CACHE_REQUESTS.labels(result="miss").inc()
+                return None
+            cached_data = orjson.loads(cached_results_json)
+            results = cached_data["results"]
+            if candidate_id:
+                candidate_id_str = str(candidate_id)
+                results = [res for res in results if res["candidate_id"] == candidate_id_str]
+            start = (page - 1) * limit
+            cached_data["results"] = results[start:start + limit]
+            RESULTS_CACHE_REQUESTS.labels(result="hit").inc()
+            return cached_data
+
+        except CircuitOpenError:
+            RESULTS_CACHE_REQUESTS.labels(result="error").inc()
+            return None # Redis known to be down: go straight to the fallback
+        except (RedisConnectionError, RedisTimeoutError) as e:
+            RESULTS_CACHE_REQUESTS.labels(result="error").inc()
+            logger.error(f"Redis error while getting results cache: {e}")
+            return None
+        except (orjson.JSONDecodeError, KeyError, TypeError) as e:
+            RESULTS_CACHE_REQUESTS.labels(result="error").inc()
+            logger.error(f"Failed to decode or parse cached results JSON: {e}. Invalidating cache.")
+            try:
+                await self._call(self._redis_client.delete, cache_key) # Invalidate bad replica
+            except Exception:
+                pass # Ignore error during invalidation
+            return None
+
+    @time_async(CACHE_OPERATION_LATENCY.labels(operation="get_results"))
+    async def get_results(self, candidate_id: Optional[UUID] = None, page: int = 1, limit: int = 100) -> Optional[ResultsResponse]:
         """
         Fetches cached results. Returns None if cache is miss, expired, or error.
         Applies filtering and pagination to the cached data internally.
@@ -34,7 +146,8 @@ class CacheService:
             return None
 
         try:
-            cached_results_json = self._redis_client.get(self._results_cache_key)
+            cache_key = redis_keys.results_cache_read_key()
+            cached_results_json = await self._call(self._redis_client.get, cache_key)
 
             if cached_results_json:
                 cached_data = json.loads(cached_results_json)
@@ -58,24 +171,34 @@ class CacheService:
                 # Keeping original cache time reflects when the cache was generated.
                 # cached_response.last_updated = datetime.utcnow()
 
+                RESULTS_CACHE_REQUESTS.labels(result="hit").inc()
                 return cached_response
 
+            RESULTS_CACHE_REQUESTS.labels(result="miss").inc()
+
+        except CircuitOpenError:
+            RESULTS_CACHE_REQUESTS.labels(result="error").inc()
+            return None # Redis known to be down: go straight to the fallback
         except (RedisConnectionError, RedisTimeoutError) as e:
+            RESULTS_CACHE_REQUESTS.labels(result="error").inc()
             logger.error(f"Redis error while getting results cache: {e}")
             return None
         except (json.JSONDecodeError, KeyError, ValueError) as e:
+             RESULTS_CACHE_REQUESTS.labels(result="error").inc()
              logger.error(f"Failed to decode or parse cached results JSON: {e}. Invalidating cache.")
              try:
-                  self._redis_client.delete(self._results_cache_key) # Invalidate bad cache
+                  await self._call(self._redis_client.delete, cache_key) # Invalidate bad replica
              except Exception:
                   pass # Ignore error during invalidation
              return None
         except Exception as e:
+            RESULTS_CACHE_REQUESTS.labels(result="error").inc()
             logger.error(f"An unexpected error occurred while processing cached results: {e}")
             return None
 
 
-    def set_results(self, results_list: List[CandidateResult]):
+    @time_async(CACHE_OPERATION_LATENCY.labels(operation="set_results"))
+    async def set_results(self, results_list: List[CandidateResult]):
         """
         Sets the full results cache. Expects a list of CandidateResult.
         """
@@ -84,20 +207,23 @@ class CacheService:
             return
 
         try:
-            # Create a ResultsResponse object to cache
+            # Create a ResultsResponse object to cache. Stored sorted by votes, so readers
+            # (get_results_raw) can paginate without sorting.
             full_cache_object = ResultsResponse(
-                results=results_list,
+                results=sorted(results_list, key=lambda r: r.vote_count, reverse=True),
                 last_updated=datetime.utcnow() # Timestamp when the cache is set
             )
 
             # Serialize and set with TTL
-            self._redis_client.setex(
-                self._results_cache_key,
-                self._results_cache_ttl,
-                full_cache_object.model_dump_json() # Use model_dump_json for Pydantic v2
-            )
-            logger.info(f"Results cache set in Redis with TTL {self._results_cache_ttl}s.")
+            payload = full_cache_object.model_dump_json() # Use model_dump_json for Pydantic v2
+            pipe = self._redis_client.pipeline(transaction=False) # Replicas live in different slots
+            for cache_key in redis_keys.results_cache_keys():
+                pipe.setex(cache_key, self._results_cache_ttl, payload)
+            await self._call(pipe.execute)
+            logger.debug("Results cache set in Redis with TTL %ss.", self._results_cache_ttl)
 
+        except CircuitOpenError:
+            logger.debug("Redis circuit open. Skipping results cache update.")
         except (RedisConnectionError, RedisTimeoutError) as e:
             logger.error(f"Redis error while setting results cache: {e}")
             # Decide logging/alerting policy on cache write failures
@@ -107,10 +233,12 @@ class CacheService:
 
     # --- Rate Limiting (Example) ---
     # Note: This is a basic Fixed Window implementation
-    def is_rate_limited(self, key: str) -> bool:
+    @time_async(RATE_LIMIT_LATENCY)
+    async def is_rate_limited(self, key: str) -> bool:
         """
         Checks and applies rate limit for a given key (e.g., user_id or IP).
-        Returns True if rate limited, False otherwise. Fail-open on Redis issues.
+        Returns True if rate limited, False otherwise. Fail-open while Redis is unavailable or refuses the
+        command; a ResponseError from a command that can never work (see is_redis_misuse) propagates instead.
         """
         if self._redis_client is None:
             logger.warning("Redis client not available in CacheService. Rate limiting is disabled.")
@@ -124,19 +252,144 @@ class CacheService:
             pipe.incr(redis_key)
             pipe.ttl(redis_key) # Check TTL
 
-            count, ttl = pipe.execute()
+            count, ttl = await self._call(pipe.execute)
 
             if ttl == -1: # Key exists but has no expiry (first request in window)
                 pipe_expire = self._redis_client.pipeline()
                 pipe_expire.expire(redis_key, self._rate_limit_window_seconds)
-                pipe_expire.execute() # Execute expire separately
+                await self._call(pipe_expire.execute) # Execute expire separately
 
             return count > self._rate_limit_calls
 
+        except CircuitOpenError:
+            return False # Fail open without waiting on Redis
         except (RedisConnectionError, RedisTimeoutError) as e:
             logger.error(f"Redis error during rate limit check for key '{key}': {e}. Rate limiting is deactivated for this request.")
             return False # Fail open on Redis error
+        except ResponseError as e:
+            if is_redis_misuse(e):
+                logger.error(f"Redis refused the rate limit check for key '{key}': {e}")
+                raise
+            logger.error(f"Redis refused the rate limit check for key '{key}': {e}. Rate limiting is deactivated for this request.")
+            return False # Fail open: OOM, READONLY during a failover, LOADING, ...
         except Exception as e:
             logger.error(f"An unexpected error occurred during rate limit check for key '{key}': {e}")
             return False # Fail open on other errors
 
+    @time_async(RATE_LIMIT_LATENCY)
+    async def allowed_calls(self, requested: Dict[str, int]) -> Dict[str, int]:
+        """
+        Batch variant of is_rate_limited: for each key, how many of the requested calls still fit
+        in its window (those are counted). One pipelined round trip with one script call per key.
+        Fail-open while Redis is unavailable or refuses the command (everything requested is allowed);
+        a ResponseError from a command that can never work (see is_redis_misuse) propagates.
+        """
+        if self._redis_client is None or not requested:
+            return dict(requested)
+
+        keys = list(requested)
+        try:
+            pipe = self._redis_client.pipeline(transaction=False) # Keys live in different cluster slots
+            for key in keys:
+                await self._rate_limit_script( # Only queues the EVALSHA on the pipeline
+                    keys=[f"{self._rate_limit_key_prefix}{key}"],
+                    args=[self._rate_limit_calls, self._rate_limit_window_seconds, requested[key]],
+                    client=pipe,
+                )
+            allowed = await self._call(pipe.execute)
+            return {key: int(count) for key, count in zip(keys, allowed)}
+        except CircuitOpenError:
+            return dict(requested) # Fail open without waiting on Redis
+        except (RedisConnectionError, RedisTimeoutError) as e:
+            logger.error(f"Redis error during batch rate limit check for {len(keys)} keys: {e}. Rate limiting is deactivated for this batch.")
+            return dict(requested)
+        except ResponseError as e:
+            if is_redis_misuse(e):
+                logger.error(f"Redis refused the batch rate limit check for {len(keys)} keys: {e}")
+                raise
+            logger.error(f"Redis refused the batch rate limit check for {len(keys)} keys: {e}. Rate limiting is deactivated for this batch.")
+            return dict(requested) # Fail open: OOM, READONLY during a failover, LOADING, ...
+
+    # --- Vote receipts ---
+    @time_async(CACHE_OPERATION_LATENCY.labels(operation="get_vote_receipt"))
+    async def get_vote_receipt(self, receipt_id: str) -> Optional[str]:
+        """
+        Outcome the worker recorded for a vote receipt (see redis_keys), or None if there is none yet.
+        Not fail-open: Redis errors and CircuitOpenError propagate, since a missing value means "pending".
+        Raises ValueError for a malformed receipt.
+        """
+        key, field, _ = redis_keys.vote_receipt_location(receipt_id)
+        return await self._call(self._redis_client.hget, key, field)
+
+    # --- Distinct counts (HyperLogLogs) ---
+    @time_async(CACHE_OPERATION_LATENCY.labels(operation="count_distinct"))
+    async def count_distinct(self, keys: List[str]) -> List[int]:
+        """
+        PFCOUNT of each HyperLogLog in one pipelined round trip (0 for a missing key).
+        Not fail-open: Redis errors and CircuitOpenError propagate.
+        """
+        pipe = self._redis_client.pipeline(transaction=False) # Keys live in different cluster slots
+        for key in keys:
+            pipe.pfcount(key)
+        return await self._call(pipe.execute)
+
+    # --- Vote rollups ---
+    @time_async(CACHE_OPERATION_LATENCY.labels(operation="get_rollups"))
+    async def get_rollups(self, keys: List[str], candidate_id: Optional[UUID] = None) -> List[Optional[Dict[str, str]]]:
+        """
+        Contents of each rollup hash (see redis_keys) in one pipelined round trip: every candidate,
+        or only `candidate_id`. None for a key Redis does not hold (no votes, expired or evicted).
+        Not fail-open: Redis errors and CircuitOpenError propagate.
+        """
+        pipe = self._redis_client.pipeline(transaction=False) # Buckets live in different cluster slots
+        for key in keys:
+            if candidate_id is None:
+                pipe.hgetall(key) # Empty for a missing key: a rollup hash is never empty
+            else:
+                pipe.hget(key, str(candidate_id))
+                pipe.exists(key)
+        values = await self._call(pipe.execute)
+        if candidate_id is None:
+            return [value or None for value in values]
+        return [
+            ({str(candidate_id): value} if value is not None else {}) if exists else None
+            for value, exists in zip(values[::2], values[1::2])
+        ]
+
+    # --- Plain keys (idempotency records) ---
+    async def claim_key(self, key: str, value: str, ttl_seconds: int) -> Optional[str]:
+        """
+        SET key value NX EX ttl. Returns None if the key was set (claimed), else its current value.
+        Fail-open: returns None on Redis issues.
+        """
+        if self._redis_client is None:
+            return None
+        try:
+            if await self._call(self._redis_client.set, key, value, nx=True, ex=ttl_seconds):
+                return None
+            return await self._call(self._redis_client.get, key) # None if it expired in between
+        except CircuitOpenError:
+            return None
+        except (RedisConnectionError, RedisTimeoutError) as e:
+            logger.error(f"Redis error while claiming key '{key}': {e}.")
+            return None
+
+    async def set_key(self, key: str, value: str, ttl_seconds: int):
+        if self._redis_client is None:
+            return
+        try:
+            await self._call(self._redis_client.set, key, value, ex=ttl_seconds)
+        except CircuitOpenError:
+            pass
+        except (RedisConnectionError, RedisTimeoutError) as e:
+            logger.error(f"Redis error while setting key '{key}': {e}.")
+
+    async def delete_key(self, key: str):
+        if self._redis_client is None:
+            return
+        try:
+            await self._call(self._redis_client.delete, key)
+        except CircuitOpenError:
+            pass
+        except (RedisConnectionError, RedisTimeoutError) as e:
+            logger.error(f"Redis error while deleting key '{key}': {e}.")
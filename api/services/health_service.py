@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from sqlalchemy import text
+
+from ..core.config import settings
+from ..core.database import engine, DB_POOL_SIZE, DB_MAX_OVERFLOW
+from ..core.metrics import HEALTH_CHECK_STATUS, DB_POOL_UTILIZATION
+from .vote_service import VoteService
+
+logger = logging.getLogger(__name__)
+
+CHECKS = ("rabbitmq", "redis", "db", "db_pool")
+
+
+@dataclass
+class HealthSnapshot:
+    """Result of one probe round. `checks` maps check name to ok; `details` holds short explanations."""
+    checks: Dict[str, bool] = field(default_factory=dict)
+    details: Dict[str, str] = field(default_factory=dict)
+    checked_at: float = 0.0 # time.monotonic() of the probe round
+
+
+class HealthMonitor:
+    """
+    Probes the API's dependencies in a background loop and caches the result, so /readyz
+    never touches RabbitMQ, Redis or PostgreSQL itself and costs nothing under load.
+
+    Checks:
+    - rabbitmq: the publish channel is open, or votes can be spooled locally instead.
+    - redis: PING on the async client (while the Redis monitor reports it up).
+    - db: SELECT 1 through the connection pool.
+    - db_pool: checked-out connections below HEALTH_DB_POOL_MAX_UTILIZATION of the pool capacity.
+    Blocking (DB) probes run in worker threads with HEALTH_PROBE_TIMEOUT_SECONDS; a probe still
+    running from a previous round is not started again.
+    """
+
+    def __init__(self, vote_service: VoteService):
+        self._vote_service = vote_service
+        self._interval = settings.HEALTH_PROBE_INTERVAL_SECONDS
+        self._timeout = settings.HEALTH_PROBE_TIMEOUT_SECONDS
+        self._required = [name.strip() for name in settings.HEALTH_REQUIRED_CHECKS.split(",") if name.strip()]
+        unknown = [name for name in self._required if name not in CHECKS]
+        if unknown:
+            raise ValueError(f"Unknown HEALTH_REQUIRED_CHECKS {unknown}; expected some of {CHECKS}")
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self.snapshot = HealthSnapshot()
+
+    # --- Probes ---
+    async def _probe_in_thread(self, name: str, fn) -> Optional[str]:
+        """Runs a blocking probe off the event loop. Returns None if ok, else the failure reason."""
+        future = self._in_flight.get(name)
+        if future is None or future.done():
+            future = asyncio.ensure_future(asyncio.to_thread(fn))
+            self._in_flight[name] = future
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self._timeout)
+            return None
+        except asyncio.TimeoutError:
+            return f"timed out after {self._timeout}s"
+        except Exception as e:
+            return repr(e)
+
+    async def _probe_async(self, fn) -> Optional[str]:
+        """Runs an async probe with the probe timeout. Returns None if ok, else the failure reason."""
+        try:
+            await asyncio.wait_for(fn(), self._timeout)
+            return None
+        except asyncio.TimeoutError:
+            return f"timed out after {self._timeout}s"
+        except Exception as e:
+            return repr(e)
+
+    @staticmethod
+    def _select_one():
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+
+    def _check_db_pool(self) -> Optional[str]:
+        capacity = DB_POOL_SIZE + DB_MAX_OVERFLOW
+        utilization = engine.pool.checkedout() / capacity
+        DB_POOL_UTILIZATION.set(utilization)
+        if utilization > settings.HEALTH_DB_POOL_MAX_UTILIZATION:
+            return f"{engine.pool.checkedout()}/{capacity} connections checked out"
+        return None
+
+    async def probe(self) -> HealthSnapshot:
+        """Runs all checks once and replaces the cached snapshot."""
+        failures: Dict[str, Optional[str]] = {}
+
+        connections = self._vote_service.readiness()
+        if connections["rabbitmq"]:
+            failures["rabbitmq"] = None
+        elif connections["spool"]:
+            failures["rabbitmq"] = None # Disconnected, but votes are spooled until it is back
+        else:
+            failures["rabbitmq"] = "channel closed and spool unavailable"
+
+        redis_client = self._vote_service.redis_client
+        if redis_client is None:
+            failures["redis"] = "not connected"
+        else:
+            failures["redis"] = await self._probe_async(redis_client.ping)
+
+        failures["db"] = await self._probe_in_thread("db", self._select_one)
+        failures["db_pool"] = self._check_db_pool()
+
+        snapshot = HealthSnapshot(checked_at=time.monotonic())
+        for name in CHECKS:
+            ok = failures[name] is None
+            snapshot.checks[name] = ok
+            if not ok:
+                snapshot.details[name] = failures[name]
+            HEALTH_CHECK_STATUS.labels(check=name).set(1 if ok else 0)
+        if not connections["rabbitmq"] and connections["spool"]:
+            snapshot.details["rabbitmq"] = "disconnected; spooling votes"
+
+        previous = self.snapshot.checks
+        for name, ok in snapshot.checks.items():
+            if name in previous and previous[name] != ok:
+                logger.warning("Health check '%s' is now %s%s", name, "ok" if ok else "failing",
+                               f": {snapshot.details[name]}" if name in snapshot.details else ".")
+        self.snapshot = snapshot
+        return snapshot
+
+    async def run(self):
+        """Background task: probes every HEALTH_PROBE_INTERVAL_SECONDS until cancelled."""
+        while True:
+            try:
+                await self.probe()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Health probe round failed: {e}", exc_info=True)
+            await asyncio.sleep(self._interval)
+
+    # --- Readiness ---
+    def is_ready(self) -> bool:
+        """Ready when the required checks passed in a recent probe round (a stalled monitor means not ready)."""
+        snapshot = self.snapshot
+        if time.monotonic() - snapshot.checked_at > 3 * self._interval + self._timeout:
+            return False
+        return all(snapshot.checks.get(name, False) for name in self._required)
@@ -0,0 +1,109 @@
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from ..core.metrics import IDEMPOTENT_REPLAYS
+
+logger = logging.getLogger(__name__)
+
+# Value of a claimed key whose request has not finished yet
+PENDING = "pending"
+
+
+class IdempotencyConflict(Exception):
+    """The key is in use by a request still in flight, or was used for a different vote."""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason # in_progress | mismatch
+
+
+class IdempotencyStore:
+    """
+    Remembers the response of each `Idempotency-Key` (per user) so a client retrying POST /vote
+    gets the original 202 back instead of publishing the vote again.
+
+    Lookups go to a per-process LRU first, then Redis. A new key is claimed in Redis with
+    SET NX (a short-lived PENDING marker while the vote is published) and then overwritten
+    with the response for `ttl_seconds`. Without Redis only the LRU deduplicates (fail open).
+    """
+
+    def __init__(self, cache_service_getter, ttl_seconds: int, pending_ttl_seconds: int, lru_size: int):
+        self._cache_service = cache_service_getter # Returns the current CacheService or None
+        self._ttl = ttl_seconds
+        self._pending_ttl = pending_ttl_seconds
+        self._lru_size = lru_size
+        self._lru: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict() # key -> (expires at, record)
+
+    @staticmethod
+    def redis_key(user_id: str, idempotency_key: str) -> str:
+        return f"idempotency:{user_id}:{idempotency_key}"
+
+    # --- LRU ---
+    def _lru_get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._lru.get(key)
+        if entry is None:
+            return None
+        expires_at, record = entry
+        if expires_at < time.monotonic():
+            del self._lru[key]
+            return None
+        self._lru.move_to_end(key)
+        return record
+
+    def _lru_put(self, key: str, record: Dict[str, Any]):
+        self._lru[key] = (time.monotonic() + self._ttl, record)
+        self._lru.move_to_end(key)
+        while len(self._lru) > self._lru_size:
+            self._lru.popitem(last=False)
+
+    # --- Claim / complete ---
+    @staticmethod
+    def _check(record: Dict[str, Any], fingerprint: str) -> Dict[str, Any]:
+        if record.get("fingerprint") != fingerprint:
+            raise IdempotencyConflict("mismatch")
+        return record["response"]
+
+    async def claim(self, key: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns the stored response if `key` was already used for this vote (the caller replays it),
+        or None if the caller now owns the key and must call complete() or release().
+        Raises IdempotencyConflict if the key is in flight or belongs to a different vote.
+        """
+        record = self._lru_get(key)
+        if record is not None:
+            IDEMPOTENT_REPLAYS.labels(source="memory").inc()
+            return self._check(record, fingerprint)
+
+        cache_service = self._cache_service()
+        if cache_service is None:
+            return None
+        existing = await cache_service.claim_key(key, PENDING, self._pending_ttl) # None if claimed (or Redis failed)
+        if existing is None:
+            return None
+        if existing == PENDING:
+            raise IdempotencyConflict("in_progress")
+        try:
+            record = json.loads(existing)
+        except ValueError:
+            logger.warning("Ignoring unreadable idempotency record for %s.", key)
+            return None
+        self._lru_put(key, record)
+        IDEMPOTENT_REPLAYS.labels(source="redis").inc()
+        return self._check(record, fingerprint)
+
+    async def complete(self, key: str, fingerprint: str, response: Dict[str, Any]):
+        """Stores the (JSON-ready) response of a claimed key."""
+        record = {"fingerprint": fingerprint, "response": response}
+        self._lru_put(key, record)
+        cache_service = self._cache_service()
+        if cache_service is not None:
+            await cache_service.set_key(key, json.dumps(record), self._ttl)
+
+    async def release(self, key: str):
+        """Frees a claimed key after a failed request, so the client's retry is processed."""
+        cache_service = self._cache_service()
+        if cache_service is not None:
+            await cache_service.delete_key(key)
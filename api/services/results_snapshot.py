@@ -0,0 +1,57 @@
+import threading
+import time
+from datetime import datetime
+from typing import List, Optional
+from uuid import UUID
+
+from ..models.schemas import CandidateResult, ResultsResponse
+from ..core.metrics import RESULTS_STALE_SERVED, RESULTS_SNAPSHOT_AGE
+
+
+class ResultsSnapshot:
+    """
+    Last known good full results list (all candidates, sorted by votes), kept in process memory.
+
+    Refreshed whenever the API builds results from Redis (results cache or counters) or from
+    the DB aggregation fallback. While those sources are unavailable, /results is served from
+    the snapshot and marked `stale`, up to `max_staleness_seconds` after the last refresh;
+    past that, callers get the original 503 instead of arbitrarily old numbers.
+    """
+
+    def __init__(self, max_staleness_seconds: float):
+        self._max_staleness = max_staleness_seconds
+        self._lock = threading.Lock()
+        self._results: Optional[List[CandidateResult]] = None
+        self._last_updated: Optional[datetime] = None # When the data was produced (e.g. cache write time)
+        self._refreshed_at = 0.0 # time.monotonic() of the last update()
+
+    @property
+    def age(self) -> Optional[float]:
+        """Seconds since the last refresh, or None if never refreshed."""
+        if self._results is None:
+            return None
+        return time.monotonic() - self._refreshed_at
+
+    def update(self, results: List[CandidateResult], last_updated: Optional[datetime] = None):
+        ordered = sorted(results, key=lambda r: r.vote_count, reverse=True)
+        with self._lock:
+            self._results = ordered
+            self._last_updated = last_updated or datetime.utcnow()
+            self._refreshed_at = time.monotonic()
+        RESULTS_SNAPSHOT_AGE.set(0)
+
+    def page(self, candidate_id: Optional[UUID] = None, page: int = 1, limit: int = 100) -> Optional[ResultsResponse]:
+        """A stale-marked results page, or None if there is no snapshot or it is older than allowed."""
+        with self._lock:
+            results, last_updated, age = self._results, self._last_updated, self.age
+        if results is None:
+            return None
+        RESULTS_SNAPSHOT_AGE.set(age)
+        if age > self._max_staleness:
+            return None
+        if candidate_id:
+            results = [res for res in results if res.candidate_id == candidate_id]
+        start = (page - 1) * limit
+        RESULTS_STALE_SERVED.inc()
+        # Built from already validated results: skip validation
+        return ResultsResponse.model_construct(results=results[start:start + limit], last_updated=last_updated, stale=True)
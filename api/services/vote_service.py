@@ -1,211 +1,748 @@
+import asyncio
 import json
-from datetime import datetime
+import math
+import sys
+import time
+from datetime import datetime, timezone
 from uuid import UUID
 import pika # Using blocking pika as per example, note: async client like aio-pika is better for FastAPI
 # from aio_pika import connect_robust # Example: For async FastAPI
 from fastapi import HTTPException, status, Depends
-from typing import Dict, Any, List, Optional
-import redis
-from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
+from typing import Dict, Any, List, Optional, Tuple
+import redis.asyncio as aioredis
+from redis.exceptions import ConnectionError as RedisConnectionError, ResponseError, TimeoutError as RedisTimeoutError
 import logging
 from sqlalchemy.orm import Session # Import Session type for type hints
-from sqlalchemy import select # Import select for ORM queries
+from sqlalchemy import select, func # Import select for ORM queries
 from sqlalchemy.exc import SQLAlchemyError
-from tenacity import retry, stop_after_attempt, wait_fixed, wait_random_exponential, retry_if_exception_type
 
-from ..models.schemas import VotePayload, VoteResponse, ResultsResponse, CandidateResult
-from ..models.database_models import Candidate # Import SQLAlchemy models
+from ..models.schemas import VotePayload, VoteResponse, ResultsResponse, CandidateResult, VoteBatchItemResult, VoteBatchResponse, VoteReceiptStatus
+from ..models.schemas import CandidateCardinality, CardinalityResponse # HyperLogLog estimates
+from ..models.schemas import CandidateTimeline, TimelineResponse # Vote rollups
+from ..models.database_models import Candidate, Vote # Import SQLAlchemy models
 from ..core.config import settings
-from ..core.database import get_db # Import DB dependency
+from ..core.database import get_db, is_transient_db_error, SessionLocal # Import DB dependency
 from ..core.security import decode_user_token # Example - might need adjustment based on JWT
-from .cache_service import CacheService # Import the new CacheService
+from ..core.metrics import PUBLISH_LATENCY, DEPENDENCY_UP, UNKNOWN_CANDIDATE_VOTES
+from ..core.logging_config import EventLog
+from ..core.tracing import get_tracer, inject_trace_headers
+from opentelemetry.trace import SpanKind
+from ..core import queue_topology, redis_keys
+from ..core.circuit_breaker import CircuitBreaker, CircuitOpenError, CLOSED, OPEN
+from ..core.connections import Backoff, ConnectionManager, ConnectionThread
+from ..core.candidate_catalog import CandidateCatalog, load_candidate_ids
+from ..core.vote_rollups import downsample, read_rollups
+from .cache_service import CacheService, is_redis_failure # Import the new CacheService
+from .vote_spool import VoteSpool, SpoolFullError, claim_spool_directory
+from .results_snapshot import ResultsSnapshot
+from .idempotency import IdempotencyStore, IdempotencyConflict
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
+tracer = get_tracer(__name__)
 
 class VoteService:
+    """
+    Vote publishing and results. Construction does no I/O: the RabbitMQ connection is opened
+    (and reopened) in the background once start() is called. Redis is used through a
+    redis.asyncio client whose pool connects lazily; run_redis_monitor() tracks whether it is up.
+    """
     def __init__(self):
-        self.rabbitmq_connection = None
-        self.rabbitmq_channel = None
-        self.redis_client = None
-        self.cache_service = None
-        
-        try:
-            # Use tenacity for initial connection attempt
-            @retry(stop=stop_after_attempt(5), wait=wait_fixed(settings.WORKER_RECONNECT_DELAY_SECONDS/2),
-                   retry=retry_if_exception_type(pika.exceptions.AMQPConnectionError))
-            def connect_rabbitmq():
-                conn = pika.BlockingConnection(pika.URLParameters(settings.RABBITMQ_URL))
-                ch = conn.channel()
-                # Declare DLX and DLQ first
-                ch.exchange_declare(exchange=settings.RABBITMQ_DLX_EXCHANGE, exchange_type='fanout', durable=True)
-                ch.queue_declare(settings.RABBITMQ_DLQ_QUEUE, durable=True)
-                # Declare main queue with DLX argument
-                ch.queue_declare(
-                    queue=settings.RABBITMQ_QUEUE_NAME,
-                    durable=True,
-                    arguments={'x-dead-letter-exchange': settings.RABBITMQ_DLX_EXCHANGE}
-                )
-                logger.info("Successfully connected to RabbitMQ, declared queue, DLX, and DLQ.")
-                return conn, ch
+        self.spool = None
+        self._events = EventLog(logger, "Vote API")
+        # Last known good results, served (marked stale) while Redis / the DB cannot produce them
+        self.results_snapshot = ResultsSnapshot(settings.RESULTS_SNAPSHOT_MAX_STALENESS_SECONDS)
+        # Fail fast while a dependency is down instead of retrying it on every request
+        self._rabbitmq_breaker = CircuitBreaker("rabbitmq", is_failure=lambda e: isinstance(e, pika.exceptions.AMQPError))
+        self._redis_breaker = CircuitBreaker("redis", is_failure=is_redis_failure)
+        self._db_breaker = CircuitBreaker("postgres", is_failure=is_transient_db_error)
+
+        # (connection, channel) for publishing; reconnected with backoff when it drops.
+        # pika's BlockingConnection is not thread-safe: once connected, everything that touches it runs on one thread.
+        # Connection attempts run on the manager's own thread, so they never hold up publishes.
+        self._rabbitmq_thread = ConnectionThread("rabbitmq-io")
+        self._rabbitmq = ConnectionManager(
+            "rabbitmq", self._connect_rabbitmq,
+            close=lambda conn_ch: self._rabbitmq_thread.call(conn_ch[0].close),
+            is_alive=lambda conn_ch: self._rabbitmq_thread.call(self._rabbitmq_is_alive, conn_ch),
+        )
+        # One client per process: concurrent requests share its pool instead of blocking the event loop.
+        # A call beyond REDIS_POOL_MAX_CONNECTIONS fails at once ("Too many connections") and is
+        # handled like any Redis error (fail open). Not BlockingConnectionPool: in redis 5.0.1 its
+        # asyncio version deadlocks when a connection attempt fails.
+        self._redis_client = aioredis.Redis(connection_pool=aioredis.ConnectionPool.from_url(
+            settings.REDIS_URL,
+            max_connections=settings.REDIS_POOL_MAX_CONNECTIONS,
+            decode_responses=True,
+            socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT_SECONDS, # Bound the wait on a dead Redis
+            socket_timeout=settings.REDIS_SOCKET_TIMEOUT_SECONDS,
+        ))
+        self._redis_ready = False # Result of the last ping by run_redis_monitor()
+        DEPENDENCY_UP.labels(dependency="redis").set(0)
+        self._cache_service = CacheService(self._redis_client, settings.RESULTS_CACHE_TTL_SECONDS, breaker=self._redis_breaker)
+        # Responses of POST /vote requests that carried an Idempotency-Key
+        self.idempotency = IdempotencyStore(
+            lambda: self.cache_service,
+            ttl_seconds=settings.IDEMPOTENCY_TTL_SECONDS,
+            pending_ttl_seconds=settings.IDEMPOTENCY_PENDING_TTL_SECONDS,
+            lru_size=settings.IDEMPOTENCY_LRU_SIZE,
+        )
+        # Valid candidate IDs, so votes for unknown candidates are never published (see run_candidate_catalog_refresh)
+        self.candidate_catalog = CandidateCatalog(
+            lambda: self._db_breaker.call(load_candidate_ids),
+            refresh_seconds=settings.CANDIDATE_CATALOG_REFRESH_SECONDS,
+            miss_refresh_seconds=settings.CANDIDATE_CATALOG_MISS_REFRESH_SECONDS,
+        )
 
-            self.rabbitmq_connection, self.rabbitmq_channel = connect_rabbitmq()
+        if settings.VOTE_SPOOL_ENABLED:
+            # Votes the broker cannot take are written here and replayed by run_spool_replay().
+            # Each API process gets its own slot directory (see claim_spool_directory).
+            spool_directory, self._spool_lock = claim_spool_directory(settings.VOTE_SPOOL_DIR)
+            self.spool = VoteSpool(
+                spool_directory,
+                segment_size_bytes=settings.VOTE_SPOOL_SEGMENT_BYTES,
+                max_bytes=settings.VOTE_SPOOL_MAX_BYTES,
+                fsync_interval_seconds=settings.VOTE_SPOOL_FSYNC_INTERVAL_SECONDS,
+                fsync_batch_records=settings.VOTE_SPOOL_FSYNC_BATCH,
+            )
 
-        except pika.exceptions.AMQPConnectionError as e:
-            logger.error(f"Failed to connect to RabbitMQ after multiple retries: {e}")
-            # The application might start but voting will fail. Monitor this error.
-        except Exception as e:
-            logger.error(f"An unexpected error occurred during initial RabbitMQ setup: {e}")
+    def start(self):
+        """Starts connecting to RabbitMQ in the background. Returns immediately."""
+        self._rabbitmq.start()
 
-        try:
-            @retry(stop=stop_after_attempt(5), wait=wait_fixed(settings.WORKER_RECONNECT_DELAY_SECONDS/2),
-                   retry=retry_if_exception_type(RedisConnectionError))
-            def connect_redis():
-                client = redis.StrictRedis.from_url(settings.REDIS_URL, decode_responses=True)
-                client.ping() # Check connection
-                logger.info("Successfully connected to Redis.")
-                return client
-
-            self.redis_client = connect_redis()
-            self.cache_service = CacheService(self.redis_client, settings.RESULTS_CACHE_TTL_SECONDS)
-        except RedisConnectionError as e:
-            logger.error(f"Failed to connect to Redis after multiple retries: {e}")
-            # Cache will be unavailable, results fallback to DB (if implemented) or fail.
-        except Exception as e:
-            logger.error(f"An unexpected error occurred during initial Redis setup: {e}")
-
-        if self.rabbitmq_connection is None or not self.rabbitmq_connection.is_open:
-             logger.error("VoteService initialized but RabbitMQ is not connected.")
-        if self.redis_client is None:
-            logger.warning("VoteService initialized but Redis / CacheService is not connected. Cache and Rate Limiting will be unavailable.")
-
-    @retry(stop=stop_after_attempt(3), wait=wait_fixed(1), # Short retries for publishing
-           retry=retry_if_exception_type(pika.exceptions.AMQPError))
-    def _publish_vote_message(self, message_body: bytes):
-        """Handles message publishing with retries."""
-        if self.rabbitmq_connection is None or not self.rabbitmq_connection.is_open or self.rabbitmq_channel is None or not self.rabbitmq_channel.is_open:
-            logger.error("Attempted to publish message but RabbitMQ connection/channel is closed.")
+    async def stop(self):
+        """Closes connections and seals the spool (pending votes are replayed on the next start)."""
+        self._rabbitmq.stop()
+        self._rabbitmq_thread.shutdown()
+        await self._redis_client.aclose()
+        if self.spool is not None:
+            self.spool.close()
+        self._events.flush(force=True)
+
+    def readiness(self) -> Dict[str, bool]:
+        """
+        Connection state without I/O (used by the health probes). Votes are accepted without
+        RabbitMQ as long as the spool is enabled and has room.
+        """
+        return {
+            "rabbitmq": self._rabbitmq_is_open(),
+            "redis": self._redis_ready,
+            "spool": self.spool is not None and self.spool.has_capacity,
+        }
+
+    @property
+    def rabbitmq_connection(self):
+        current = self._rabbitmq.current
+        return current[0] if current is not None else None
+
+    @property
+    def rabbitmq_channel(self):
+        current = self._rabbitmq.current
+        return current[1] if current is not None else None
+
+    @property
+    def redis_client(self) -> Optional[aioredis.Redis]:
+        """The async Redis client, or None while Redis is down (callers skip it instead of waiting)."""
+        return self._redis_client if self._redis_ready else None
+
+    @property
+    def cache_service(self) -> Optional[CacheService]:
+        """CacheService on the async Redis client, or None while Redis is down."""
+        return self._cache_service if self._redis_ready else None
+
+    async def run_redis_monitor(self):
+        """
+        Background task: pings Redis every CONNECTION_CHECK_INTERVAL_SECONDS, or with backoff
+        while it is down, and tracks whether it is usable. The pool reconnects by itself.
+        """
+        backoff = Backoff()
+        while True:
+            try:
+                await asyncio.wait_for(self._redis_client.ping(), settings.REDIS_SOCKET_TIMEOUT_SECONDS)
+                ready, error = True, None
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                ready, error = False, e
+            if ready and not self._redis_ready:
+                logger.info("Connected to redis.")
+            elif self._redis_ready and not ready:
+                logger.warning("Lost connection to redis: %r. Reconnecting.", error)
+            self._redis_ready = ready
+            DEPENDENCY_UP.labels(dependency="redis").set(1 if ready else 0)
+
+            if ready:
+                backoff.reset()
+                delay = settings.CONNECTION_CHECK_INTERVAL_SECONDS
+            else:
+                delay = backoff.next_delay()
+                logger.warning("Connecting to redis failed: %r. Retrying in %.1fs.", error, delay)
+            await asyncio.sleep(delay)
+
+    @staticmethod
+    def _connect_rabbitmq():
+        parameters = pika.URLParameters(settings.RABBITMQ_URL)
+        # pika's defaults (10s socket, 15s handshake, no limit while blocked) are far longer than a vote should wait
+        parameters.socket_timeout = settings.RABBITMQ_SOCKET_TIMEOUT_SECONDS
+        parameters.stack_timeout = 2 * settings.RABBITMQ_SOCKET_TIMEOUT_SECONDS
+        parameters.blocked_connection_timeout = settings.RABBITMQ_BLOCKED_CONNECTION_TIMEOUT_SECONDS
+        conn = pika.BlockingConnection(parameters)
+        ch = conn.channel()
+        if settings.RABBITMQ_PUBLISHER_CONFIRMS:
+            ch.confirm_delivery() # basic_publish now blocks until the broker confirms (raises NackError otherwise)
+        # Declare DLX and DLQ, then the vote queue(s) with DLX argument
+        queue_topology.declare_topology(ch)
+        logger.info("Declared RabbitMQ queues (routing mode '%s', queue type '%s'), DLX, and DLQ.",
+                    settings.RABBITMQ_ROUTING_MODE, settings.RABBITMQ_QUEUE_TYPE)
+        return conn, ch
+
+    @staticmethod
+    def _rabbitmq_is_alive(conn_ch) -> bool:
+        """Connection check (on the RabbitMQ thread): also services heartbeats while no vote is published."""
+        conn, ch = conn_ch
+        if conn.is_open:
+            conn.process_data_events(time_limit=0)
+        return conn.is_open and ch.is_open
+
+    def _rabbitmq_is_open(self) -> bool:
+        current = self._rabbitmq.current
+        return current is not None and current[0].is_open and current[1].is_open
+
+    def _basic_publish(self, message_body: bytes, exchange: str, routing_key: str, headers: Optional[Dict[str, Any]] = None):
+        """Publishes one message, without retries (on the RabbitMQ thread). Raises AMQPError if the broker cannot take it."""
+        current = self._rabbitmq.current
+        if current is None or not current[0].is_open or not current[1].is_open:
             raise pika.exceptions.AMQPConnectionError("RabbitMQ connection is not open.")
 
-        self.rabbitmq_channel.basic_publish(
-            exchange='', # Default exchange for direct-to-queue
-            routing_key=settings.RABBITMQ_QUEUE_NAME,
-            body=message_body,
-            properties=pika.BasicProperties(
-                delivery_mode=pika.DeliveryMode.Persistent # Make message durable
+        try:
+            current[1].basic_publish(
+                exchange=exchange,
+                routing_key=routing_key,
+                body=message_body,
+                properties=pika.BasicProperties(
+                    delivery_mode=pika.DeliveryMode.Persistent, # Make message durable
+                    headers=headers or None,
+                )
             )
-        )
-        logger.info("Message published to RabbitMQ.")
+        except (pika.exceptions.AMQPConnectionError, pika.exceptions.AMQPChannelError):
+            self._rabbitmq.invalidate(current) # Reconnect in the background
+            raise
 
+    def _publish_once(self, message_body: bytes, exchange: str, routing_key: str, headers: Optional[Dict[str, Any]] = None):
+        """
+        Publishes one message through the circuit breaker, without retries (on the RabbitMQ thread).
+        `headers` carry the trace context. Raises CircuitOpenError or AMQPError: callers spool the vote or
+        fail the request instead of sleeping on the thread every other request's publish waits for.
+        """
+        with PUBLISH_LATENCY.time():
+            self._rabbitmq_breaker.call(self._basic_publish, message_body, exchange, routing_key, headers)
+        self._events.event("published", "Vote message published to RabbitMQ.")
 
-    async def process_vote_request(self, payload: VotePayload, source_ip: str, user_agent: str) -> VoteResponse:
+    def _publish_all(self, messages: List[Tuple[bytes, str, str]], headers: Optional[Dict[str, Any]] = None) -> Tuple[int, Optional[Exception]]:
+        """
+        Publishes (body, exchange, routing key) messages in order on the RabbitMQ thread, stopping at the first
+        failure. Returns how many were published, and the error that stopped it, if any.
+        """
+        for published, (message_body, exchange, routing_key) in enumerate(messages):
+            try:
+                self._publish_once(message_body, exchange, routing_key, headers)
+            except (CircuitOpenError, pika.exceptions.AMQPError) as e:
+                return published, e
+        return len(messages), None
+
+    def _spool_all(self, messages: List[Tuple[bytes, str, str]], headers: Optional[Dict[str, Any]] = None) -> Tuple[int, Optional[Exception]]:
+        """Appends messages to the spool in order (file I/O only, off the RabbitMQ thread), stopping when it is full. Returns like _publish_all."""
+        for spooled, (message_body, exchange, routing_key) in enumerate(messages):
+            try:
+                self.spool.append(message_body, exchange, routing_key, headers)
+            except SpoolFullError as e:
+                return spooled, e
+            self._events.event("spooled", "Vote message spooled for later delivery.")
+        return len(messages), None
+
+    def _rabbitmq_unavailable(self) -> bool:
+        """Known without I/O: not connected, or the circuit is open."""
+        return not self._rabbitmq_is_open() or self._rabbitmq_breaker.state == OPEN
+
+    async def _publish_batch(self, messages: List[Tuple[bytes, str, str]], headers: Optional[Dict[str, Any]] = None) -> Tuple[List[bool], Optional[Exception]]:
+        """
+        Publishes (body, exchange, routing key) messages in order without blocking the event loop: the publishes
+        go to the RabbitMQ thread in one hand-off. With the spool enabled, what the broker cannot take is spooled
+        from a worker thread, and while the broker is down votes are spooled without waiting for the RabbitMQ thread.
+        Returns whether each attempted message was spooled, and the error that stopped the rest
+        (CircuitOpenError, AMQPError or SpoolFullError), if any.
+        """
+        published, error = 0, None
+        # Keep publishing order: while a backlog is spooled, new votes queue up behind it
+        if self.spool is None or not (self.spool.has_pending or self._rabbitmq_unavailable()):
+            if self._rabbitmq_is_open():
+                published, error = await self._rabbitmq_thread.call_async(self._publish_all, messages, headers)
+            else:
+                error = pika.exceptions.AMQPConnectionError("RabbitMQ connection is not open.") # Spool disabled: fail fast
+        spooled = [False] * published
+        if self.spool is None or published == len(messages):
+            return spooled, error
+        if error is not None and not isinstance(error, CircuitOpenError):
+            logger.warning(f"Publishing to RabbitMQ failed ({error!r}); spooling {len(messages) - published} vote(s) locally.")
+        count, error = await asyncio.to_thread(self._spool_all, messages[published:], headers)
+        return spooled + [True] * count, error
+
+    async def _publish(self, message_body: bytes, exchange: str, routing_key: str, headers: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        Publishes (or spools) one vote, see _publish_batch. Returns True if it was spooled.
+        Raises CircuitOpenError, AMQPError or SpoolFullError.
+        """
+        spooled, error = await self._publish_batch([(message_body, exchange, routing_key)], headers)
+        if error is not None:
+            raise error
+        return spooled[0]
+
+    @staticmethod
+    def _vote_message_body(payload: VotePayload, source_ip: str, user_agent: str, receipt_id: str) -> bytes:
+        message = {
+            "receipt_id": receipt_id, # The worker records the vote's outcome under it
+            "candidate_id": str(payload.candidate_id), # Send as string UUID
+            "user_token": payload.user_token, # Pass the original token to worker
+            "vote_timestamp": datetime.utcnow().isoformat() + 'Z', # ISO 8601 UTC
+            "source_ip": source_ip,
+            "user_agent": user_agent,
+        }
+        return json.dumps(message).encode('utf-8')
+
+    async def _is_unknown_candidate(self, candidate_id: UUID) -> bool:
+        """True only if the candidate catalog is loaded and does not know the candidate (even after a reload)."""
+        catalog = self.candidate_catalog
+        known = catalog.contains(candidate_id)
+        if known is False and catalog.claim_miss_refresh():
+            await asyncio.to_thread(catalog.refresh) # Maybe added since the last refresh
+            known = catalog.contains(candidate_id)
+        return known is False
+
+    async def process_vote_request(self, payload: VotePayload, source_ip: str, user_agent: str,
+                                   idempotency_key: Optional[str] = None) -> VoteResponse:
         """
         Processes the incoming vote request.
         Performs basic validation and publishes message to RabbitMQ.
+        With an `idempotency_key`, a repeated request of the same user returns the first response without publishing.
         Detailed validation and DB/Redis operations are done by workers.
+        The request span's context is propagated to the worker via AMQP headers.
+        """
+        with tracer.start_as_current_span("vote.request", kind=SpanKind.SERVER) as request_span:
+            request_span.set_attribute("vote.candidate_id", str(payload.candidate_id))
+
+            # *** Basic API-level validation & Authentication (Placeholder) ***
+            # As requested, use the user_token from payload for basic validation
+            # A standard system would use Authorization: Bearer header for API auth.
+            with tracer.start_as_current_span("vote.jwt_decode"):
+                try:
+                     user_id_from_token = decode_user_token(payload.user_token) # decode_user_token raises 401 on error
+                     if not user_id_from_token:
+                          # This case should not be reached if decode_user_token raises 401, but defensive check
+                         raise HTTPException(
+                             status_code=status.HTTP_401_UNAUTHORIZED,
+                             detail="Could not validate credentials: invalid token",
+                             headers={"WWW-Authenticate": "Bearer"},
+                         )
+                except HTTPException:
+                    # Re-raise the 401 from decode_user_token
+                    raise
+                except Exception as e:
+                     logger.error(f"Error during basic user token validation: {e}")
+                     raise HTTPException(
+                        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                        detail="Could not validate credentials: token processing error",
+                        # Add error_code if desired
+                     )
+
+            # Junk votes never reach the queue (the worker and the DB would reject them anyway)
+            if await self._is_unknown_candidate(payload.candidate_id):
+                UNKNOWN_CANDIDATE_VOTES.labels(stage="api").inc()
+                self._events.event("unknown_candidate", "Rejected vote for unknown candidate %s", payload.candidate_id)
+                raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Unknown candidate.")
+
+            # Idempotency-Key: a retried request gets the original response back without publishing again
+            idempotency_record_key = None
+            fingerprint = str(payload.candidate_id)
+            if idempotency_key:
+                record_key = IdempotencyStore.redis_key(str(user_id_from_token), idempotency_key)
+                try:
+                    stored_response = await self.idempotency.claim(record_key, fingerprint)
+                except IdempotencyConflict as e:
+                    if e.reason == "in_progress":
+                        raise HTTPException(
+                            status_code=status.HTTP_409_CONFLICT,
+                            detail="A request with this Idempotency-Key is still being processed.",
+                        )
+                    raise HTTPException(
+                        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                        detail="This Idempotency-Key was already used for a different vote.",
+                    )
+                if stored_response is not None:
+                    self._events.event("idempotent_replay", "Replayed stored response for a retried vote of user %s", user_id_from_token)
+                    return VoteResponse.model_construct(**stored_response)
+                idempotency_record_key = record_key # Claimed: completed or released below
+
+            try:
+                # 3. Rate Limiting (Optional but recommended for high load)
+                # Example using CacheService (needs implementation within CacheService)
+                if self.cache_service is not None:
+                     with tracer.start_as_current_span("vote.rate_limit"):
+                         try:
+                             # Assuming user_id_from_token derived above is usable for rate limiting Key
+                             # Alternatively, use source_ip
+                             if await self.cache_service.is_rate_limited(str(user_id_from_token)): # Or use source_ip
+                                  self._events.event("rate_limited", "Rate limited vote request for user %s", user_id_from_token)
+                                  raise HTTPException(
+                                       status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                                       detail="Too many requests. Please try again later.",
+                                       # Add error_code if desired
+                                  )
+                         except HTTPException:
+                              raise # The 429 above, not a rate limiter failure
+                         except (RedisConnectionError, RedisTimeoutError) as e:
+                              logger.error(f"Rate Limiting check failed due to Redis error: {e}. Proceeding without rate limit.")
+                              # Decide policy on RL failure: fail open (allow) or fail closed (deny)
+                              pass # Fail open: allow request if Redis RL check fails
+                         except ResponseError:
+                              # Only for commands that can never work (CROSSSLOT, WRONGTYPE): a bug, not an outage. Don't let votes through unlimited.
+                              raise HTTPException(
+                                   status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                   detail="Voting system is temporarily unavailable. Please try again.",
+                              )
+                         except Exception as e:
+                              logger.error(f"An unexpected error occurred during Rate Limiting check: {e}. Proceeding without rate limit.")
+                              pass # Fail open
+
+
+                # *** Publish message to RabbitMQ ***
+                with tracer.start_as_current_span("vote.publish", kind=SpanKind.PRODUCER):
+                    try:
+                        receipt_id = redis_keys.new_vote_receipt_id()
+                        message_body = self._vote_message_body(payload, source_ip, user_agent, receipt_id)
+
+                        # Published once, or spooled if the broker cannot take it (no retries in the request).
+                        # Trace headers are injected inside the publish span so worker spans become its children.
+                        # Route by user so all votes of one user stay on one queue shard (see queue_topology)
+                        exchange, routing_key = queue_topology.publish_target(str(user_id_from_token))
+                        spooled = await self._publish(message_body, exchange, routing_key, headers=inject_trace_headers())
+
+                    except CircuitOpenError as e:
+                        logger.warning(f"Not publishing vote: {e}")
+                        raise HTTPException(
+                            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail="Voting system is temporarily unavailable due to messaging queue issues. Please try again.",
+                        )
+                    except SpoolFullError as e:
+                        logger.error(f"RabbitMQ unavailable and vote spool is full: {e}")
+                        raise HTTPException(
+                            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail="Voting system is temporarily unavailable due to messaging queue issues. Please try again.",
+                        )
+                    except pika.exceptions.AMQPError as e:
+                        logger.error(f"Failed to publish message to RabbitMQ: {e}")
+                        # Indicate service is unavailable if publishing fails persistently
+                        raise HTTPException(
+                            status_code=status.HTTP_503_SERVICE_UNAVAILABLE, # Use 503 for external service issue
+                            detail="Voting system is temporarily unavailable due to messaging queue issues. Please try again.",
+                            # Add error_code if desired
+                        )
+                    except Exception as e:
+                        logger.error(f"An unexpected error occurred while processing vote request: {e}")
+                        raise HTTPException(
+                            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                            detail="An internal server error occurred.",
+                            # Add error_code if desired
+                        )
+            except BaseException:
+                if idempotency_record_key is not None:
+                    await self.idempotency.release(idempotency_record_key) # Let the client's retry through
+                raise
+
+        # Return accepted response (fields are trusted: skip validation)
+        response = VoteResponse.model_construct(
+            status="accepted",
+            message="Vote accepted and queued for delivery" if spooled else "Vote accepted for processing",
+            timestamp=datetime.utcnow(),
+            receipt_id=receipt_id,
+        )
+        if idempotency_record_key is not None:
+            await self.idempotency.complete(idempotency_record_key, fingerprint, response.model_dump(mode="json"))
+        return response
+
+    async def process_vote_batch(self, payloads: List[VotePayload], source_ip: str, user_agent: str) -> VoteBatchResponse:
+        """
+        Processes many votes in one request (edge proxies and kiosks replaying offline votes).
+        Each vote is checked like in process_vote_request, but rate limits for all users are
+        applied in a single pipelined Redis round trip, and the votes are published back to back on the
+        RabbitMQ thread. Failures are reported per vote, in request order, instead of failing the batch.
+        """
+        results: List[Optional[VoteBatchItemResult]] = [None] * len(payloads)
+
+        def reject(index: int, status_code: int, message: str):
+            results[index] = VoteBatchItemResult(index=index, status="rejected", status_code=status_code, message=message)
+
+        with tracer.start_as_current_span("vote.batch_request", kind=SpanKind.SERVER) as request_span:
+            request_span.set_attribute("vote.batch_size", len(payloads))
+
+            # Tokens
+            users: Dict[int, str] = {} # index -> user id, for the votes with a valid token
+            with tracer.start_as_current_span("vote.jwt_decode"):
+                for index, payload in enumerate(payloads):
+                    try:
+                        users[index] = str(decode_user_token(payload.user_token))
+                    except HTTPException as e:
+                        reject(index, e.status_code, e.detail)
+
+            # Candidates
+            for index in sorted(users):
+                if await self._is_unknown_candidate(payloads[index].candidate_id):
+                    UNKNOWN_CANDIDATE_VOTES.labels(stage="api").inc()
+                    reject(index, status.HTTP_422_UNPROCESSABLE_ENTITY, "Unknown candidate.")
+                    del users[index]
+
+            # Rate limits: one script call for every user of the batch; a user's first votes win
+            if self.cache_service is not None and users:
+                with tracer.start_as_current_span("vote.rate_limit"):
+                    requested: Dict[str, int] = {}
+                    for user_id in users.values():
+                        requested[user_id] = requested.get(user_id, 0) + 1
+                    try:
+                        allowed = await self.cache_service.allowed_calls(requested) # Fails open while Redis is down
+                    except ResponseError: # A command that can never work (see is_redis_misuse): reject rather than let the batch through unlimited
+                        allowed = {}
+                        for index in sorted(users):
+                            reject(index, status.HTTP_503_SERVICE_UNAVAILABLE, "Voting system is temporarily unavailable. Please try again.")
+                        users.clear()
+                for index in sorted(users):
+                    user_id = users[index]
+                    if allowed.get(user_id, 0) > 0:
+                        allowed[user_id] -= 1
+                    else:
+                        reject(index, status.HTTP_429_TOO_MANY_REQUESTS, "Too many requests. Please try again later.")
+                        del users[index]
+                        self._events.event("rate_limited", "Rate limited vote request for user %s", user_id)
+
+            # Publish: the whole batch in one hand-off to the RabbitMQ thread, back to back
+            with tracer.start_as_current_span("vote.publish", kind=SpanKind.PRODUCER):
+                headers = inject_trace_headers() # Every vote of the batch is a child of this span
+                indexes = sorted(users)
+                receipt_ids = [redis_keys.new_vote_receipt_id() for _ in indexes]
+                messages = [
+                    (self._vote_message_body(payloads[index], source_ip, user_agent, receipt_id),) + queue_topology.publish_target(users[index])
+                    for index, receipt_id in zip(indexes, receipt_ids)
+                ]
+                spooled_flags, error = await self._publish_batch(messages, headers)
+                if error is not None:
+                    # The broker (and spool) failed: the remaining votes were not attempted
+                    logger.error(f"Not publishing batched votes from index {indexes[len(spooled_flags)]} on: {error!r}")
+                    for index in indexes[len(spooled_flags):]:
+                        reject(index, status.HTTP_503_SERVICE_UNAVAILABLE,
+                               "Voting system is temporarily unavailable due to messaging queue issues. Please try again.")
+                for index, receipt_id, spooled in zip(indexes, receipt_ids, spooled_flags):
+                    results[index] = VoteBatchItemResult(
+                        index=index,
+                        status="queued" if spooled else "accepted",
+                        status_code=status.HTTP_202_ACCEPTED,
+                        message="Vote accepted and queued for delivery" if spooled else "Vote accepted for processing",
+                        receipt_id=receipt_id,
+                    )
+
+            accepted = sum(1 for result in results if result.status != "rejected")
+            request_span.set_attribute("vote.batch_accepted", accepted)
+
+        return VoteBatchResponse(
+            accepted=accepted,
+            rejected=len(results) - accepted,
+            results=results,
+            timestamp=datetime.utcnow(),
+        )
+
+    async def get_vote_receipt(self, receipt_id: str) -> VoteReceiptStatus:
+        """
+        Processing status of a vote from the outcome the worker recorded in Redis; never queries the DB.
+        Until the worker has handled the vote (or after VOTE_RECEIPT_TTL_SECONDS) the status is "pending".
         """
-        # *** Basic API-level validation & Authentication (Placeholder) ***
-        # As requested, use the user_token from payload for basic validation
-        # A standard system would use Authorization: Bearer header for API auth.
+        cache_service = self.cache_service
+        if cache_service is None:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Vote status is temporarily unavailable.")
         try:
-             user_id_from_token = decode_user_token(payload.user_token) # decode_user_token raises 401 on error
-             if not user_id_from_token:
-                  # This case should not be reached if decode_user_token raises 401, but defensive check
-                 raise HTTPException(
-                     status_code=status.HTTP_401_UNAUTHORIZED,
-                     detail="Could not validate credentials: invalid token",
-                     headers={"WWW-Authenticate": "Bearer"},
-                 )
-        except HTTPException:
-            # Re-raise the 401 from decode_user_token
-            raise
-        except Exception as e:
-             logger.error(f"Error during basic user token validation: {e}")
-             raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Could not validate credentials: token processing error",
-                # Add error_code if desired
-             )
-
-        # 3. Rate Limiting (Optional but recommended for high load)
-        # Example using CacheService (needs implementation within CacheService)
-        if self.cache_service is not None:
-             try:
-                 # Assuming user_id_from_token derived above is usable for rate limiting Key
-                 # Alternatively, use source_ip
-                 if self.cache_service.is_rate_limited(str(user_id_from_token)): # Or use source_ip
-                      raise HTTPException(
-                           status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                           detail="Too many requests. Please try again later.",
-                           # Add error_code if desired
-                      )
-             except (RedisConnectionError, RedisTimeoutError) as e:
-                  logger.error(f"Rate Limiting check failed due to Redis error: {e}. Proceeding without rate limit.")
-                  # Decide policy on RL failure: fail open (allow) or fail closed (deny)
-                  pass # Fail open: allow request if Redis RL check fails
-             except Exception as e:
-                  logger.error(f"An unexpected error occurred during Rate Limiting check: {e}. Proceeding without rate limit.")
-                  pass # Fail open
-
-
-        # *** Publish message to RabbitMQ ***
+            value = await cache_service.get_vote_receipt(receipt_id)
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Unknown vote receipt.")
+        except (CircuitOpenError, RedisConnectionError, RedisTimeoutError) as e:
+            logger.warning(f"Could not read vote receipt: {e!r}")
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Vote status is temporarily unavailable.")
+        if value is None:
+            return VoteReceiptStatus.model_construct(receipt_id=receipt_id, status="pending", updated_at=None)
+        receipt_status, updated_at = redis_keys.parse_vote_receipt_value(value)
+        return VoteReceiptStatus.model_construct(receipt_id=receipt_id, status=receipt_status, updated_at=updated_at)
+
+    async def get_cardinality(self, candidate_id: Optional[UUID] = None, ip_block: Optional[str] = None) -> CardinalityResponse:
+        """
+        Distinct voters / source IPs overall, per candidate (all known candidates, or `candidate_id`)
+        and for one IP block, from the worker's HyperLogLogs: one pipelined PFCOUNT round trip,
+        whatever the number of votes. Raises 503 while Redis is unavailable.
+        """
+        cache_service = self.cache_service
+        if cache_service is None:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Vote statistics are temporarily unavailable.")
+        if candidate_id is not None:
+            candidate_ids = [candidate_id]
+        else:
+            candidate_ids = sorted(self.candidate_catalog.ids, key=str)
+        keys = [redis_keys.VOTERS_HLL_KEY, redis_keys.SOURCE_IPS_HLL_KEY]
+        for cid in candidate_ids:
+            keys += [redis_keys.candidate_voters_hll_key(cid), redis_keys.candidate_source_ips_hll_key(cid)]
+        if ip_block is not None:
+            keys.append(redis_keys.ip_block_voters_hll_key(ip_block))
         try:
-            message = {
-                "candidate_id": str(payload.candidate_id), # Send as string UUID
-                "user_token": payload.user_token, # Pass the original token to worker
-                "vote_timestamp": datetime.utcnow().isoformat() + 'Z', # ISO 8601 UTC
-                "source_ip": source_ip,
-                "user_agent": user_agent,
-            }
-            message_body = json.dumps(message).encode('utf-8')
-
-            # Use the internal retry logic for publishing
-            self._publish_vote_message(message_body)
-
-        except pika.exceptions.AMQPError as e:
-            logger.error(f"Failed to publish message to RabbitMQ after retries: {e}")
-            # Indicate service is unavailable if publishing fails persistently
-            raise HTTPException(
-                status_code=status.HTTP_503_SERVICE_UNAVAILABLE, # Use 503 for external service issue
-                detail="Voting system is temporarily unavailable due to messaging queue issues. Please try again.",
-                # Add error_code if desired
-            )
-        except Exception as e:
-            logger.error(f"An unexpected error occurred while processing vote request: {e}")
+            counts = await cache_service.count_distinct(keys)
+        except (CircuitOpenError, RedisConnectionError, RedisTimeoutError) as e:
+            logger.warning(f"Could not read cardinality estimates: {e!r}")
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Vote statistics are temporarily unavailable.")
+        candidates = [
+            CandidateCardinality.model_construct(candidate_id=cid, distinct_voters=counts[2 + 2 * i], distinct_source_ips=counts[3 + 2 * i])
+            for i, cid in enumerate(candidate_ids)
+        ]
+        candidates.sort(key=lambda c: c.distinct_voters, reverse=True)
+        return CardinalityResponse(
+            distinct_voters=counts[0],
+            distinct_source_ips=counts[1],
+            candidates=candidates,
+            ip_block=ip_block,
+            ip_block_distinct_voters=counts[-1] if ip_block is not None else None,
+        )
+
+    async def get_timeline(self, candidate_id: Optional[UUID] = None, granularity: Optional[str] = None,
+                           start: Optional[datetime] = None, end: Optional[datetime] = None, points: int = 120) -> TimelineResponse:
+        """
+        Valid votes per candidate over [start, end) (default: the last 24 hours), summed into at most
+        `points` points. Minute rollups are used for ranges up to ROLLUP_TIMELINE_MINUTE_MAX_SECONDS
+        unless `granularity` says otherwise. Ranges still in Redis are read there in one pipelined
+        round trip, older ones (or all of them while Redis is down) with one vote_rollups query.
+        Buckets whose Redis key is missing (evicted, Redis restarted, or simply no votes) are read from vote_rollups.
+        """
+        now = time.time()
+        utc_timestamp = lambda value: (value if value.tzinfo else value.replace(tzinfo=timezone.utc)).timestamp() # Naive = UTC
+        end_ts = utc_timestamp(end) if end is not None else now
+        start_ts = utc_timestamp(start) if start is not None else end_ts - 86400
+        if start_ts >= end_ts: # Compared as UTC timestamps: naive and aware query values mix
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="start must be before end.")
+        if granularity is None:
+            granularity = "minute" if end_ts - start_ts <= settings.ROLLUP_TIMELINE_MINUTE_MAX_SECONDS else "hour"
+        bucket_seconds = redis_keys.ROLLUP_GRANULARITIES[granularity]
+        first = redis_keys.rollup_bucket(start_ts, granularity)
+        last = redis_keys.rollup_bucket(end_ts - 1e-6, granularity) + bucket_seconds # Exclusive, covers `end`
+        buckets = (last - first) // bucket_seconds
+        if buckets > settings.ROLLUP_TIMELINE_MAX_BUCKETS:
             raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="An internal server error occurred.",
-                # Add error_code if desired
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Range too long: at most {settings.ROLLUP_TIMELINE_MAX_BUCKETS} {granularity} buckets.",
             )
-
-        # Return accepted response
-        return VoteResponse(
-            status="accepted",
-            message="Vote accepted for processing",
-            timestamp=datetime.utcnow()
+        step = bucket_seconds * math.ceil(buckets / points)
+        last = first + step * math.ceil(buckets * bucket_seconds / step) # Whole points only
+
+        rollups = None
+        missing: List[int] = []
+        source = "redis"
+        cache_service = self.cache_service
+        if cache_service is not None and first > now - redis_keys.rollup_ttl_seconds(granularity):
+            bucket_starts = range(first, last, bucket_seconds)
+            keys = [redis_keys.rollup_key(granularity, bucket) for bucket in bucket_starts]
+            try:
+                values = await cache_service.get_rollups(keys, candidate_id)
+                rollups = {bucket: counts for bucket, counts in zip(bucket_starts, values) if counts}
+                missing = [bucket for bucket, counts in zip(bucket_starts, values) if counts is None and bucket <= now]
+            except (CircuitOpenError, RedisConnectionError, RedisTimeoutError) as e:
+                logger.warning(f"Could not read vote rollups from Redis, reading the vote_rollups table: {e!r}")
+        if missing:
+            try:
+                stored = await asyncio.to_thread(self._db_breaker.call, read_rollups, granularity, missing[0], missing[-1] + bucket_seconds, candidate_id)
+                rollups.update((bucket, stored[bucket]) for bucket in missing if bucket in stored)
+                source = "redis+database"
+            except (CircuitOpenError, SQLAlchemyError) as e:
+                logger.warning(f"Could not read {len(missing)} vote rollup(s) missing from Redis from the database: {e!r}")
+        if rollups is None:
+            source = "database"
+            try:
+                rollups = await asyncio.to_thread(self._db_breaker.call, read_rollups, granularity, first, last, candidate_id)
+            except (CircuitOpenError, SQLAlchemyError) as e:
+                logger.warning(f"Could not read vote rollups from the database: {e!r}")
+                raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Vote statistics are temporarily unavailable.")
+
+        point_starts, series = downsample(rollups, first, last, step)
+        if candidate_id is not None and str(candidate_id) not in series:
+            series[str(candidate_id)] = [0] * len(point_starts)
+        return TimelineResponse(
+            granularity=granularity,
+            step_seconds=step,
+            points=[datetime.fromtimestamp(point, timezone.utc) for point in point_starts],
+            series=[
+                CandidateTimeline.model_construct(candidate_id=UUID(cid), votes=votes)
+                for cid, votes in sorted(series.items(), key=lambda item: sum(item[1]), reverse=True)
+            ],
+            source=source,
         )
 
-    async def get_vote_results(self, db: Session = Depends(get_db), candidate_id: Optional[UUID] = None, page: int = 1, limit: int = 100) -> ResultsResponse:
+    async def run_spool_replay(self):
         """
-        Fetches aggregated vote results from Redis cache or PostgreSQL database.
-        Uses SQLAlchemy ORM for DB interaction when cache is missed.
+        Background task: flushes the spool and replays spooled votes in batches whenever
+        RabbitMQ is connected. Runs until cancelled.
         """
-        # *** Try fetching from Redis Cache ***
-        if self.cache_service is not None:
+        if self.spool is None:
+            return
+        while True:
+            await asyncio.sleep(settings.VOTE_SPOOL_REPLAY_INTERVAL_SECONDS)
             try:
-                cached_results = self.cache_service.get_results(candidate_id, page, limit)
-                if cached_results:
-                    logger.info("Fetched results from Redis cache.")
-                    # Apply filtering/pagination to cached data happens inside cache_service
-                    return cached_results
-            except (RedisConnectionError, RedisTimeoutError) as e:
-                 logger.error(f"Failed to fetch results from Redis cache (connection error): {e}. Falling back to DB.")
-                 # Fall through to DB if cache lookup fails
+                self.spool.flush()
+                if not self.spool.has_pending or not self._rabbitmq_is_open():
+                    continue # The connection manager reconnects (and services heartbeats) in the background
+                # Drain in batches on the RabbitMQ thread; request handlers keep running meanwhile
+                while self.spool.has_pending:
+                    replayed = await self._rabbitmq_thread.call_async(self.spool.replay, self._basic_publish, settings.VOTE_SPOOL_REPLAY_BATCH)
+                    logger.info("Replayed %d spooled vote(s) to RabbitMQ (%d bytes still spooled).", replayed, self.spool.pending_bytes)
+                    await asyncio.sleep(0)
+            except asyncio.CancelledError:
+                raise
+            except pika.exceptions.AMQPError as e:
+                logger.warning(f"RabbitMQ still unavailable, keeping votes spooled: {e!r}")
             except Exception as e:
-                logger.error(f"An unexpected error occurred while reading from Redis cache: {e}. Falling back to DB.")
-                # Fall through to DB if cache read fails
+                logger.error(f"Unexpected error while replaying the vote spool: {e}", exc_info=True)
 
-        logger.warning("Cache miss or Redis unavailable. Fetching results from database.")
+    async def get_cached_results(self, candidate_id: Optional[UUID] = None, page: int = 1, limit: int = 100) -> Optional[Dict[str, Any]]:
+        """
+        Results page from the Redis cache as JSON-ready data (no Pydantic models), or None on
+        miss / Redis unavailable. The endpoint returns it as is; get_vote_results is the fallback.
+        """
+        cache_service = self.cache_service
+        if cache_service is None:
+            return None
+        cached_results = await cache_service.get_results_raw(candidate_id, page, limit) # Never raises
+        if cached_results is not None:
+            self._events.event("results_cache_hit", "Fetched results from Redis cache.")
+        return cached_results
+
+    async def get_vote_results(self, db: Session = Depends(get_db), candidate_id: Optional[UUID] = None, page: int = 1, limit: int = 100) -> ResultsResponse:
+        """
+        Results when get_cached_results missed. If they cannot be built because Redis or the DB is
+        unavailable, the in-memory snapshot is served instead (marked stale) while it is recent enough.
+        """
+        try:
+            return await self._build_vote_results(db, candidate_id, page, limit)
+        except HTTPException as e:
+            if e.status_code < 500:
+                raise
+            stale_results = self.results_snapshot.page(candidate_id, page, limit)
+            if stale_results is None:
+                raise # No snapshot, or too old to serve
+            self._events.event("results_stale", "Serving stale results snapshot: %s", e.detail)
+            return stale_results
+
+    async def _build_vote_results(self, db: Session, candidate_id: Optional[UUID], page: int, limit: int) -> ResultsResponse:
+        """
+        Builds aggregated vote results from the Redis counters and PostgreSQL candidate names.
+        Refreshes the results cache and the in-memory snapshot.
+        """
+        self._events.event("results_cache_miss", "Cache miss or Redis unavailable. Fetching results from database.")
 
         # *** Fetch from PostgreSQL Database using SQLAlchemy ORM ***
         # This fallback queries aggregate data. For very high read load on /results,
@@ -215,7 +752,7 @@ class VoteService:
         # Aggregating millions of votes directly in a single query on every cache miss
         # is NOT scalable.
         # A robust solution would:
-        # 1. Fetch counts from Redis HASH 'candidate_votes'.
+        # 1. Fetch counts from the Redis counter hashes (sharded, see redis_keys).
         # 2. Fetch candidate names from DB (or a different cache/service).
         # 3. Combine these in memory.
         # 4. Apply filtering/pagination to the combined list.
@@ -225,26 +762,31 @@ class VoteService:
         # then candidates from DB if Redis connection is available.
         if self.redis_client is not None:
             try:
-                 all_counts: Dict[str, str] = self.redis_client.hgetall("candidate_votes")
+                 all_counts: Dict[str, int] = await self._redis_breaker.call_async(self._read_vote_counts, self.redis_client)
                  results_list: List[CandidateResult] = []
                  candidate_ids_from_redis = [UUID(cid) for cid in all_counts.keys()]
 
                  # Fetch candidate names from PostgreSQL for the IDs found in Redis
                  if candidate_ids_from_redis:
                      try:
-                         # Retry DB fetch just in case
-                         @retry(stop=stop_after_attempt(3), wait=wait_fixed(1),
-                                retry=retry_if_exception_type(SQLAlchemyError))
-                         def fetch_candidates_from_db(session: Session, ids: List[UUID]):
-                              return session.execute(
-                                   select(Candidate).filter(Candidate.id.in_(ids))
-                              ).scalars().all()
-
-                         all_candidates_from_db = fetch_candidates_from_db(db, candidate_ids_from_redis)
-                         candidate_names = {str(c.id): c.name for c in all_candidates_from_db}
+                         # Blocking query: in a worker thread, like the other DB reads of this service.
+                         # No retries: a failing DB trips the breaker and the stale snapshot is served.
+                         candidate_names = await asyncio.to_thread(self._fetch_candidate_names, db, candidate_ids_from_redis)
 
+                     except CircuitOpenError as e:
+                         logger.warning(f"Not fetching candidate names: {e}")
+                         raise HTTPException(
+                            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail="Vote results are temporarily unavailable.",
+                         )
                      except SQLAlchemyError as e:
-                         logger.error(f"Failed to fetch candidate names from DB during results query after retries: {e}")
+                         if is_transient_db_error(e):
+                             logger.warning(f"Could not fetch candidate names from DB during results query: {e}")
+                             raise HTTPException(
+                                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                detail="Vote results are temporarily unavailable.",
+                             )
+                         logger.error(f"Failed to fetch candidate names from DB during results query: {e}")
                          # Cannot proceed without candidate names. Raise Exception.
                          raise HTTPException(
                             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -263,6 +805,8 @@ class VoteService:
                                logger.warning(f"Invalid vote count in Redis for candidate {cid_str}: {count_str}")
                                # Skip or default to 0
 
+                 self.results_snapshot.update(results_list) # Complete list, before filtering/pagination
+
                  # Apply candidate_id filter if requested
                  if candidate_id:
                       results_list = [res for res in results_list if res.candidate_id == candidate_id]
@@ -287,8 +831,7 @@ class VoteService:
                            # Re-fetch or use the complete results_list before slicing?
                            # Using the complete list before slicing is simpler here:
                            all_results_for_cache = sorted(results_list, key=lambda r: r.vote_count, reverse=True)
-                           self.cache_service.set_results(all_results_for_cache) # Cache the full list
-                           logger.info(f"Updated Redis results cache with TTL {settings.RESULTS_CACHE_TTL_SECONDS}s.")
+                           await self.cache_service.set_results(all_results_for_cache) # Cache the full list
                       except (RedisConnectionError, RedisTimeoutError) as e:
                            logger.error(f"Failed to update Redis results cache: {e}")
                       except Exception as e:
@@ -296,7 +839,9 @@ class VoteService:
 
                  return response
 
-            except (RedisConnectionError, RedisTimeoutError) as e:
+            except HTTPException:
+                raise
+            except (RedisConnectionError, RedisTimeoutError, CircuitOpenError) as e:
                  logger.error(f"Failed to fetch counts from Redis (connection error): {e}. Cannot fetch results.")
                  # If Redis for counts is unavailable, results cannot be provided efficiently.
                  # Fallback to full PG aggregation is an option but likely too slow.
@@ -322,5 +867,87 @@ class VoteService:
                  # Add error_code
             )
 
+    def _fetch_candidate_names(self, session: Session, ids: List[UUID]) -> Dict[str, str]:
+        """Candidate ID -> name for the given IDs (blocking: run in a thread). Raises CircuitOpenError or SQLAlchemyError."""
+        candidates = self._db_breaker.call(lambda: session.execute(
+            select(Candidate).filter(Candidate.id.in_(ids))
+        ).scalars().all())
+        return {str(c.id): c.name for c in candidates}
+
+    @staticmethod
+    async def _read_vote_counts(redis_client: aioredis.Redis) -> Dict[str, int]:
+        """Exact vote count per candidate: every counter shard read in one pipelined round trip and summed."""
+        pipe = redis_client.pipeline(transaction=False) # Shards live in different cluster slots
+        for counter_key in redis_keys.vote_counter_keys():
+            pipe.hgetall(counter_key)
+        counts: Dict[str, int] = {}
+        for shard_counts in await pipe.execute():
+            for candidate_id, count in shard_counts.items():
+                counts[candidate_id] = counts.get(candidate_id, 0) + int(count)
+        return counts
+
+    def _redis_unavailable(self) -> bool:
+        return self.redis_client is None or self._redis_breaker.state != CLOSED
+
+    def _aggregate_results_from_db(self) -> List[CandidateResult]:
+        """Counts valid votes per candidate in PostgreSQL. Expensive: only used by the snapshot refresher."""
+        with SessionLocal() as session:
+            rows = self._db_breaker.call(lambda: session.execute(
+                select(Candidate.id, Candidate.name, func.count(Vote.id))
+                .outerjoin(Vote, (Vote.candidate_id == Candidate.id) & Vote.is_valid.is_(True))
+                .group_by(Candidate.id, Candidate.name)
+            ).all())
+        return [CandidateResult(candidate_id=cid, name=name, vote_count=count) for cid, name, count in rows]
+
+    async def refresh_results_snapshot(self):
+        """
+        Refreshes the results snapshot from the results cache or, while Redis is down, from a DB
+        aggregation. A cache miss with Redis up is left to the next /results request, which
+        rebuilds results from the counters and refreshes the snapshot itself.
+        """
+        cache_service = self.cache_service
+        if cache_service is not None:
+            cached_results = await cache_service.get_results(page=1, limit=sys.maxsize)
+            if cached_results is not None:
+                self.results_snapshot.update(cached_results.results, cached_results.last_updated)
+                return
+        if self._redis_unavailable():
+            self.results_snapshot.update(await asyncio.to_thread(self._aggregate_results_from_db))
+            logger.info("Refreshed results snapshot from a DB aggregation (Redis unavailable).")
+
+    async def run_results_snapshot_refresh(self):
+        """
+        Background task: keeps the results snapshot at most RESULTS_SNAPSHOT_REFRESH_SECONDS old
+        (requests that rebuild results refresh it too). One refresh per process and interval,
+        however many requests fail, so an outage does not turn into a DB query storm.
+        """
+        interval = settings.RESULTS_SNAPSHOT_REFRESH_SECONDS
+        while True:
+            await asyncio.sleep(interval)
+            age = self.results_snapshot.age
+            if age is not None and age < interval:
+                continue
+            try:
+                await self.refresh_results_snapshot()
+            except asyncio.CancelledError:
+                raise
+            except (CircuitOpenError, SQLAlchemyError) as e:
+                logger.warning(f"Could not refresh results snapshot: {e!r}")
+            except Exception as e:
+                logger.error(f"Unexpected error while refreshing the results snapshot: {e}", exc_info=True)
+
+    async def run_event_log_flush(self):
+        """Background task: logs the per-vote event summary even when no vote arrives after the interval."""
+        while True:
+            await asyncio.sleep(settings.LOG_SUMMARY_INTERVAL_SECONDS)
+            self._events.flush()
+
+    async def run_candidate_catalog_refresh(self):
+        """Background task: loads the candidate catalog at startup, then reloads it periodically."""
+        while True:
+            if self.candidate_catalog.refresh_due:
+                await asyncio.to_thread(self.candidate_catalog.refresh) # Never raises
+            await asyncio.sleep(settings.CANDIDATE_CATALOG_MISS_REFRESH_SECONDS)
+
     # --- Removed Rate Limiting Placeholder from here --- The logic is now in process_vote_request
 
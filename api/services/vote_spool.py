@@ -0,0 +1,248 @@
+import fcntl
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from ..core.metrics import SPOOL_APPENDED, SPOOL_BYTES, SPOOL_REJECTED, SPOOL_REPLAYED
+
+logger = logging.getLogger(__name__)
+
+# Record layout: [payload length: u32][crc32 of payload: u32][payload]
+# Payload: [meta length: u32][meta JSON (exchange, routing_key, headers)][message body]
+_RECORD_HEADER = struct.Struct(">II")
+_META_HEADER = struct.Struct(">I")
+_SEGMENT_PREFIX = "spool-"
+_SEGMENT_SUFFIX = ".seg"
+
+PublishFn = Callable[[bytes, str, str, Optional[Dict[str, Any]]], None]
+
+
+class SpoolFullError(Exception):
+    """Raised when accepting a record would exceed the spool's disk budget."""
+
+
+def claim_spool_directory(base_directory: str) -> Tuple[str, Any]:
+    """
+    Picks a private spool directory '<base>/slot-<n>' for this process, holding an exclusive
+    flock on its lock file for the life of the process. With several API worker processes
+    sharing VOTE_SPOOL_DIR each gets its own slot; a restarted worker takes over the lowest
+    free slot and replays whatever its predecessor left there.
+    Returns (directory, lock file); keep the lock file open.
+    """
+    os.makedirs(base_directory, exist_ok=True)
+    slot = 0
+    while True:
+        directory = os.path.join(base_directory, f"slot-{slot}")
+        os.makedirs(directory, exist_ok=True)
+        lock_file = open(os.path.join(directory, ".lock"), "a+b")
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return directory, lock_file
+        except BlockingIOError:
+            lock_file.close()
+            slot += 1
+
+
+class VoteSpool:
+    """
+    Append-only, write-ahead spool for vote messages the broker could not accept.
+
+    Records are appended to fixed-size, memory-mapped segment files. Dirty pages are
+    flushed (msync) every `fsync_batch_records` records or `fsync_interval_seconds`,
+    whichever comes first, so a crash can lose at most that window of votes.
+    `replay()` publishes spooled records oldest first and deletes each segment once it
+    has been fully published. A crash during replay re-publishes part of a segment;
+    the worker's ON CONFLICT insert turns those into duplicates, so replay is idempotent.
+    """
+
+    def __init__(self, directory: str, segment_size_bytes: int, max_bytes: int,
+                 fsync_interval_seconds: float, fsync_batch_records: int):
+        self._directory = directory
+        self._segment_size = segment_size_bytes
+        self._max_bytes = max_bytes
+        self._fsync_interval = fsync_interval_seconds
+        self._fsync_batch = fsync_batch_records
+        self._lock = threading.Lock()
+
+        self._sealed: List[str] = [] # Paths of full/recovered segments, oldest first
+        self._sealed_bytes = 0 # Bytes in sealed segments not yet replayed
+        self._replay_offsets: Dict[str, int] = {} # Segment path -> bytes already published
+        self._active_path: Optional[str] = None
+        self._active_file = None
+        self._active_map: Optional[mmap.mmap] = None
+        self._active_pos = 0
+        self._next_seq = 0
+        self._unflushed = 0
+        self._last_flush = time.monotonic()
+
+        os.makedirs(directory, exist_ok=True)
+        self._recover()
+
+    # --- Segment management ---
+    def _segment_paths(self) -> List[str]:
+        names = sorted(n for n in os.listdir(self._directory)
+                       if n.startswith(_SEGMENT_PREFIX) and n.endswith(_SEGMENT_SUFFIX))
+        return [os.path.join(self._directory, n) for n in names]
+
+    def _recover(self):
+        """Seals segments left by a previous process, trimming them to their last valid record."""
+        for path in self._segment_paths():
+            valid_end = 0
+            for _, end in self._iter_records(path, 0):
+                valid_end = end
+            if valid_end == 0:
+                os.remove(path)
+                continue
+            os.truncate(path, valid_end)
+            self._sealed.append(path)
+            self._sealed_bytes += valid_end
+            seq = int(os.path.basename(path)[len(_SEGMENT_PREFIX):-len(_SEGMENT_SUFFIX)])
+            self._next_seq = max(self._next_seq, seq + 1)
+        if self._sealed:
+            logger.warning("Recovered %d spool segment(s) (%d bytes) pending replay.", len(self._sealed), self.pending_bytes)
+        SPOOL_BYTES.set(self.pending_bytes)
+
+    def _open_segment(self):
+        path = os.path.join(self._directory, f"{_SEGMENT_PREFIX}{self._next_seq:010d}{_SEGMENT_SUFFIX}")
+        self._next_seq += 1
+        f = open(path, "w+b")
+        f.truncate(self._segment_size) # Preallocate: appends never extend the file
+        self._active_path, self._active_file = path, f
+        self._active_map = mmap.mmap(f.fileno(), self._segment_size)
+        self._active_pos = 0
+
+    def _seal_active(self):
+        """Flushes the active segment, trims it to its used size and queues it for replay."""
+        if self._active_map is None:
+            return
+        self._active_map.flush()
+        self._active_map.close()
+        self._active_file.truncate(self._active_pos)
+        os.fsync(self._active_file.fileno())
+        self._active_file.close()
+        if self._active_pos > 0:
+            self._sealed.append(self._active_path)
+            self._sealed_bytes += self._active_pos
+        else:
+            os.remove(self._active_path)
+        self._active_path, self._active_file, self._active_map, self._active_pos = None, None, None, 0
+        self._unflushed = 0
+
+    @property
+    def pending_bytes(self) -> int:
+        return self._sealed_bytes + self._active_pos
+
+    @property
+    def has_capacity(self) -> bool:
+        """False once the disk budget leaves no room for another segment (appends may soon be refused)."""
+        return self.pending_bytes + self._segment_size <= self._max_bytes
+
+    @property
+    def has_pending(self) -> bool:
+        return bool(self._sealed) or self._active_pos > 0
+
+    # --- Writing ---
+    def append(self, body: bytes, exchange: str, routing_key: str, headers: Optional[Dict[str, Any]] = None):
+        """Durably (within the fsync window) stores one message. Raises SpoolFullError when over budget."""
+        meta = json.dumps({"exchange": exchange, "routing_key": routing_key, "headers": headers or None}).encode("utf-8")
+        payload = _META_HEADER.pack(len(meta)) + meta + body
+        record = _RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+        if len(record) > self._segment_size:
+            raise ValueError("Spool record larger than a segment.")
+
+        with self._lock:
+            if self._active_map is not None and self._active_pos + len(record) > self._segment_size:
+                self._seal_active()
+            if self._active_map is None:
+                # A new segment reserves its full size on disk
+                if self.pending_bytes + self._segment_size > self._max_bytes:
+                    SPOOL_REJECTED.inc()
+                    raise SpoolFullError(f"Vote spool is full ({self.pending_bytes} bytes pending).")
+                self._open_segment()
+
+            self._active_map[self._active_pos:self._active_pos + len(record)] = record
+            self._active_pos += len(record)
+            self._unflushed += 1
+            if self._unflushed >= self._fsync_batch or time.monotonic() - self._last_flush >= self._fsync_interval:
+                self._flush_locked()
+        SPOOL_APPENDED.inc()
+        SPOOL_BYTES.set(self.pending_bytes)
+
+    def _flush_locked(self):
+        if self._active_map is not None and self._unflushed:
+            self._active_map.flush() # msync the dirty pages of this segment
+        self._unflushed = 0
+        self._last_flush = time.monotonic()
+
+    def flush(self):
+        """Flushes pending appends if the fsync interval has elapsed (called periodically)."""
+        with self._lock:
+            if time.monotonic() - self._last_flush >= self._fsync_interval:
+                self._flush_locked()
+
+    # --- Replay ---
+    @staticmethod
+    def _iter_records(path: str, start: int) -> Iterator[Tuple[bytes, int]]:
+        """Yields (payload, end offset) for each valid record from `start`; stops at zero fill or a torn record."""
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                pos = start
+                while pos + _RECORD_HEADER.size <= size:
+                    length, crc = _RECORD_HEADER.unpack_from(data, pos)
+                    end = pos + _RECORD_HEADER.size + length
+                    if length == 0 or end > size:
+                        return
+                    payload = data[pos + _RECORD_HEADER.size:end]
+                    if zlib.crc32(payload) != crc:
+                        return
+                    yield payload, end
+                    pos = end
+
+    def replay(self, publish: PublishFn, max_records: int) -> int:
+        """
+        Publishes up to `max_records` spooled messages, oldest first. Stops at the first
+        publish error (the record stays spooled and is retried on the next call).
+        Returns the number of records published.
+        """
+        with self._lock:
+            if not self._sealed and self._active_pos > 0:
+                self._seal_active() # Replay what is spooled so far; new appends go to a fresh segment
+            segments = list(self._sealed)
+
+        published = 0
+        for path in segments:
+            offset = self._replay_offsets.get(path, 0)
+            for payload, end in self._iter_records(path, offset):
+                if published >= max_records:
+                    return published
+                (meta_len,) = _META_HEADER.unpack_from(payload, 0)
+                meta = json.loads(payload[_META_HEADER.size:_META_HEADER.size + meta_len])
+                body = payload[_META_HEADER.size + meta_len:]
+                publish(body, meta["exchange"], meta["routing_key"], meta["headers"]) # Raises on broker failure
+                with self._lock:
+                    self._sealed_bytes -= end - offset
+                self._replay_offsets[path] = offset = end
+                published += 1
+                SPOOL_REPLAYED.inc()
+
+            # Whole segment published: drop it
+            with self._lock:
+                self._sealed.remove(path)
+                self._replay_offsets.pop(path, None)
+                os.remove(path)
+            SPOOL_BYTES.set(self.pending_bytes)
+            logger.info("Replayed and removed spool segment %s.", os.path.basename(path))
+        return published
+
+    def close(self):
+        with self._lock:
+            self._seal_active()
@@ -0,0 +1,75 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import timeit
+import uuid
+from datetime import datetime
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from api.models.schemas import CandidateResult, ResultsResponse, VoteResponse # noqa: E402
+
+# CPU cost of building the /results (cache hit) and /vote response bodies, before and after
+# the orjson fast path. No Redis or server needed: the cached value is generated in memory.
+#
+# Usage: python benchmarks/serialization.py --candidates 100 --number 2000
+
+
+def cached_results_json(candidates: int) -> str:
+    """What CacheService.set_results stores in Redis."""
+    results = [CandidateResult(candidate_id=uuid.uuid4(), name=f"Candidate {i}", vote_count=1000 * i) for i in range(candidates)]
+    results.sort(key=lambda r: r.vote_count, reverse=True)
+    return ResultsResponse(results=results, last_updated=datetime.utcnow()).model_dump_json()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare response serialization paths of the vote API.")
+    parser.add_argument("--candidates", type=int, default=100, help="Candidates in the cached results.")
+    parser.add_argument("--limit", type=int, default=100, help="Page size requested from /results.")
+    parser.add_argument("--number", type=int, default=2000, help="Iterations per measurement.")
+    args = parser.parse_args(argv)
+
+    raw = cached_results_json(args.candidates)
+    results_field = create_response_field(name="response", type_=ResultsResponse)
+    vote_field = create_response_field(name="response", type_=VoteResponse)
+    loop = asyncio.new_event_loop()
+
+    def results_before():
+        # CacheService.get_results + response_model validation + JSONResponse
+        response = ResultsResponse(**json.loads(raw))
+        response.results.sort(key=lambda r: r.vote_count, reverse=True)
+        response.results = response.results[:args.limit]
+        content = loop.run_until_complete(serialize_response(field=results_field, response_content=response))
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+    def results_after():
+        # CacheService.get_results_raw + ORJSONResponse
+        data = orjson.loads(raw)
+        data["results"] = data["results"][:args.limit]
+        return orjson.dumps(data)
+
+    def vote_before():
+        response = VoteResponse(status="accepted", message="Vote accepted for processing", timestamp=datetime.utcnow())
+        content = loop.run_until_complete(serialize_response(field=vote_field, response_content=response))
+        return json.dumps(jsonable_encoder(content), separators=(",", ":")).encode("utf-8")
+
+    def vote_after():
+        response = VoteResponse.model_construct(status="accepted", message="Vote accepted for processing", timestamp=datetime.utcnow())
+        return orjson.dumps(response.model_dump())
+
+    print(f"{args.number} iterations, {args.candidates} cached candidates, page size {args.limit}")
+    for name, before, after in (("/results (cache hit)", results_before, results_after), ("/vote", vote_before, vote_after)):
+        before_us = min(timeit.repeat(before, number=args.number, repeat=3)) / args.number * 1e6
+        after_us = min(timeit.repeat(after, number=args.number, repeat=3)) / args.number * 1e6
+        print(f"{name:22s} before {before_us:8.1f} us/request  after {after_us:8.1f} us/request  ({before_us / after_us:.1f}x)")
+    loop.close()
+
+
+if __name__ == "__main__":
+    main()
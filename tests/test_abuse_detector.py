@@ -0,0 +1,87 @@
+import pytest
+
+from ..api.core.config import settings
+from ..workers.abuse_detector import AbuseDetector, SlidingCountMinSketch, TopK
+from ..workers.vote_processor import VoteMessage
+
+
+def _sketch(width=1024):
+    return SlidingCountMinSketch(width=width, depth=4, buckets=6, bucket_seconds=10) # 60 s window
+
+
+def test_sketch_counts_within_the_window():
+    sketch = _sketch()
+    for n in range(5):
+        assert sketch.add("203.0.113.7", 100 + n) == n + 1
+    assert sketch.estimate("203.0.113.7") == 5
+    assert sketch.estimate("198.51.100.1") == 0
+
+
+def test_old_sub_windows_expire():
+    sketch = _sketch()
+    sketch.add("a", 100) # Sub-window [100, 110)
+    sketch.add("a", 125)
+    assert sketch.estimate("a") == 2
+    sketch.advance(165) # [100, 110) is now outside the 60 s window
+    assert sketch.estimate("a") == 1
+    sketch.advance(1000) # Skipping far ahead clears everything
+    assert sketch.estimate("a") == 0
+
+
+def test_votes_older_than_the_window_are_not_counted():
+    sketch = _sketch()
+    sketch.add("a", 1000)
+    assert sketch.add("a", 900) == 0
+    assert sketch.estimate("a") == 1
+    assert sketch.add("a", 995) == 2 # Late but still inside the window
+
+
+def test_estimates_never_undercount():
+    sketch = _sketch(width=64) # Small on purpose: plenty of collisions
+    counts = {f"10.0.{n // 256}.{n % 256}": n % 7 + 1 for n in range(500)}
+    for key, count in counts.items():
+        for _ in range(count):
+            sketch.add(key, 100)
+    assert all(sketch.estimate(key) >= count for key, count in counts.items())
+
+
+def test_topk_keeps_the_heaviest_keys():
+    top = TopK(2)
+    for key, estimate in [("a", 1), ("b", 5), ("c", 3), ("a", 2)]:
+        top.offer(key, estimate)
+    assert top.items() == [("b", 5), ("c", 3)]
+
+
+def test_topk_refresh_drops_expired_keys():
+    sketch = _sketch()
+    top = TopK(3)
+    top.offer("a", sketch.add("a", 100))
+    top.offer("b", sketch.add("b", 150))
+    sketch.advance(165)
+    top.refresh(sketch)
+    assert top.items() == [("b", 1)]
+
+
+@pytest.fixture
+def detector(monkeypatch):
+    monkeypatch.setattr(settings, "ABUSE_IP_THRESHOLD", 3)
+    monkeypatch.setattr(settings, "ABUSE_IP_BLOCK_THRESHOLD", 0)
+    monkeypatch.setattr(settings, "ABUSE_USER_AGENT_THRESHOLD", 0)
+    return AbuseDetector()
+
+
+def _vote(source_ip="203.0.113.7"):
+    return VoteMessage("user-1", None, "2024-05-01T12:00:00Z", source_ip, "pytest")
+
+
+def test_detector_flags_sources_above_their_threshold(detector):
+    results = [detector.observe(_vote(), 100.0) for _ in range(5)]
+    assert results == [[], [], [], ["ip"], ["ip"]]
+    assert detector.observe(_vote("198.51.100.1"), 100.0) == []
+    assert detector.top("ip")[0] == ("203.0.113.7", 5)
+
+
+def test_detector_does_not_count_redeliveries_twice(detector):
+    for _ in range(3):
+        detector.observe(_vote(), 100.0)
+    assert detector.observe(_vote(), 100.0, count=False) == [] # Looked up only: still 3
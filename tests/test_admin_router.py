@@ -0,0 +1,116 @@
+import asyncio
+import csv
+import gzip
+import io
+from datetime import datetime, timezone
+
+import orjson
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.exc import OperationalError
+
+from ..api.core import vote_export
+from ..api.routers import admin
+from ..workers import vote_exporter
+
+
+def _export(start, end):
+    return asyncio.run(admin.export_votes(format="csv", start=start, end=end, compress=False))
+
+
+def test_export_compares_naive_and_aware_times_in_utc():
+    with pytest.raises(HTTPException) as raised:
+        _export(datetime(2024, 5, 2), datetime(2024, 5, 1, 12, tzinfo=timezone.utc))
+    assert raised.value.status_code == 400
+
+
+def test_export_accepts_a_mixed_range(monkeypatch):
+    def unavailable():
+        raise OperationalError("connect", {}, Exception("down"))
+    monkeypatch.setattr(admin, "open_export_connection", unavailable)
+    with pytest.raises(HTTPException) as raised: # Got past the range check
+        _export(datetime(2024, 5, 1), datetime(2024, 5, 2, tzinfo=timezone.utc))
+    assert raised.value.status_code == 503
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+
+    def close(self):
+        self.closed += 1
+
+
+ROW = ("6f1c", "user-1", "c0de", "Alice", "2024-05-01T12:00:00+00:00", "203.0.113.7", "pytest", True, "processed",
+       "2024-05-01T12:00:01+00:00")
+
+
+@pytest.fixture
+def exported(monkeypatch):
+    """Serves the export from the given chunks of rows; returns the response body and the connection."""
+    def export(chunks, format="csv", compress=False):
+        connection = FakeConnection()
+        monkeypatch.setattr(admin, "open_export_connection", lambda: connection)
+        monkeypatch.setattr(vote_export, "_iter_rows", lambda conn, start, end, chunk_rows: iter(chunks))
+
+        async def main():
+            response = await admin.export_votes(format=format, start=None, end=None, compress=compress)
+            body = [chunk async for chunk in response.body_iterator]
+            await response.background()
+            return response, body
+
+        response, body = asyncio.run(main())
+        return response, body, connection
+    return export
+
+
+def test_export_csv(exported):
+    response, body, connection = exported([[ROW], [ROW, ROW]])
+    assert response.media_type == "text/csv"
+    assert len(body) == 2 # One chunk per cursor fetch
+    rows = list(csv.reader(io.StringIO(b"".join(body).decode())))
+    assert rows[0] == list(vote_export.COLUMNS)
+    assert rows[1:] == [[str(value) for value in ROW]] * 3
+    assert connection.closed
+
+
+def test_export_ndjson(exported):
+    response, body, _ = exported([[ROW, ROW]], format="ndjson")
+    assert response.media_type == "application/x-ndjson"
+    lines = b"".join(body).splitlines()
+    assert [orjson.loads(line) for line in lines] == [dict(zip(vote_export.COLUMNS, ROW))] * 2
+
+
+def test_empty_csv_export_still_has_its_header(exported):
+    _, body, _ = exported([])
+    assert b"".join(body).decode().splitlines() == [",".join(vote_export.COLUMNS)]
+    _, body, _ = exported([], format="ndjson")
+    assert b"".join(body) == b""
+
+
+def test_export_is_one_gzip_stream(exported):
+    _, plain, _ = exported([[ROW], [ROW]], format="ndjson")
+    response, body, _ = exported([[ROW], [ROW]], format="ndjson", compress=True)
+    assert response.media_type == "application/gzip"
+    assert 'filename="votes-' in response.headers["content-disposition"]
+    assert response.headers["content-disposition"].endswith('.ndjson.gz"')
+    assert gzip.decompress(b"".join(body)) == b"".join(plain)
+
+
+def test_export_connection_is_closed_when_the_body_is_never_sent(monkeypatch):
+    connection = FakeConnection()
+    monkeypatch.setattr(admin, "open_export_connection", lambda: connection)
+
+    async def main():
+        response = await admin.export_votes(format="csv", start=None, end=None, compress=True)
+        await response.background() # What Starlette runs once the client is gone
+    asyncio.run(main())
+    assert connection.closed
+
+
+def test_exporter_cli_reads_naive_times_as_utc_and_checks_the_range(capsys):
+    assert vote_exporter._parse_time("2024-05-01T12:00:00") == datetime(2024, 5, 1, 12, tzinfo=timezone.utc)
+    with pytest.raises(SystemExit):
+        vote_exporter.main(["--start", "2024-05-02T00:00:00", "--end", "2024-05-01T12:00:00Z"])
+    assert "--start must be before --end" in capsys.readouterr().err
@@ -0,0 +1,93 @@
+import asyncio
+from uuid import uuid4
+
+from fakeredis.aioredis import FakeRedis as FakeAsyncRedis
+import pytest
+from redis.exceptions import ResponseError
+
+from ..api.services.cache_service import CacheService, is_redis_misuse
+
+
+@pytest.fixture
+def redis_client():
+    return FakeAsyncRedis(decode_responses=True)
+
+
+@pytest.fixture
+def cache(redis_client):
+    service = CacheService(redis_client, results_cache_ttl_seconds=5)
+    service._rate_limit_calls = 3
+    return service
+
+
+def test_allowed_calls_counts_each_key_within_its_limit(cache, redis_client):
+    async def main():
+        first = await cache.allowed_calls({"alice": 2, "bob": 5})
+        second = await cache.allowed_calls({"alice": 2, "carol": 1})
+        ttl = await redis_client.ttl("rate_limit:alice")
+        return first, second, ttl
+
+    first, second, ttl = asyncio.run(main())
+    assert first == {"alice": 2, "bob": 3}
+    assert second == {"alice": 1, "carol": 1}
+    assert 0 < ttl <= 60
+
+
+def test_allowed_calls_and_is_rate_limited_share_the_window(cache):
+    async def main():
+        await cache.allowed_calls({"alice": 3})
+        return await cache.is_rate_limited("alice")
+
+    assert asyncio.run(main()) is True
+
+
+def test_rate_limit_does_not_fail_open_when_redis_refuses_the_command(cache, redis_client):
+    async def main():
+        await redis_client.hset("rate_limit:alice", "not", "a counter") # WRONGTYPE for GET
+        await cache.allowed_calls({"alice": 1, "bob": 1})
+
+    with pytest.raises(ResponseError):
+        asyncio.run(main())
+
+
+def test_allowed_calls_fails_open_without_redis():
+    service = CacheService(None, results_cache_ttl_seconds=5)
+    assert asyncio.run(service.allowed_calls({"alice": 7})) == {"alice": 7}
+
+
+@pytest.mark.parametrize("message", [
+    "OOM command not allowed when used memory > 'maxmemory'.",
+    "READONLY You can't write against a read only replica.",
+    "LOADING Redis is loading the dataset in memory",
+])
+def test_rate_limit_fails_open_when_redis_is_degraded(cache, monkeypatch, message):
+    async def refuse(*args, **kwargs):
+        raise ResponseError(message)
+    monkeypatch.setattr(cache, "_call", refuse)
+
+    async def main():
+        return await cache.allowed_calls({"alice": 2}), await cache.is_rate_limited("alice")
+
+    assert asyncio.run(main()) == ({"alice": 2}, False)
+
+
+@pytest.mark.parametrize("message, misuse", [
+    ("CROSSSLOT Keys in request don't hash to the same slot", True),
+    ("Command # 1 (EVALSHA ...) of pipeline caused error: WRONGTYPE Operation against a key holding the wrong kind of value", True),
+    ("ERR Error running script (call to f_0): @user_script:5: WRONGTYPE Operation against a key", True),
+    ("Command # 1 (EVALSHA ...) of pipeline caused error: READONLY You can't write against a read only replica.", False),
+    ("NOSCRIPT No matching script. Please use EVAL.", False),
+])
+def test_is_redis_misuse(message, misuse):
+    assert is_redis_misuse(ResponseError(message)) is misuse
+
+
+def test_get_rollups_tells_missing_keys_from_candidates_without_votes(cache, redis_client):
+    alice, bob = uuid4(), uuid4()
+
+    async def main():
+        await redis_client.hset("rollup:minute:60", str(alice), 3)
+        keys = ["rollup:minute:0", "rollup:minute:60"]
+        return await cache.get_rollups(keys), await cache.get_rollups(keys, alice), await cache.get_rollups(keys, bob)
+
+    assert asyncio.run(main()) == ([None, {str(alice): "3"}], [None, {str(alice): "3"}], [None, {}])
@@ -0,0 +1,128 @@
+import asyncio
+
+import pytest
+
+from ..api.core import circuit_breaker
+from ..api.core.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", clock.monotonic)
+    return clock
+
+
+def _breaker(**kwargs):
+    return CircuitBreaker("test", failure_threshold=2, reset_timeout_seconds=10, half_open_max_calls=1, **kwargs)
+
+
+def _fail():
+    raise ConnectionError("down")
+
+
+def _open(breaker):
+    for _ in range(breaker.failure_threshold):
+        with pytest.raises(ConnectionError):
+            breaker.call(_fail)
+    assert breaker.state == OPEN
+
+
+def test_consecutive_failures_open_the_circuit(clock):
+    breaker = _breaker()
+    with pytest.raises(ConnectionError):
+        breaker.call(_fail)
+    assert breaker.call(lambda: "ok") == "ok" # A success resets the count
+    assert breaker.state == CLOSED
+    _open(breaker)
+    calls = []
+    with pytest.raises(CircuitOpenError):
+        breaker.call(calls.append, 1)
+    assert calls == []
+
+
+def test_half_open_probe_closes_or_reopens(clock):
+    breaker = _breaker()
+    _open(breaker)
+    clock.now += 10
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(ConnectionError):
+        breaker.call(_fail)
+    assert breaker.state == OPEN
+    clock.now += 10
+    assert breaker.call(lambda: "ok") == "ok"
+    assert breaker.state == CLOSED
+
+
+def test_half_open_allows_a_limited_number_of_probes(clock):
+    breaker = _breaker()
+    _open(breaker)
+    clock.now += 10
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+
+
+def test_errors_that_are_not_failures_count_as_answers(clock):
+    breaker = _breaker(is_failure=lambda e: isinstance(e, ConnectionError))
+    for _ in range(3):
+        with pytest.raises(ValueError):
+            breaker.call(lambda: int("x"))
+    assert breaker.state == CLOSED
+
+
+@pytest.mark.parametrize("interruption", [KeyboardInterrupt, SystemExit])
+def test_interrupted_calls_record_nothing(clock, interruption):
+    breaker = _breaker()
+    def interrupted():
+        raise interruption()
+    _open(breaker)
+    clock.now += 10
+    with pytest.raises(interruption):
+        breaker.call(interrupted)
+    assert breaker.state == HALF_OPEN # Not closed as if the dependency had answered
+    assert breaker.call(lambda: "ok") == "ok" # And the probe slot was freed
+    assert breaker.state == CLOSED
+
+
+def test_cancelled_async_call_is_not_a_success(clock):
+    breaker = _breaker()
+    _open(breaker)
+    clock.now += 10
+
+    async def main():
+        task = asyncio.ensure_future(breaker.call_async(asyncio.sleep, 10))
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert breaker.state == HALF_OPEN
+        assert await breaker.call_async(asyncio.sleep, 0) is None
+        assert breaker.state == CLOSED
+
+    asyncio.run(main())
+
+
+def test_cancelled_async_calls_do_not_reset_failures(clock):
+    breaker = _breaker(is_failure=lambda e: isinstance(e, ConnectionError))
+    with pytest.raises(ConnectionError):
+        breaker.call(_fail)
+
+    async def main():
+        task = asyncio.ensure_future(breaker.call_async(asyncio.sleep, 10))
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    with pytest.raises(ConnectionError):
+        breaker.call(_fail)
+    assert breaker.state == OPEN
@@ -0,0 +1,57 @@
+import asyncio
+import contextvars
+import threading
+
+import pytest
+
+from ..api.core.connections import Backoff, ConnectionThread
+
+request_id = contextvars.ContextVar("request_id", default=None)
+
+
+@pytest.fixture
+def owner():
+    thread = ConnectionThread("test-io")
+    yield thread
+    thread.shutdown()
+
+
+def test_every_call_runs_on_the_same_thread(owner):
+    idents = {owner.call(threading.get_ident) for _ in range(5)}
+    idents.add(asyncio.run(owner.call_async(threading.get_ident)))
+    assert len(idents) == 1
+    assert threading.get_ident() not in idents
+
+
+def test_calls_from_the_owner_thread_run_inline(owner):
+    # Would deadlock if the nested call were queued behind the running one
+    assert owner.call(lambda: owner.call(lambda: "inner")) == "inner"
+
+
+def test_call_async_keeps_the_context_and_the_event_loop_free(owner):
+    release = threading.Event()
+
+    async def main():
+        request_id.set("r-1")
+        pending = asyncio.ensure_future(owner.call_async(lambda: release.wait(5) and request_id.get()))
+        await asyncio.sleep(0.01)
+        release.set() # The loop is still running while the owner thread waits
+        return await pending
+
+    assert asyncio.run(main()) == "r-1"
+
+
+def test_call_propagates_exceptions(owner):
+    def fail():
+        raise RuntimeError("broker down")
+    with pytest.raises(RuntimeError):
+        owner.call(fail)
+
+
+def test_backoff_grows_to_the_maximum_and_resets():
+    backoff = Backoff(initial=1, maximum=8)
+    ceilings = [1, 2, 4, 8, 8]
+    for ceiling in ceilings:
+        assert ceiling / 2 <= backoff.next_delay() <= ceiling
+    backoff.reset()
+    assert backoff.next_delay() <= 1
@@ -0,0 +1,39 @@
+import pytest
+from sqlalchemy.exc import (DataError, DBAPIError, IntegrityError, InterfaceError, OperationalError, ProgrammingError,
+                            StatementError, TimeoutError as PoolTimeoutError)
+
+from ..api.core.database import is_transient_db_error
+
+
+class DriverError(Exception):
+    def __init__(self, pgcode=None):
+        super().__init__("driver error")
+        self.pgcode = pgcode
+
+
+def _wrapped(cls, pgcode=None, connection_invalidated=False):
+    return cls("SELECT 1", {}, DriverError(pgcode), connection_invalidated=connection_invalidated)
+
+
+@pytest.mark.parametrize("error", [
+    _wrapped(OperationalError),
+    _wrapped(InterfaceError),
+    PoolTimeoutError("QueuePool limit reached"),
+    _wrapped(DBAPIError, connection_invalidated=True),
+    _wrapped(DBAPIError, pgcode="40001"), # serialization_failure
+    _wrapped(DBAPIError, pgcode="40P01"), # deadlock_detected
+])
+def test_transient_errors(error):
+    assert is_transient_db_error(error)
+
+
+@pytest.mark.parametrize("error", [
+    _wrapped(IntegrityError, pgcode="23505"),
+    _wrapped(DataError, pgcode="22P02"), # e.g. a malformed INET source_ip
+    _wrapped(ProgrammingError, pgcode="42P01"),
+    StatementError("bad parameter", "SELECT 1", {}, ValueError("boom")),
+    ConnectionError("not a DB error"),
+    ValueError("bad timestamp"),
+])
+def test_permanent_errors(error):
+    assert not is_transient_db_error(error)
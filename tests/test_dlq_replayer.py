@@ -0,0 +1,110 @@
+import json
+
+import pika
+import pytest
+from jose import jwt
+
+from ..api.core import queue_topology
+from ..api.core.config import settings
+from ..workers import dlq_replayer
+from ..workers.dlq_replayer import RatePacer, archive_record, classify, original_destination, replay_headers
+
+
+def _body(**overrides) -> bytes:
+    message = {
+        "candidate_id": "9b1deb4d-3b7d-4bad-9bdd-2b0d7b3dcb6d",
+        "user_token": jwt.encode({"user_uid": "user-1"}, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM),
+        "vote_timestamp": "2024-05-01T12:00:00Z",
+    }
+    message.update(overrides)
+    return json.dumps(message).encode()
+
+
+def _rejected(reason, **headers):
+    return {queue_topology.REJECTION_REASON_HEADER: reason, **headers}
+
+
+@pytest.mark.parametrize("reason", sorted(queue_topology.PERMANENT_REJECTION_REASONS))
+def test_permanent_rejections_are_archived_even_with_a_valid_payload(reason):
+    assert classify(_body(), _rejected(reason)) == ("archive", reason)
+
+
+@pytest.mark.parametrize("reason", ["retries_exhausted", "unexpected_error", None])
+def test_valid_votes_rejected_for_other_reasons_are_retried(reason):
+    assert classify(_body(), _rejected(reason) if reason else None) == ("retry", None)
+
+
+def test_invalid_payloads_without_a_reason_are_archived():
+    assert classify(b"not json") == ("archive", "bad_json")
+    assert classify(_body(vote_timestamp="yesterday")) == ("archive", "bad_data")
+
+
+def test_replays_are_capped():
+    headers = _rejected("retries_exhausted")
+    for _ in range(3):
+        assert classify(_body(), headers, max_replays=3) == ("retry", None)
+        headers = {**replay_headers(headers), queue_topology.REJECTION_REASON_HEADER: "retries_exhausted"}
+    assert classify(_body(), headers, max_replays=3) == ("archive", "replay_limit")
+
+
+def test_replay_headers_start_fresh_retry_tiers():
+    headers = replay_headers(_rejected("retries_exhausted", **{
+        queue_topology.RETRY_ATTEMPT_HEADER: 3,
+        queue_topology.ORIGINAL_QUEUE_HEADER: "vote_queue",
+        "x-death": [{"queue": "vote_queue"}],
+        "traceparent": "00-abc-def-01",
+    }))
+    assert headers == {"traceparent": "00-abc-def-01", queue_topology.REPLAY_COUNT_HEADER: 1}
+
+
+def test_original_destination_prefers_the_rejecting_queue():
+    properties = pika.BasicProperties(headers={
+        queue_topology.ORIGINAL_QUEUE_HEADER: "vote_queue.shard.2",
+        "x-death": [{"exchange": "", "routing-keys": ["vote_queue.retry.60"]}],
+    })
+    assert original_destination(properties, _body()) == ("", "vote_queue.shard.2")
+    legacy = pika.BasicProperties(headers={"x-death": [{"exchange": "", "routing-keys": ["vote_queue"], "queue": "vote_queue"}]})
+    assert original_destination(legacy, _body()) == ("", "vote_queue")
+    assert original_destination(pika.BasicProperties(), _body()) == queue_topology.publish_target("user-1")
+
+
+def test_archive_record_keeps_non_utf8_bodies():
+    properties = pika.BasicProperties(headers=_rejected("bad_json", **{queue_topology.ORIGINAL_QUEUE_HEADER: "vote_queue"}))
+    record = archive_record(None, properties, b"\xff\xfe", "bad_json")
+    assert record["body_base64"] == "//4="
+    assert record["original_queue"] == "vote_queue"
+    assert record["replays"] == 0
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def test_rate_pacer_spaces_releases(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(dlq_replayer.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(dlq_replayer.time, "sleep", clock.sleep)
+    pacer = RatePacer(4)
+    for _ in range(5):
+        pacer.wait()
+    assert clock.sleeps == [0.25, 0.25, 0.25, 0.25]
+    clock.now += 10 # Idle time is not saved up for a burst
+    pacer.wait()
+    pacer.wait()
+    assert clock.sleeps[-1] == 0.25
+
+
+def test_rate_pacer_unlimited(monkeypatch):
+    monkeypatch.setattr(dlq_replayer.time, "sleep", lambda seconds: pytest.fail("should not sleep"))
+    pacer = RatePacer(0)
+    for _ in range(100):
+        pacer.wait()
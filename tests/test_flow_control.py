@@ -0,0 +1,51 @@
+from ..workers.flow_control import AdaptiveFlowController
+
+
+def _controller(prefetch=10, batch_size=10) -> AdaptiveFlowController:
+    flow = AdaptiveFlowController()
+    flow.min_prefetch, flow.max_prefetch = 5, 500
+    flow.min_batch_size, flow.max_batch_size = 1, 200
+    flow._target_latency, flow._max_error_rate = 0.25, 0.2
+    flow.prefetch, flow.batch_size = prefetch, batch_size
+    return flow
+
+
+def test_grows_while_a_backlog_builds_and_the_db_is_healthy():
+    flow = _controller()
+    flow.record_batch(0.01, failed=False)
+    flow.record_queue_depth(1000)
+    assert flow.adjust() == (16, 16)
+    assert flow.adjust() == (25, 25)
+
+
+def test_halves_when_db_latency_exceeds_the_target():
+    flow = _controller(prefetch=100, batch_size=50)
+    flow.record_batch(1.0, failed=False)
+    flow.record_queue_depth(1000)
+    assert flow.adjust() == (50, 25)
+
+
+def test_halves_when_batches_fail():
+    flow = _controller(prefetch=100, batch_size=50)
+    for _ in range(3):
+        flow.record_batch(0.01, failed=True)
+    assert flow.error_rate_ewma > 0.2
+    assert flow.adjust() == (50, 25)
+
+
+def test_shrinks_the_batch_when_the_queue_is_nearly_empty():
+    flow = _controller(prefetch=40, batch_size=40)
+    flow.record_batch(0.01, failed=False)
+    flow.record_queue_depth(0)
+    assert flow.adjust() == (40, 20)
+
+
+def test_stays_within_bounds_and_batch_never_exceeds_prefetch():
+    flow = _controller(prefetch=400, batch_size=200)
+    flow.record_batch(0.01, failed=False)
+    flow.record_queue_depth(10 ** 6)
+    prefetch, batch_size = flow.adjust()
+    assert (prefetch, batch_size) == (500, 200)
+    flow = _controller(prefetch=6, batch_size=2)
+    flow.record_batch(5.0, failed=False)
+    assert flow.adjust() == (5, 1)
@@ -0,0 +1,92 @@
+import asyncio
+import time
+
+import fakeredis
+import pytest
+from fakeredis.aioredis import FakeRedis as FakeAsyncRedis
+
+from ..api.core import redis_keys
+from ..api.services.cache_service import CacheService
+from ..api.services.idempotency import PENDING, IdempotencyConflict, IdempotencyStore
+from ..api.services.vote_service import VoteService
+from ..workers import message_consumer as mc
+
+RESPONSE = {"status": "accepted", "receipt_id": "r-1"}
+KEY = IdempotencyStore.redis_key("user-1", "key-1")
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer() # Shared by the API's async client and the worker's sync client
+
+
+@pytest.fixture
+def redis_client(server):
+    return FakeAsyncRedis(server=server, decode_responses=True)
+
+
+@pytest.fixture
+def cache(redis_client):
+    return CacheService(redis_client, results_cache_ttl_seconds=5)
+
+
+def _store(cache):
+    """A store with its own process memory, like another API process."""
+    return IdempotencyStore(lambda: cache, ttl_seconds=60, pending_ttl_seconds=5, lru_size=10)
+
+
+def test_claim_complete_and_replay(cache, redis_client):
+    store = _store(cache)
+
+    async def main():
+        assert await store.claim(KEY, "vote-a") is None # Claimed
+        assert await redis_client.get(KEY) == PENDING
+        with pytest.raises(IdempotencyConflict) as in_flight:
+            await _store(cache).claim(KEY, "vote-a")
+        await store.complete(KEY, "vote-a", RESPONSE)
+        assert 0 < await redis_client.ttl(KEY) <= 60
+        replayed = await _store(cache).claim(KEY, "vote-a") # From Redis
+        with pytest.raises(IdempotencyConflict) as mismatch:
+            await _store(cache).claim(KEY, "vote-b")
+        return in_flight.value.reason, replayed, mismatch.value.reason
+
+    assert asyncio.run(main()) == ("in_progress", RESPONSE, "mismatch")
+
+
+def test_released_key_can_be_claimed_again(cache):
+    async def main():
+        assert await _store(cache).claim(KEY, "vote-a") is None
+        await _store(cache).release(KEY) # The publish failed
+        return await _store(cache).claim(KEY, "vote-a")
+
+    assert asyncio.run(main()) is None
+
+
+def test_without_redis_the_process_memory_still_replays():
+    store = IdempotencyStore(lambda: None, ttl_seconds=60, pending_ttl_seconds=5, lru_size=10)
+
+    async def main():
+        assert await store.claim(KEY, "vote-a") is None
+        await store.complete(KEY, "vote-a", RESPONSE)
+        return await store.claim(KEY, "vote-a")
+
+    assert asyncio.run(main()) == RESPONSE
+
+
+def test_receipt_written_by_the_worker_is_read_by_the_api(server, cache, redis_client, monkeypatch):
+    monkeypatch.setattr(mc.redis_manager, "_current", fakeredis.FakeStrictRedis(server=server))
+    processor = mc.VoteMessageProcessor()
+    service = object.__new__(VoteService) # Only the cache is used
+    service._redis_ready, service._cache_service = True, cache
+    processed, unknown = redis_keys.new_vote_receipt_id(), redis_keys.new_vote_receipt_id()
+    processor._record_receipt(processed, "processed")
+    processor._write_receipts()
+    key, _, expire_at = redis_keys.vote_receipt_location(processed)
+
+    async def main():
+        return await service.get_vote_receipt(processed), await service.get_vote_receipt(unknown), await redis_client.ttl(key)
+
+    done, pending, ttl = asyncio.run(main())
+    assert (done.status, pending.status, pending.updated_at) == ("processed", "pending", None)
+    assert done.updated_at is not None
+    assert abs(ttl - (expire_at - time.time())) < 5
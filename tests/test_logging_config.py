@@ -0,0 +1,38 @@
+import logging
+
+from ..api.core.logging_config import EventLog
+
+
+def _summaries(caplog):
+    return [r for r in caplog.records if getattr(r, "event", None) == "summary"]
+
+
+def test_event_counts_are_summarized_once_the_interval_elapsed(caplog):
+    events = EventLog(logging.getLogger("test.events"), "Test")
+    events._interval = 0
+    with caplog.at_level(logging.INFO):
+        events.event("processed")
+    assert [r.counts for r in _summaries(caplog)] == [{"processed": 1}]
+
+
+def test_flush_reports_a_burst_after_traffic_stops(caplog):
+    events = EventLog(logging.getLogger("test.events"), "Test")
+    events._interval = 3600
+    with caplog.at_level(logging.INFO):
+        events.event("processed")
+        events.event("processed")
+        events.event("retry")
+        events.flush() # Interval not over yet
+        assert _summaries(caplog) == []
+        events._interval = 0
+        events.flush()
+    assert [r.counts for r in _summaries(caplog)] == [{"processed": 2, "retry": 1}]
+
+
+def test_forced_flush_logs_pending_counts_only(caplog):
+    events = EventLog(logging.getLogger("test.events"), "Test")
+    with caplog.at_level(logging.INFO):
+        events.flush(force=True) # Nothing counted: nothing logged
+        events.event("duplicate")
+        events.flush(force=True)
+    assert [r.counts for r in _summaries(caplog)] == [{"duplicate": 1}]
@@ -0,0 +1,224 @@
+import threading
+from types import SimpleNamespace
+from uuid import uuid4
+
+import pika
+import pytest
+from sqlalchemy.exc import DataError, IntegrityError, OperationalError
+
+from ..api.core import queue_topology
+from ..api.core.circuit_breaker import CircuitBreaker
+from ..api.core.database import is_transient_db_error
+from ..workers import message_consumer as mc
+from ..workers.vote_processor import VoteMessage
+
+
+class FakeChannel:
+    """Records what the consumer does with each delivery."""
+
+    def __init__(self):
+        self.is_open = True
+        self.acked, self.rejected, self.requeued, self.published = [], [], [], []
+
+    def basic_ack(self, delivery_tag, multiple=False):
+        self.acked.append(delivery_tag)
+
+    def basic_reject(self, delivery_tag, requeue=True):
+        self.rejected.append(delivery_tag)
+
+    def basic_nack(self, delivery_tag, multiple=False, requeue=True):
+        self.requeued.append(delivery_tag)
+
+    def basic_publish(self, exchange, routing_key, body, properties=None, mandatory=False):
+        self.published.append((routing_key, properties.headers))
+
+
+def _vote(candidate_id=None) -> VoteMessage:
+    return VoteMessage("user-" + uuid4().hex, candidate_id or uuid4(), "2024-05-01T12:00:00Z", "203.0.113.7", "pytest")
+
+
+@pytest.fixture
+def processor(monkeypatch):
+    monkeypatch.setattr(mc, "db_breaker", CircuitBreaker("postgres-test", is_failure=is_transient_db_error))
+    monkeypatch.setattr(mc.redis_manager, "_current", None) # Counters and receipts are skipped
+    processor = mc.VoteMessageProcessor()
+    processor._channel = FakeChannel()
+    return processor
+
+
+def _queue(processor, votes):
+    for tag, vote in enumerate(votes, start=1):
+        processor._pending.append(mc.PendingVote(tag, vote, None, "vote_queue", b"{}", {}))
+
+
+def _confirm(processor, method):
+    processor.on_delivery_confirmation(SimpleNamespace(method=method))
+
+
+def _db_error(cls):
+    return cls("INSERT ...", {}, Exception("boom"))
+
+
+def test_batch_statuses_are_acked(processor, monkeypatch):
+    monkeypatch.setattr(mc.db_handler, "execute_batch", lambda votes: ["processed", "duplicate"])
+    _queue(processor, [_vote(), _vote()])
+    processor._flush_batch()
+    assert processor._channel.acked == [1, 2]
+    assert processor._channel.rejected == []
+
+
+@pytest.mark.parametrize("error", [_db_error(IntegrityError), _db_error(DataError), ValueError("bad timestamp")])
+def test_non_transient_batch_error_isolates_the_bad_vote(processor, monkeypatch, error):
+    bad = _vote()
+    def execute_batch(votes):
+        raise error
+    def execute_transaction(**kwargs):
+        if kwargs["candidate_id"] == bad.candidate_id:
+            raise error
+        return "processed"
+    monkeypatch.setattr(mc.db_handler, "execute_batch", execute_batch)
+    monkeypatch.setattr(mc.db_handler, "execute_transaction", execute_transaction)
+    _queue(processor, [_vote(), bad, _vote()])
+    processor._flush_batch()
+    assert processor._channel.acked == [1, 3]
+    # Nothing goes to the delay queues: the bad vote is copied to the DLQ with its reason
+    [(routing_key, headers)] = processor._channel.published
+    assert routing_key == mc.settings.RABBITMQ_DLQ_QUEUE
+    assert headers[queue_topology.REJECTION_REASON_HEADER] == "db_rejected"
+    assert headers[queue_topology.ORIGINAL_QUEUE_HEADER] == "vote_queue"
+    assert processor._flow.error_rate_ewma == 0 # Bad data is not a DB health problem
+    _confirm(processor, pika.spec.Basic.Ack(delivery_tag=1))
+    assert processor._channel.acked == [1, 3, 2]
+    assert processor._channel.rejected == []
+
+
+def test_transient_batch_error_schedules_retries(processor, monkeypatch):
+    def execute_batch(votes):
+        raise _db_error(OperationalError)
+    monkeypatch.setattr(mc.db_handler, "execute_batch", execute_batch)
+    _queue(processor, [_vote(), _vote()])
+    processor._flush_batch()
+    delay = queue_topology.retry_delays()[0]
+    assert [routing_key for routing_key, _ in processor._channel.published] == [queue_topology.retry_queue_name("vote_queue", delay)] * 2
+    assert all(headers[queue_topology.RETRY_ATTEMPT_HEADER] == 1 for _, headers in processor._channel.published)
+    assert processor._flow.error_rate_ewma > 0
+    assert processor._channel.acked == [] # Not before the broker confirms the copies
+
+
+def test_retried_originals_are_acked_once_their_copy_is_confirmed(processor, monkeypatch):
+    def execute_batch(votes):
+        raise _db_error(OperationalError)
+    monkeypatch.setattr(mc.db_handler, "execute_batch", execute_batch)
+    _queue(processor, [_vote(), _vote(), _vote()])
+    processor._flush_batch()
+    _confirm(processor, pika.spec.Basic.Ack(delivery_tag=2, multiple=True))
+    assert processor._channel.acked == [1, 2]
+    _confirm(processor, pika.spec.Basic.Nack(delivery_tag=3))
+    assert processor._channel.acked == [1, 2]
+    assert processor._channel.requeued == [3]
+    assert processor._unconfirmed == {}
+
+
+def test_exhausted_retries_go_to_the_dlq_as_replayable(processor, monkeypatch):
+    def execute_batch(votes):
+        raise _db_error(OperationalError)
+    monkeypatch.setattr(mc.db_handler, "execute_batch", execute_batch)
+    vote = _vote()
+    headers = {queue_topology.RETRY_ATTEMPT_HEADER: len(queue_topology.retry_delays()), "x-death": [{"queue": "vote_queue.retry.60"}]}
+    processor._pending.append(mc.PendingVote(1, vote, None, "vote_queue", b"{}", headers))
+    processor._flush_batch()
+    [(routing_key, published_headers)] = processor._channel.published
+    assert routing_key == mc.settings.RABBITMQ_DLQ_QUEUE
+    assert published_headers[queue_topology.REJECTION_REASON_HEADER] == "retries_exhausted"
+    assert "x-death" not in published_headers
+
+
+def test_open_circuit_schedules_retries_without_calling_the_db(processor, monkeypatch):
+    calls = []
+    monkeypatch.setattr(mc.db_handler, "execute_batch", lambda votes: calls.append(votes))
+    for _ in range(mc.db_breaker.failure_threshold):
+        mc.db_breaker.record_failure()
+    _queue(processor, [_vote()])
+    processor._flush_batch()
+    assert calls == []
+    assert len(processor._channel.published) == 1
+
+
+def test_quarantined_votes_are_not_counted(processor, monkeypatch):
+    counted = []
+    monkeypatch.setattr(processor, "_increment_vote_counts", lambda votes: counted.extend(votes))
+    monkeypatch.setattr(mc.db_handler, "execute_batch", lambda votes: ["processed", "processed"])
+    valid, quarantined = _vote(), _vote()
+    quarantined.flagged, quarantined.is_valid = True, False
+    _queue(processor, [valid, quarantined])
+    processor._flush_batch()
+    assert counted == [valid]
+
+
+def test_rollup_mirror_runs_off_the_ioloop(processor, monkeypatch):
+    ran = threading.Event()
+    threads = []
+    def mirror_rollups(start, end):
+        threads.append(threading.current_thread())
+        ran.set()
+    monkeypatch.setattr(mc, "mirror_rollups", mirror_rollups)
+    monkeypatch.setattr(processor, "_claim_rollup_mirror", lambda: True)
+    scheduled = []
+    processor._connection = SimpleNamespace(ioloop=SimpleNamespace(call_later=lambda delay, fn: scheduled.append(fn), remove_timeout=lambda timer: None))
+    processor._on_rollup_mirror_tick()
+    assert ran.wait(5)
+    assert threads != [threading.current_thread()]
+    assert scheduled == [processor._on_rollup_mirror_tick] # Rescheduled without waiting for the refresh
+
+
+class QosChannel(FakeChannel):
+    """Applies basic.qos like RabbitMQ does: a consumer keeps the prefetch in force when it was created."""
+
+    def __init__(self):
+        super().__init__()
+        self.prefetch = None
+        self.consumers = {} # consumer tag -> (queue name, prefetch)
+        self.consumed = 0
+
+    def basic_qos(self, prefetch_count=0, global_qos=False):
+        self.prefetch = prefetch_count
+
+    def basic_consume(self, queue, on_message_callback, auto_ack=False, arguments=None):
+        self.consumed += 1
+        consumer_tag = f"ctag-{self.consumed}"
+        self.consumers[consumer_tag] = (queue, self.prefetch)
+        return consumer_tag
+
+    def basic_cancel(self, consumer_tag, callback=None):
+        del self.consumers[consumer_tag]
+        callback(SimpleNamespace(method=pika.spec.Basic.CancelOk(consumer_tag)))
+
+
+def test_prefetch_changes_reach_the_consumers(processor, monkeypatch):
+    monkeypatch.setattr(mc.settings, "RABBITMQ_QUEUE_TYPE", "classic")
+    processor._channel = channel = QosChannel()
+    processor._consumed_queues = ["votes_shard_0", "votes_shard_1"]
+    processor._flow.prefetch = 10
+    monkeypatch.setattr(processor, "_schedule_flow_control", lambda: None)
+    monkeypatch.setattr(processor, "_schedule_rollup_mirror", lambda: None)
+    processor.start_consuming()
+    assert sorted(channel.consumers.values()) == [("votes_shard_0", 10), ("votes_shard_1", 10)]
+
+    monkeypatch.setattr(processor._flow, "adjust", lambda: (40, 20))
+    for queue_name in processor._consumed_queues:
+        processor._on_queue_depth(queue_name, SimpleNamespace(method=SimpleNamespace(message_count=500)))
+    assert sorted(channel.consumers.values()) == [("votes_shard_0", 40), ("votes_shard_1", 40)]
+    assert sorted(processor._consumer_tags.values()) == ["votes_shard_0", "votes_shard_1"]
+    assert set(processor._consumer_tags) == set(channel.consumers)
+
+
+def test_unexpected_parse_error_rejects_and_writes_receipts(processor, monkeypatch):
+    def broken(body):
+        raise RuntimeError("boom")
+    monkeypatch.setattr(mc, "parse_vote_message", broken)
+    written = []
+    monkeypatch.setattr(processor, "_write_receipts", lambda: written.append(True))
+    method = SimpleNamespace(delivery_tag=7, consumer_tag="ctag-1", routing_key="vote_queue", redelivered=False)
+    processor._handle_message(processor._channel, method, SimpleNamespace(headers={}), b"{}", None)
+    assert [headers[queue_topology.REJECTION_REASON_HEADER] for _, headers in processor._channel.published] == ["unexpected_error"]
+    assert written == [True]
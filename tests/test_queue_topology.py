@@ -0,0 +1,54 @@
+import zlib
+
+import pytest
+
+from ..api.core import queue_topology
+from ..api.core.config import settings
+
+
+@pytest.fixture
+def routing(monkeypatch):
+    def configure(mode, shards=4, worker_shards=""):
+        monkeypatch.setattr(settings, "RABBITMQ_ROUTING_MODE", mode)
+        monkeypatch.setattr(settings, "RABBITMQ_SHARD_COUNT", shards)
+        monkeypatch.setattr(settings, "WORKER_SHARDS", worker_shards)
+    return configure
+
+
+def test_single_mode_publishes_to_the_vote_queue(routing):
+    routing("single")
+    assert queue_topology.publish_target("user-1") == ("", settings.RABBITMQ_QUEUE_NAME)
+    assert queue_topology.vote_queue_names() == [settings.RABBITMQ_QUEUE_NAME]
+
+
+def test_sharded_mode_pins_each_user_to_one_shard(routing):
+    routing("sharded", shards=4)
+    exchange, routing_key = queue_topology.publish_target("user-1")
+    assert exchange == ""
+    assert routing_key == f"{settings.RABBITMQ_QUEUE_NAME}.shard.{zlib.crc32(b'user-1') % 4}"
+    assert queue_topology.publish_target("user-1") == (exchange, routing_key) # Stable across calls (and processes)
+    targets = {queue_topology.publish_target(f"user-{n}")[1] for n in range(200)}
+    assert targets == set(queue_topology.vote_queue_names()) # Users spread over every shard
+
+
+def test_consistent_hash_mode_routes_on_the_user_key(routing):
+    routing("consistent_hash")
+    assert queue_topology.publish_target("user-1") == (settings.RABBITMQ_SHARD_EXCHANGE, "user-1")
+
+
+def test_worker_shards(routing):
+    routing("sharded", shards=4, worker_shards="2, 0")
+    assert queue_topology.worker_queue_names() == [queue_topology.shard_queue_name(0), queue_topology.shard_queue_name(2)]
+    routing("sharded", shards=4, worker_shards="4")
+    with pytest.raises(ValueError):
+        queue_topology.worker_queue_names()
+
+
+def test_retry_queues_dead_letter_back_to_their_queue(monkeypatch):
+    monkeypatch.setattr(settings, "WORKER_RETRY_DELAYS_SECONDS", "2, 10,60")
+    assert queue_topology.retry_delays() == [2, 10, 60]
+    arguments = queue_topology.retry_queue_arguments("vote_queue.shard.1", 10)
+    assert queue_topology.retry_queue_name("vote_queue.shard.1", 10) == "vote_queue.shard.1.retry.10"
+    assert arguments["x-message-ttl"] == 10000
+    assert arguments["x-dead-letter-exchange"] == ""
+    assert arguments["x-dead-letter-routing-key"] == "vote_queue.shard.1"
@@ -0,0 +1,172 @@
+import os
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pytest
+
+from ..api.core import vote_archive
+from ..api.core.vote_archive import ARCHIVE_SCHEMA, MANIFEST_NAME, ArchiveError
+from ..workers.vote_archiver import _parse_time
+
+START = datetime(2024, 3, 1, tzinfo=timezone.utc)
+END = datetime(2024, 3, 15, tzinfo=timezone.utc)
+ALICE, BOB = str(uuid4()), str(uuid4())
+
+
+def _batch(candidates, valid):
+    rows = len(candidates)
+    return pa.RecordBatch.from_pydict({
+        "vote_id": [str(uuid4()) for _ in range(rows)],
+        "user_identifier": [f"user-{i}" for i in range(rows)],
+        "candidate_id": candidates,
+        "vote_timestamp": [START] * rows,
+        "source_ip": ["203.0.113.7"] * rows,
+        "user_agent": ["pytest"] * rows,
+        "is_valid": valid,
+        "processing_status": ["processed"] * rows,
+        "created_at": [START] * rows,
+    }, schema=ARCHIVE_SCHEMA)
+
+
+def _batches():
+    return [_batch([ALICE, BOB], [True, True]), _batch([ALICE, ALICE, BOB], [True, False, True])]
+
+
+EXPECTED = {ALICE: {"votes": 3, "valid_votes": 2}, BOB: {"votes": 2, "valid_votes": 2}}
+
+
+class FakeConnection:
+    """The export connection: now() and the candidate names (counts and rows are patched in)."""
+
+    def __init__(self):
+        self.closed = False
+
+    def execute(self, query):
+        return FakeResult()
+
+    def close(self):
+        self.closed = True
+
+
+class FakeResult:
+    def scalar(self):
+        return END + timedelta(days=1)
+
+    def __iter__(self):
+        return iter([(ALICE, "Alice"), (BOB, "Bob")])
+
+
+@pytest.fixture
+def snapshot(monkeypatch):
+    """Patches the snapshot read by archive_round; returns the connection and the counts it reports."""
+    connection = FakeConnection()
+    counts = {key: dict(value) for key, value in EXPECTED.items()}
+    monkeypatch.setattr(vote_archive, "open_export_connection", lambda: connection)
+    monkeypatch.setattr(vote_archive, "_snapshot_counts", lambda conn, start, end: counts)
+    monkeypatch.setattr(vote_archive, "_iter_record_batches", lambda conn, start, end, batch_rows: iter(_batches()))
+    return connection, counts
+
+
+def test_write_files_splits_into_parts_and_counts_read_back(tmp_path):
+    files = vote_archive._write_files(iter(_batches() + _batches()), str(tmp_path), file_rows=4)
+    assert [(f["name"], f["rows"]) for f in files] == [("part-00000.parquet", 5), ("part-00001.parquet", 5)]
+    assert all(f["bytes"] == os.path.getsize(tmp_path / f["name"]) for f in files)
+    counts = vote_archive._file_counts(str(tmp_path), files)
+    assert counts == {ALICE: {"votes": 6, "valid_votes": 4}, BOB: {"votes": 4, "valid_votes": 4}}
+
+
+def test_file_counts_rejects_a_file_with_other_row_counts(tmp_path):
+    files = vote_archive._write_files(iter(_batches()), str(tmp_path), file_rows=100)
+    files[0]["rows"] += 1
+    with pytest.raises(ArchiveError):
+        vote_archive._file_counts(str(tmp_path), files)
+
+
+def test_archive_round_writes_a_verified_manifest(tmp_path, snapshot):
+    connection, _ = snapshot
+    manifest = vote_archive.archive_round("2024-spring", START, END, directory=str(tmp_path))
+    assert connection.closed
+    assert os.listdir(tmp_path) == ["2024-spring"]
+    assert vote_archive.load_manifest("2024-spring", str(tmp_path)) == manifest
+    assert manifest["rows"] == 5 and manifest["deleted_rows"] is None
+    assert [(c["name"], c["votes"], c["valid_votes"]) for c in manifest["candidates"]] == [("Alice", 3, 2), ("Bob", 2, 2)]
+
+
+def test_archive_round_fails_verification_on_a_count_mismatch(tmp_path, snapshot):
+    _, counts = snapshot
+    counts[BOB]["votes"] += 1 # A vote the files do not hold
+    with pytest.raises(ArchiveError, match="do not match"):
+        vote_archive.archive_round("2024-spring", START, END, directory=str(tmp_path))
+    assert os.listdir(tmp_path) == [] # No manifest, no round, staging removed
+
+
+def test_archive_round_refuses_an_open_round(tmp_path, snapshot):
+    with pytest.raises(ArchiveError, match="not ended"):
+        vote_archive.archive_round("current", START, datetime.now(timezone.utc) + timedelta(hours=1), directory=str(tmp_path))
+    assert os.listdir(tmp_path) == []
+
+
+def test_archive_round_refuses_an_archived_round(tmp_path, snapshot):
+    vote_archive.archive_round("2024-spring", START, END, directory=str(tmp_path))
+    manifest = (tmp_path / "2024-spring" / MANIFEST_NAME).read_text()
+    with pytest.raises(ArchiveError, match="already archived"):
+        vote_archive.archive_round("2024-spring", START, END, directory=str(tmp_path))
+    assert (tmp_path / "2024-spring" / MANIFEST_NAME).read_text() == manifest
+
+
+@pytest.mark.parametrize("round_name", ["", "..", "../etc", "a/b", ".hidden", "/abs", "x" * 65])
+def test_invalid_round_names_are_refused(tmp_path, snapshot, round_name):
+    with pytest.raises(ArchiveError, match="Invalid round name"):
+        vote_archive.archive_round(round_name, START, END, directory=str(tmp_path))
+    with pytest.raises(ArchiveError, match="Invalid round name"):
+        vote_archive.load_manifest(round_name, str(tmp_path))
+    with pytest.raises(ArchiveError, match="Invalid round name"):
+        vote_archive.delete_archived_votes(round_name, str(tmp_path))
+    assert os.listdir(tmp_path) == []
+
+
+class DeletingSession:
+    """Records the vote IDs of each DELETE; each deletes `rowcount` rows."""
+
+    def __init__(self, batches, rowcount=None):
+        self.batches, self.rowcount = batches, rowcount
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, statement):
+        ids = [str(vote_id) for vote_id in list(statement.compile().params.values())[0]]
+        self.batches.append(ids)
+        return type("Result", (), {"rowcount": len(ids) if self.rowcount is None else self.rowcount})()
+
+    def commit(self):
+        self.batches.append("commit")
+
+
+def test_delete_archived_votes_deletes_in_committed_id_batches(tmp_path, snapshot, monkeypatch):
+    manifest = vote_archive.archive_round("2024-spring", START, END, directory=str(tmp_path))
+    paths = [str(tmp_path / "2024-spring" / f["name"]) for f in manifest["files"]]
+    archived_ids = set(ds.dataset(paths, format="parquet").to_table()["vote_id"].to_pylist())
+    batches = []
+    monkeypatch.setattr(vote_archive, "SessionLocal", lambda: DeletingSession(batches))
+    assert vote_archive.delete_archived_votes("2024-spring", str(tmp_path), batch_size=2) == 5
+    deletes = [batch for batch in batches if batch != "commit"]
+    assert [len(ids) for ids in deletes] == [2, 2, 1]
+    assert batches.count("commit") == 3 # One transaction per batch
+    assert {vote_id for ids in deletes for vote_id in ids} == archived_ids
+    assert vote_archive.load_manifest("2024-spring", str(tmp_path))["deleted_rows"] == 5
+
+    monkeypatch.setattr(vote_archive, "SessionLocal", lambda: DeletingSession([], rowcount=1)) # Re-run: some rows came back
+    assert vote_archive.delete_archived_votes("2024-spring", str(tmp_path), batch_size=2) == 3
+    assert vote_archive.load_manifest("2024-spring", str(tmp_path))["deleted_rows"] == 8
+
+
+def test_archiver_cli_reads_naive_times_as_utc():
+    assert _parse_time("2024-03-01T00:00:00") == START
+    assert _parse_time("2024-03-01T01:00:00+01:00") == START
+    assert _parse_time("2024-03-01T00:00:00Z").tzinfo is not None
@@ -0,0 +1,50 @@
+import json
+from uuid import uuid4
+
+import pytest
+from jose import jwt
+
+from ..api.core.config import settings
+from ..workers.vote_processor import InvalidVoteMessage, parse_vote_message
+
+
+def _body(**overrides) -> bytes:
+    message = {
+        "candidate_id": str(uuid4()),
+        "user_token": jwt.encode({"user_uid": "user-1"}, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM),
+        "vote_timestamp": "2024-05-01T12:00:00.123456Z",
+        "source_ip": "203.0.113.7",
+        "user_agent": "pytest",
+        "receipt_id": "1a-" + "0" * 32,
+    }
+    message.update(overrides)
+    return json.dumps({k: v for k, v in message.items() if v is not None}).encode()
+
+
+def test_valid_message():
+    vote = parse_vote_message(_body())
+    assert vote.user_identifier == "user-1"
+    assert vote.vote_timestamp == "2024-05-01T12:00:00.123456Z"
+    assert vote.receipt_id == "1a-" + "0" * 32
+    assert vote.is_valid and not vote.flagged
+
+
+@pytest.mark.parametrize("timestamp", ["yesterday", "2024-13-01T00:00:00Z", 1714564800])
+def test_malformed_timestamp_is_bad_data(timestamp):
+    with pytest.raises(InvalidVoteMessage) as excinfo:
+        parse_vote_message(_body(vote_timestamp=timestamp))
+    assert excinfo.value.reason == "bad_data"
+    assert excinfo.value.receipt_id == "1a-" + "0" * 32 # Still reported on the receipt
+
+
+@pytest.mark.parametrize("body, reason", [
+    (b"{not json", "bad_json"),
+    (b"[]", "bad_json"),
+    (_body(candidate_id="not-a-uuid"), "bad_data"),
+    (_body(vote_timestamp=None), "missing_fields"),
+    (_body(user_token="not-a-jwt"), "bad_jwt"),
+])
+def test_invalid_messages(body, reason):
+    with pytest.raises(InvalidVoteMessage) as excinfo:
+        parse_vote_message(body)
+    assert excinfo.value.reason == reason
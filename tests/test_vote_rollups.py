@@ -0,0 +1,109 @@
+import asyncio
+from datetime import datetime, timezone
+from uuid import uuid4
+
+import pytest
+from fakeredis.aioredis import FakeRedis as FakeAsyncRedis
+from fastapi import HTTPException
+from sqlalchemy.sql.dml import Delete, Insert
+
+from ..api.core import redis_keys, vote_rollups
+from ..api.core.vote_rollups import downsample
+from ..api.services import vote_service
+from ..api.services.cache_service import CacheService
+from ..api.services.vote_service import VoteService
+
+
+def test_downsample_sums_buckets_into_points():
+    rollups = {0: {"a": 1}, 60: {"a": 2, "b": 5}, 120: {"b": 1}, 180: {"a": 4}}
+    points, series = downsample(rollups, 0, 240, 120)
+    assert points == [0, 120]
+    assert series == {"a": [3, 4], "b": [5, 1]}
+
+
+def test_downsample_ignores_buckets_outside_the_range():
+    points, series = downsample({-60: {"a": 9}, 0: {"a": 1}, 240: {"a": 9}}, 0, 240, 60)
+    assert points == [0, 60, 120, 180]
+    assert series == {"a": [1, 0, 0, 0]}
+
+
+def test_downsample_without_votes_has_no_series():
+    assert downsample({}, 0, 120, 60) == ([0, 60], {})
+
+
+class RecordingSession:
+    def __init__(self):
+        self.statements = []
+        self.commits = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, statement):
+        self.statements.append(statement)
+        return type("Result", (), {"rowcount": 0})()
+
+    def commit(self):
+        self.commits += 1
+
+
+def test_mirror_replaces_the_rows_of_the_range_in_one_transaction(monkeypatch):
+    session = RecordingSession()
+    monkeypatch.setattr(vote_rollups, "SessionLocal", lambda: session)
+    vote_rollups.mirror_rollups(datetime(2024, 5, 1, 12, 34, 56, tzinfo=timezone.utc), datetime(2024, 5, 1, 12, 50, tzinfo=timezone.utc))
+    assert [isinstance(statement, Delete) for statement in session.statements] == [True, False, True, False]
+    assert all(isinstance(statement, Insert) for statement in session.statements[1::2])
+    assert session.commits == 1
+    minute_delete, hour_delete = session.statements[0].compile(), session.statements[2].compile()
+    assert list(minute_delete.params.values()) == ["minute", datetime(2024, 5, 1, 12, 34, tzinfo=timezone.utc), datetime(2024, 5, 1, 12, 50, tzinfo=timezone.utc)]
+    assert list(hour_delete.params.values()) == ["hour", datetime(2024, 5, 1, 12, tzinfo=timezone.utc), datetime(2024, 5, 1, 13, tzinfo=timezone.utc)]
+
+
+def test_mirror_rebuilds_the_buckets_holding_an_unaligned_end_from_all_their_votes(monkeypatch):
+    session = RecordingSession()
+    monkeypatch.setattr(vote_rollups, "SessionLocal", lambda: session)
+    vote_rollups.mirror_rollups(datetime(2024, 5, 1, 12, 34, tzinfo=timezone.utc), datetime(2024, 5, 1, 12, 50, 30, tzinfo=timezone.utc))
+    minute_delete, minute_insert, hour_delete, hour_insert = (statement.compile() for statement in session.statements)
+    minute_end, hour_end = datetime(2024, 5, 1, 12, 51, tzinfo=timezone.utc), datetime(2024, 5, 1, 13, tzinfo=timezone.utc)
+    assert list(minute_delete.params.values())[-1] == minute_end
+    assert minute_end in minute_insert.params.values() # Votes of the whole 12:50 minute
+    assert list(hour_delete.params.values())[-1] == hour_end
+    assert hour_end in hour_insert.params.values() # Minutes of the whole 12:00 hour
+
+
+def test_timeline_compares_naive_and_aware_times_in_utc():
+    service = object.__new__(VoteService) # The range is checked before any dependency is used
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(service.get_timeline(start=datetime(2024, 5, 2), end=datetime(2024, 5, 1, 12, tzinfo=timezone.utc)))
+    assert raised.value.status_code == 400
+
+
+def test_timeline_reads_buckets_missing_from_redis_from_the_table(monkeypatch):
+    now = 1714564800 # 2024-05-01T12:00:00Z
+    monkeypatch.setattr(vote_service.time, "time", lambda: now)
+    monkeypatch.setattr(vote_service.settings, "ROLLUP_MINUTE_TTL_SECONDS", 10 ** 10)
+    redis_client = FakeAsyncRedis(decode_responses=True)
+    service = object.__new__(VoteService)
+    service._redis_ready = True
+    service._cache_service = CacheService(redis_client, results_cache_ttl_seconds=5)
+    service._db_breaker = vote_service.CircuitBreaker("postgres-test")
+    candidate = str(uuid4())
+    reads = []
+    def read_rollups(granularity, start, end, candidate_id=None):
+        reads.append((start, end))
+        return {now - 180: {candidate: 7}, now - 120: {candidate: 99}}
+    monkeypatch.setattr(vote_service, "read_rollups", read_rollups)
+
+    async def main():
+        for bucket, votes in ((now - 240, 1), (now - 120, 2), (now - 60, 3), (now, 4)):
+            await redis_client.hset(redis_keys.rollup_key("minute", bucket), candidate, votes)
+        return await service.get_timeline(granularity="minute", start=datetime.fromtimestamp(now - 240, timezone.utc),
+                                          end=datetime.fromtimestamp(now + 60, timezone.utc), points=10)
+
+    timeline = asyncio.run(main())
+    assert reads == [(now - 180, now - 120)] # Only the evicted minute
+    assert timeline.source == "redis+database"
+    assert [series.votes for series in timeline.series] == [[1, 7, 2, 3, 4]]
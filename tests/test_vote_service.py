@@ -0,0 +1,177 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+from uuid import uuid4
+
+import pika
+import pytest
+from fakeredis.aioredis import FakeRedis as FakeAsyncRedis
+from fastapi import HTTPException
+from sqlalchemy.exc import OperationalError
+
+from ..api.core import redis_keys
+from ..api.services import vote_service as vs
+from ..api.services.cache_service import CacheService
+
+
+class FakeChannel:
+    def __init__(self, error=None):
+        self.is_open = True
+        self.error = error
+        self.published = []
+
+    def basic_publish(self, exchange, routing_key, body, properties=None):
+        self.published.append((threading.current_thread().name, routing_key, body))
+        if self.error is not None:
+            raise self.error
+
+
+@pytest.fixture
+def make_service(monkeypatch, tmp_path):
+    services = []
+    def make(spool=True):
+        monkeypatch.setattr(vs.settings, "VOTE_SPOOL_ENABLED", spool)
+        monkeypatch.setattr(vs.settings, "VOTE_SPOOL_DIR", str(tmp_path / "spool"))
+        service = vs.VoteService()
+        services.append(service)
+        return service
+    yield make
+    for service in services:
+        service._rabbitmq_thread.shutdown()
+        if service.spool is not None:
+            service.spool.close()
+
+
+def _connect(service, channel):
+    service._rabbitmq._current = (SimpleNamespace(is_open=True, close=lambda: None), channel)
+
+
+def test_votes_are_spooled_without_waiting_for_the_rabbitmq_thread_while_the_broker_is_down(make_service):
+    service = make_service()
+    busy, release = threading.Event(), threading.Event()
+    def stuck():
+        busy.set()
+        release.wait(10)
+    service._rabbitmq_thread._executor.submit(stuck) # e.g. closing a dead connection
+    assert busy.wait(5)
+    try:
+        spooled = asyncio.run(asyncio.wait_for(service._publish(b"vote", "", "vote_queue"), 2))
+    finally:
+        release.set()
+    assert spooled is True
+    assert service.spool.has_pending
+
+
+def test_votes_queue_up_behind_a_spooled_backlog(make_service):
+    service = make_service()
+    channel = FakeChannel()
+    _connect(service, channel)
+    service.spool.append(b"older", "", "vote_queue")
+    assert asyncio.run(service._publish(b"vote", "", "vote_queue")) is True
+    assert channel.published == []
+
+
+def test_failed_publish_is_spooled(make_service):
+    service = make_service()
+    channel = FakeChannel(error=pika.exceptions.ChannelWrongStateError("closed"))
+    _connect(service, channel)
+    assert asyncio.run(service._publish(b"vote", "", "vote_queue")) is True
+    assert [name.startswith("rabbitmq-io") for name, _, _ in channel.published] == [True]
+    assert service.spool.has_pending
+    assert service._rabbitmq.current is None # Reconnected in the background
+
+
+def test_batch_spools_what_the_broker_did_not_take(make_service):
+    service = make_service()
+    channel = FakeChannel()
+    _connect(service, channel)
+    messages = [(b"1", "", "vote_queue"), (b"2", "", "vote_queue"), (b"3", "", "vote_queue")]
+    original = channel.basic_publish
+    def publish(exchange, routing_key, body, properties=None):
+        if body == b"2":
+            channel.error = pika.exceptions.StreamLostError("lost")
+        original(exchange, routing_key, body, properties)
+    channel.basic_publish = publish
+    assert asyncio.run(service._publish_batch(messages)) == ([False, True, True], None)
+
+
+def test_without_spool_a_failed_publish_fails_at_once(make_service):
+    service = make_service(spool=False)
+    channel = FakeChannel(error=pika.exceptions.StreamLostError("lost"))
+    _connect(service, channel)
+    started = time.monotonic()
+    with pytest.raises(pika.exceptions.AMQPError):
+        asyncio.run(service._publish(b"vote", "", "vote_queue"))
+    assert len(channel.published) == 1 # No retries sleeping on the RabbitMQ thread
+    assert time.monotonic() - started < 0.5
+    with pytest.raises(pika.exceptions.AMQPConnectionError):
+        asyncio.run(service._publish(b"vote", "", "vote_queue")) # Not connected: no hand-off at all
+
+
+def test_connection_attempts_run_off_the_rabbitmq_thread_with_short_timeouts(make_service, monkeypatch):
+    attempts = []
+    attempted = threading.Event()
+    def blocking_connection(parameters):
+        attempts.append((threading.current_thread().name, parameters))
+        attempted.set()
+        raise pika.exceptions.AMQPConnectionError("refused")
+    monkeypatch.setattr(vs.pika, "BlockingConnection", blocking_connection)
+    service = make_service(spool=False)
+    service.start()
+    try:
+        assert attempted.wait(5)
+    finally:
+        service._rabbitmq.stop()
+    thread_name, parameters = attempts[0]
+    assert not thread_name.startswith("rabbitmq-io")
+    assert parameters.socket_timeout == vs.settings.RABBITMQ_SOCKET_TIMEOUT_SECONDS
+    assert parameters.blocked_connection_timeout == vs.settings.RABBITMQ_BLOCKED_CONNECTION_TIMEOUT_SECONDS
+    assert parameters.stack_timeout == 2 * vs.settings.RABBITMQ_SOCKET_TIMEOUT_SECONDS
+
+
+class CandidateSession:
+    """Request session answering the candidate name query; records the thread it ran on."""
+
+    def __init__(self, candidates, error=None):
+        self.candidates, self.error, self.threads = candidates, error, []
+
+    def execute(self, statement):
+        self.threads.append(threading.current_thread())
+        if self.error is not None:
+            raise self.error
+        return SimpleNamespace(scalars=lambda: SimpleNamespace(all=lambda: self.candidates))
+
+
+def _build_results(service, session, counts):
+    """Builds the first results page from these Redis counts (one event loop: the fake client binds to it)."""
+    redis_client = FakeAsyncRedis(decode_responses=True)
+    service._redis_client, service._redis_ready = redis_client, True
+    service._cache_service = CacheService(redis_client, results_cache_ttl_seconds=5)
+
+    async def main():
+        for candidate_id, count in counts.items():
+            await redis_client.hset(redis_keys.vote_counter_key(0), str(candidate_id), count)
+        return await service._build_vote_results(session, None, 1, 10)
+
+    return asyncio.run(main())
+
+
+def test_results_fetch_candidate_names_off_the_event_loop(make_service):
+    service = make_service(spool=False)
+    alice = uuid4()
+    session = CandidateSession([SimpleNamespace(id=alice, name="Alice")])
+    results = _build_results(service, session, {alice: 5})
+    assert [(r.name, r.vote_count) for r in results.results] == [("Alice", 5)]
+    assert session.threads and threading.current_thread() not in session.threads
+
+
+def test_results_do_not_retry_a_failing_db(make_service):
+    service = make_service(spool=False)
+    session = CandidateSession([], error=OperationalError("SELECT ...", {}, Exception("down")))
+    started = time.monotonic()
+    with pytest.raises(HTTPException) as raised:
+        _build_results(service, session, {uuid4(): 5})
+    assert raised.value.status_code == 503
+    assert len(session.threads) == 1 and time.monotonic() - started < 0.5
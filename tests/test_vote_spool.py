@@ -0,0 +1,93 @@
+import os
+
+import pytest
+
+from ..api.services.vote_spool import SpoolFullError, VoteSpool
+
+
+def _spool(directory, segment_size=4096, max_bytes=1 << 20):
+    return VoteSpool(str(directory), segment_size_bytes=segment_size, max_bytes=max_bytes,
+                     fsync_interval_seconds=60, fsync_batch_records=1000)
+
+
+def _drain(spool):
+    published = []
+    while spool.has_pending: # Like run_spool_replay: the active segment is sealed once the older ones are gone
+        spool.replay(lambda body, exchange, routing_key, headers: published.append((body, exchange, routing_key, headers)), 1000)
+    return published
+
+
+def _segments(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith(".seg"))
+
+
+def test_records_replay_in_order_with_their_routing(tmp_path):
+    spool = _spool(tmp_path)
+    spool.append(b'{"vote": 1}', "", "vote_queue", {"traceparent": "00-a-b-01"})
+    spool.append(b"\x00\xffbinary", "votes.hash", "user-2")
+    assert spool.has_pending
+    assert _drain(spool) == [
+        (b'{"vote": 1}', "", "vote_queue", {"traceparent": "00-a-b-01"}),
+        (b"\x00\xffbinary", "votes.hash", "user-2", None),
+    ]
+    assert not spool.has_pending
+    assert spool.pending_bytes == 0
+    assert _segments(tmp_path) == []
+
+
+def test_full_segments_roll_over(tmp_path):
+    spool = _spool(tmp_path, segment_size=256)
+    for n in range(10):
+        spool.append(b"x" * 100, "", f"q{n}")
+    assert len(_segments(tmp_path)) > 1
+    assert [routing_key for _, _, routing_key, _ in _drain(spool)] == [f"q{n}" for n in range(10)]
+
+
+def test_records_survive_a_restart_and_torn_writes_are_trimmed(tmp_path):
+    spool = _spool(tmp_path)
+    spool.append(b"first", "", "vote_queue")
+    spool.append(b"second", "", "vote_queue")
+    spool._flush_locked() # As after a crash: the mapped segment is never sealed
+    [segment] = _segments(tmp_path)
+    path = os.path.join(tmp_path, segment)
+    with open(path, "r+b") as f: # Tear the last record
+        data = f.read()
+        end = data.index(b"second") + len(b"second")
+        f.seek(end - 3)
+        f.write(b"XYZ")
+
+    recovered = _spool(tmp_path)
+    assert [body for body, _, _, _ in _drain(recovered)] == [b"first"]
+
+
+def test_failed_publish_keeps_the_record(tmp_path):
+    spool = _spool(tmp_path)
+    spool.append(b"one", "", "vote_queue")
+    spool.append(b"two", "", "vote_queue")
+    calls = []
+    def flaky(body, exchange, routing_key, headers):
+        calls.append(body)
+        if body == b"two":
+            raise ConnectionError("broker down")
+    with pytest.raises(ConnectionError):
+        spool.replay(flaky, 10)
+    assert [body for body, _, _, _ in _drain(spool)] == [b"two"]
+
+
+def test_replay_honours_the_batch_size(tmp_path):
+    spool = _spool(tmp_path)
+    for n in range(5):
+        spool.append(b"vote", "", f"q{n}")
+    published = []
+    assert spool.replay(lambda *args: published.append(args[2]), 2) == 2
+    assert published == ["q0", "q1"]
+    assert spool.replay(lambda *args: published.append(args[2]), 10) == 3
+    assert published == ["q0", "q1", "q2", "q3", "q4"]
+
+
+def test_appends_beyond_the_budget_are_refused(tmp_path):
+    spool = _spool(tmp_path, segment_size=256, max_bytes=512)
+    with pytest.raises(SpoolFullError):
+        for _ in range(10):
+            spool.append(b"x" * 100, "", "vote_queue")
+    assert not spool.has_capacity
@@ -0,0 +1,161 @@
+import hashlib
+import logging
+import operator
+import os
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+from ..api.core.config import settings
+from ..api.core import redis_keys
+from ..api.core.metrics import ABUSE_FLAGGED_VOTES
+from .vote_processor import VoteMessage
+
+logger = logging.getLogger(__name__)
+
+# Streaming ballot-stuffing detection: how many votes each source IP, /24 (IPv6: /48) network
+# and User-Agent sent within the last ABUSE_WINDOW_SECONDS, estimated with count-min sketches
+# in fixed memory (no per-source state), and the heaviest sources of each kind (top-k).
+# Windows follow vote_timestamp (when the API accepted the vote), not arrival at the worker,
+# so draining a backlog after an outage does not look like a burst.
+# Counts are per worker process: with several workers each sees its share of the traffic.
+
+
+class SlidingCountMinSketch:
+    """
+    Count-min sketch over a sliding window of `buckets` sub-windows of `bucket_seconds`.
+    Every sub-window has its own sketch and `_total` holds their sum, so an estimate reads
+    `depth` counters and expiring a sub-window subtracts it once. Conservative update keeps
+    every counter of a key >= its true count while overestimating far less than plain updates.
+    """
+
+    def __init__(self, width: int, depth: int, buckets: int, bucket_seconds: float):
+        self._width = width
+        self._depth = depth
+        self._bucket_seconds = bucket_seconds
+        self._buckets = [[array("I", bytes(4 * width)) for _ in range(depth)] for _ in range(buckets)]
+        self._total = [array("I", bytes(4 * width)) for _ in range(depth)]
+        self._current: Optional[int] = None # Absolute index (time // bucket_seconds) of the newest sub-window
+        self._hash_key = os.urandom(16) # Per process: sources cannot craft colliding keys
+
+    def _indexes(self, key: str) -> List[int]:
+        digest = hashlib.blake2b(key.encode("utf-8", "surrogateescape"), digest_size=16, key=self._hash_key).digest()
+        h1, h2 = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + row * h2) % self._width for row in range(self._depth)]
+
+    def advance(self, timestamp: float) -> bool:
+        """Moves the window so it ends at `timestamp`. Returns False if `timestamp` is older than the window."""
+        index = int(timestamp // self._bucket_seconds)
+        if self._current is None:
+            self._current = index
+        if index <= self._current - len(self._buckets):
+            return False
+        for expired in range(max(self._current + 1, index - len(self._buckets) + 1), index + 1):
+            bucket = self._buckets[expired % len(self._buckets)]
+            for row in range(self._depth):
+                self._total[row] = array("I", map(operator.sub, self._total[row], bucket[row]))
+                bucket[row] = array("I", bytes(4 * self._width))
+        self._current = max(self._current, index)
+        return True
+
+    def add(self, key: str, timestamp: float) -> int:
+        """Counts one occurrence of `key` at `timestamp` and returns its estimated count in the window."""
+        if not self.advance(timestamp):
+            return 0 # Too late to count: its window is gone
+        bucket = self._buckets[int(timestamp // self._bucket_seconds) % len(self._buckets)]
+        indexes = self._indexes(key)
+        target = min(bucket[row][i] for row, i in enumerate(indexes)) + 1
+        for row, i in enumerate(indexes):
+            increment = target - bucket[row][i]
+            if increment > 0: # Conservative update: only raise counters below the new minimum
+                bucket[row][i] = target
+                self._total[row][i] += increment
+        return self.estimate(key, indexes)
+
+    def estimate(self, key: str, indexes: Optional[List[int]] = None) -> int:
+        return min(self._total[row][i] for row, i in enumerate(indexes or self._indexes(key)))
+
+
+class TopK:
+    """The `k` keys with the highest estimates seen, refreshed from the sketch as the window slides."""
+
+    def __init__(self, k: int):
+        self._k = k
+        self._items: Dict[str, int] = {}
+
+    def offer(self, key: str, estimate: int):
+        if key in self._items or len(self._items) < self._k:
+            self._items[key] = estimate
+            return
+        smallest = min(self._items, key=self._items.get)
+        if estimate > self._items[smallest]:
+            del self._items[smallest]
+            self._items[key] = estimate
+
+    def refresh(self, sketch: SlidingCountMinSketch):
+        counts = {key: sketch.estimate(key) for key in self._items}
+        self._items = {key: count for key, count in counts.items() if count > 0}
+
+    def items(self) -> List[Tuple[str, int]]:
+        return sorted(self._items.items(), key=lambda item: item[1], reverse=True)
+
+
+class AbuseDetector:
+    """Flags votes whose source IP, IP network or User-Agent exceeds its per-window threshold (0 = never)."""
+
+    def __init__(self):
+        self._thresholds = {
+            "ip": settings.ABUSE_IP_THRESHOLD,
+            "ip_block": settings.ABUSE_IP_BLOCK_THRESHOLD,
+            "user_agent": settings.ABUSE_USER_AGENT_THRESHOLD,
+        }
+        bucket_seconds = settings.ABUSE_WINDOW_SECONDS / settings.ABUSE_WINDOW_BUCKETS
+        self._sketches = {
+            dimension: SlidingCountMinSketch(settings.ABUSE_SKETCH_WIDTH, settings.ABUSE_SKETCH_DEPTH, settings.ABUSE_WINDOW_BUCKETS, bucket_seconds)
+            for dimension in self._thresholds
+        }
+        self._top = {dimension: TopK(settings.ABUSE_TOP_K) for dimension in self._thresholds}
+        self._bucket_seconds = bucket_seconds
+        self._reported_bucket: Optional[int] = None
+
+    @staticmethod
+    def _keys(vote: VoteMessage) -> Dict[str, Optional[str]]:
+        return {
+            "ip": vote.source_ip or None,
+            "ip_block": redis_keys.source_ip_block(vote.source_ip) if vote.source_ip else None,
+            "user_agent": vote.user_agent or None,
+        }
+
+    def observe(self, vote: VoteMessage, timestamp: float, count: bool = True) -> List[str]:
+        """
+        Counts the vote (unless `count` is False, e.g. for a retried message already counted)
+        and returns the dimensions whose threshold its sources exceed.
+        """
+        exceeded = []
+        for dimension, key in self._keys(vote).items():
+            if key is None:
+                continue
+            sketch = self._sketches[dimension]
+            estimate = sketch.add(key, timestamp) if count else sketch.estimate(key)
+            self._top[dimension].offer(key, estimate)
+            threshold = self._thresholds[dimension]
+            if threshold and estimate > threshold:
+                exceeded.append(dimension)
+                ABUSE_FLAGGED_VOTES.labels(dimension=dimension).inc()
+        self._report(timestamp)
+        return exceeded
+
+    def top(self, dimension: str) -> List[Tuple[str, int]]:
+        return self._top[dimension].items()
+
+    def _report(self, timestamp: float):
+        """Once per sub-window: refreshes the top-k lists and logs sources above their threshold."""
+        bucket = int(timestamp // self._bucket_seconds)
+        if self._reported_bucket is not None and bucket <= self._reported_bucket:
+            return
+        self._reported_bucket = bucket
+        for dimension, top in self._top.items():
+            top.refresh(self._sketches[dimension])
+            threshold = self._thresholds[dimension]
+            offenders = [(key, count) for key, count in top.items() if threshold and count > threshold]
+            if offenders:
+                logger.warning("Votes above the %s threshold (%d per %ss): %s", dimension, threshold, settings.ABUSE_WINDOW_SECONDS, offenders)
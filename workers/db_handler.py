@@ -1,33 +1,40 @@
 from sqlalchemy import text, insert # Import insert for potential ORM insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session # Import Session type
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
-from tenacity import retry, stop_after_attempt, wait_fixed, wait_random_exponential, retry_if_exception_type
-from uuid import UUID
-from typing import Optional
+from uuid import UUID, uuid4
+from typing import List, Optional, TYPE_CHECKING
 import logging
 from datetime import datetime # Need datetime for timestamp conversion if using ORM
 
 from ..api.core.config import settings
 from ..api.core.database import SessionLocal, engine # Import SessionLocal and engine
 from ..api.models.database_models import User, Vote, VoteProcessingStatus # Import SQLAlchemy models
+from ..api.core.metrics import DB_TRANSACTION_LATENCY
+from ..api.core.tracing import get_tracer
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
+tracer = get_tracer(__name__)
+
+if TYPE_CHECKING:
+    from .vote_processor import VoteMessage
 
 # DB Session management is handled by SessionLocal factory.
+# DBHandler does not retry: the consumer moves votes that hit transient errors to a delay queue.
+
+
+def _processing_status(flagged: bool) -> VoteProcessingStatus:
+    # Votes flagged by the abuse detector stay 'validating' until an operator reviews them
+    return VoteProcessingStatus.validating if flagged else VoteProcessingStatus.processed
+
 
 class DBHandler:
     def __init__(self):
         pass # No need for explicit connection here, SessionLocal manages
 
-    @retry(
-        stop=stop_after_attempt(5), # Retry up to 5 times
-        wait=wait_random_exponential(multiplier=1, min=1, max=10), # Exponential backoff with jitter
-        # Retry on specific DB transaction errors or connection issues
-        retry=retry_if_exception_type((SQLAlchemyError, ConnectionError)),
-        before_sleep=lambda retry_state: logger.warning(f"Retrying DB transaction (attempt {retry_state.attempt_number})...")
-    )
-    def execute_transaction(self, user_identifier: str, candidate_id: UUID, vote_timestamp: str, source_ip: Optional[str], user_agent: Optional[str]) -> str:
+    @DB_TRANSACTION_LATENCY.time()
+    def execute_transaction(self, user_identifier: str, candidate_id: UUID, vote_timestamp: str, source_ip: Optional[str], user_agent: Optional[str],
+                            is_valid: bool = True, flagged: bool = False) -> str:
         """
         Handles the database operations for a vote using SQLAlchemy ORM and Raw SQL for ON CONFLICT.
         1. Finds or creates user using ORM or SQL UPSERT.
@@ -56,7 +63,8 @@ class DBHandler:
                 DO UPDATE SET user_identifier = users.user_identifier -- Dummy update to return existing row
                 RETURNING id;
             """)
-            user_result = db.execute(upsert_user_sql, {"user_identifier": user_identifier}).scalar_one()
+            with tracer.start_as_current_span("db.user_upsert"):
+                user_result = db.execute(upsert_user_sql, {"user_identifier": user_identifier}).scalar_one()
             user_id = user_result # The ID of the existing or newly created user
 
             # --- Step 2: Insert Vote using INSERT ... ON CONFLICT ---
@@ -72,7 +80,7 @@ class DBHandler:
                     :vote_timestamp,
                     :source_ip,
                     :user_agent,
-                    TRUE, -- Assuming valid initially, detailed checks in worker logic might change this
+                    :is_valid, -- False for votes quarantined by the abuse detector
                     :processing_status
                 )
                 ON CONFLICT ON CONSTRAINT uq_votes_user_candidate
@@ -91,21 +99,24 @@ class DBHandler:
                 "vote_timestamp": vote_dt, # Pass as datetime object
                 "source_ip": source_ip,
                 "user_agent": user_agent,
-                "processing_status": VoteProcessingStatus.processed # Assuming 'processed' if inserted successfully
+                "is_valid": is_valid,
+                "processing_status": _processing_status(flagged),
             }
 
-            vote_result = db.execute(insert_vote_sql, params)
-            inserted_vote_id = vote_result.scalar_one_or_none()
+            with tracer.start_as_current_span("db.vote_insert"):
+                vote_result = db.execute(insert_vote_sql, params)
+                inserted_vote_id = vote_result.scalar_one_or_none()
 
-            db.commit() # Commit the transaction (both user upsert and vote insert)
+            with tracer.start_as_current_span("db.commit"):
+                db.commit() # Commit the transaction (both user upsert and vote insert)
 
             if inserted_vote_id is not None:
                 status = 'processed'
-                logger.info(f"Successfully processed NEW vote for user_identifier={user_identifier}, candidate_id={candidate_id}")
+                logger.debug("Inserted new vote for user_identifier=%s, candidate_id=%s", user_identifier, candidate_id)
             else:
                 # ON CONFLICT DO NOTHING happened
                 status = 'duplicate'
-                logger.warning(f"Duplicate vote detected and ignored for user_identifier={user_identifier}, candidate_id={candidate_id}")
+                logger.debug("Duplicate vote ignored for user_identifier=%s, candidate_id=%s", user_identifier, candidate_id)
 
         except IntegrityError as e:
             # This might catch FK violations (non-existent candidate) if FK is added and not pre-validated
@@ -118,13 +129,13 @@ class DBHandler:
         except SQLAlchemyError as e:
             logger.error(f"Database Error processing vote: {e} for user_identifier={user_identifier}, candidate_id={candidate_id}")
             db.rollback()
-            raise e # Raise to trigger tenacity retry
+            raise e # Worker retries transient errors through a delay queue
 
         except Exception as e:
             # Catch any other unexpected exceptions
             logger.error(f"An unexpected error occurred in DBHandler transaction: {e} for user_identifier={user_identifier}, candidate_id={candidate_id}")
             db.rollback()
-            raise e # Raise to trigger tenacity retry (if exception type matches) or worker NACK
+            raise e # Let worker handle retry or NACK
 
         finally:
             db.close()
@@ -132,6 +143,75 @@ class DBHandler:
         # Return status and whether it was a new vote
         return status
 
+    @DB_TRANSACTION_LATENCY.time()
+    def execute_batch(self, votes: List["VoteMessage"]) -> List[str]:
+        """
+        Writes a batch of votes in a single transaction with two statements:
+        a multi-row users UPSERT and a multi-row votes INSERT ... ON CONFLICT DO NOTHING.
+        Returns a status per input vote ('processed' or 'duplicate'), in input order.
+        Raises IntegrityError if any vote violates a constraint (e.g. unknown candidate);
+        the caller should then fall back to execute_transaction per vote to isolate it.
+        """
+        if not votes:
+            return []
+
+        db = SessionLocal()
+        try:
+            # --- Step 1: Upsert all distinct users, returning their ids ---
+            # Identifiers must be unique within the statement: ON CONFLICT DO UPDATE
+            # cannot touch the same row twice in one command.
+            identifiers = list(dict.fromkeys(v.user_identifier for v in votes))
+            upsert_users = pg_insert(User).values(
+                [{"id": uuid4(), "user_identifier": identifier} for identifier in identifiers]
+            )
+            upsert_users = upsert_users.on_conflict_do_update(
+                index_elements=[User.user_identifier],
+                set_={"user_identifier": upsert_users.excluded.user_identifier}, # Dummy update to return existing rows
+            ).returning(User.id, User.user_identifier)
+            with tracer.start_as_current_span("db.user_upsert") as span:
+                span.set_attribute("db.batch_size", len(identifiers))
+                user_ids = {row.user_identifier: row.id for row in db.execute(upsert_users)}
+
+            # --- Step 2: Insert all votes, skipping (user, candidate) pairs that already exist ---
+            insert_votes = pg_insert(Vote).values([
+                {
+                    "id": uuid4(),
+                    "user_id": user_ids[v.user_identifier],
+                    "candidate_id": v.candidate_id,
+                    "vote_timestamp": datetime.fromisoformat(v.vote_timestamp.replace('Z', '+00:00')),
+                    "source_ip": v.source_ip,
+                    "user_agent": v.user_agent,
+                    "is_valid": v.is_valid,
+                    "processing_status": _processing_status(v.flagged),
+                }
+                for v in votes
+            ]).on_conflict_do_nothing(constraint='uq_votes_user_candidate').returning(Vote.user_id, Vote.candidate_id)
+            with tracer.start_as_current_span("db.vote_insert") as span:
+                span.set_attribute("db.batch_size", len(votes))
+                inserted = {(row.user_id, row.candidate_id) for row in db.execute(insert_votes)}
+
+            with tracer.start_as_current_span("db.commit"):
+                db.commit()
+
+        except SQLAlchemyError as e:
+            logger.error("Database error processing vote batch of %d: %s", len(votes), e)
+            db.rollback()
+            raise # Caller isolates IntegrityErrors and retries transient errors via a delay queue
+        finally:
+            db.close()
+
+        # A pair returned by RETURNING was inserted exactly once: the first vote in the batch
+        # carrying it is 'processed', any later copy (and anything not returned) is a duplicate.
+        statuses = []
+        for v in votes:
+            key = (user_ids[v.user_identifier], v.candidate_id)
+            if key in inserted:
+                inserted.discard(key)
+                statuses.append('processed')
+            else:
+                statuses.append('duplicate')
+        return statuses
+
 
      # Method to potentially get candidate names if needed by worker
      # @retry(stop=stop_after_attempt(3), wait=wait_fixed(1), retry=retry_if_exception_type(SQLAlchemyError))
@@ -0,0 +1,230 @@
+import argparse
+import base64
+import gzip
+import json
+import logging
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import pika
+
+from ..api.core.config import settings
+from ..api.core import queue_topology
+from ..api.core.logging_config import configure_logging
+from .vote_processor import InvalidVoteMessage, parse_vote_message
+
+logger = logging.getLogger(__name__)
+
+# Drains RABBITMQ_DLQ_QUEUE in batches after an incident:
+# - messages that can never be processed (bad JSON, missing fields, bad data, bad JWT, unknown
+#   candidate, refused by the DB: see queue_topology.PERMANENT_REJECTION_REASONS) and votes
+#   already replayed --max-replays times are written to a gzip-compressed NDJSON archive and
+#   removed from the DLQ;
+# - everything else (e.g. votes whose retries ran out during a DB outage) is re-published to the
+#   vote queue it was rejected from, at a bounded rate so the recovered DB is not flooded.
+# DLQ messages are acked only after their batch has been archived / confirmed by the broker,
+# so an interrupted run loses nothing (a vote re-published twice becomes a duplicate in the worker).
+#
+# Usage: python -m workers.dlq_replayer --rate 200 --batch-size 100 [--dry-run]
+
+
+class RatePacer:
+    """Sleeps as needed so that no more than `rate` messages per second are released."""
+
+    def __init__(self, rate: float):
+        self._interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = time.monotonic()
+
+    def wait(self):
+        if not self._interval:
+            return
+        now = time.monotonic()
+        if self._next > now:
+            time.sleep(self._next - now)
+        self._next = max(self._next, now) + self._interval
+
+
+def replay_count(headers: Optional[Dict[str, Any]]) -> int:
+    try:
+        return int((headers or {}).get(queue_topology.REPLAY_COUNT_HEADER, 0))
+    except (TypeError, ValueError):
+        return 0
+
+
+def classify(body: bytes, headers: Optional[Dict[str, Any]] = None, max_replays: int = 3) -> Tuple[str, Optional[str]]:
+    """
+    Returns ('retry', None) for a vote that may succeed when reprocessed, or ('archive', reason): the worker
+    rejected it for a permanent reason, the payload is invalid, or it was already replayed `max_replays` times.
+    """
+    reason = (headers or {}).get(queue_topology.REJECTION_REASON_HEADER)
+    if reason in queue_topology.PERMANENT_REJECTION_REASONS:
+        return "archive", reason
+    try:
+        parse_vote_message(body) # Messages rejected before the reason header existed
+    except InvalidVoteMessage as e:
+        return "archive", e.reason
+    if replay_count(headers) >= max_replays:
+        return "archive", "replay_limit" # Keeps failing for a reason replaying does not fix
+    # Valid payload: it was rejected because processing failed (DB transient error, worker crash ...)
+    return "retry", None
+
+
+def original_destination(properties: pika.BasicProperties, body: bytes) -> Tuple[str, str]:
+    """
+    (exchange, routing_key) to re-publish the message with: straight to the queue the worker rejected it
+    from, else the routing from the broker's x-death header (messages dead-lettered by basic_reject).
+    Falls back to the current routing for the vote's user.
+    """
+    original_queue = (properties.headers or {}).get(queue_topology.ORIGINAL_QUEUE_HEADER)
+    if original_queue:
+        return "", original_queue
+    deaths = (properties.headers or {}).get("x-death") or []
+    if deaths:
+        death = deaths[0] # Most recent dead-lettering
+        routing_keys = death.get("routing-keys") or []
+        if routing_keys:
+            return death.get("exchange", ""), routing_keys[0]
+    return queue_topology.publish_target(parse_vote_message(body).user_identifier)
+
+
+def archive_record(method, properties: pika.BasicProperties, body: bytes, reason: str) -> Dict[str, Any]:
+    headers = properties.headers or {}
+    deaths = headers.get("x-death") or []
+    try:
+        body_field = {"body": body.decode("utf-8")}
+    except UnicodeDecodeError:
+        body_field = {"body_base64": base64.b64encode(body).decode("ascii")}
+    return {
+        "reason": reason,
+        "archived_at": datetime.utcnow().isoformat() + "Z",
+        "original_queue": headers.get(queue_topology.ORIGINAL_QUEUE_HEADER) or (deaths[0].get("queue") if deaths else None),
+        "death_count": deaths[0].get("count") if deaths else None,
+        "replays": replay_count(headers),
+        **body_field,
+    }
+
+
+def replay_headers(headers: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Headers of a re-published vote: fresh retry tiers, no stale rejection, one more replay counted."""
+    dropped = ("x-death", queue_topology.RETRY_ATTEMPT_HEADER, queue_topology.REJECTION_REASON_HEADER, queue_topology.ORIGINAL_QUEUE_HEADER)
+    replayed = {key: value for key, value in (headers or {}).items() if key not in dropped}
+    replayed[queue_topology.REPLAY_COUNT_HEADER] = replay_count(headers) + 1
+    return replayed
+
+
+class DLQReplayer:
+    def __init__(self, rate: float, batch_size: int, archive_path: str, max_messages: Optional[int],
+                 max_queue_depth: Optional[int], dry_run: bool, max_replays: int = 3):
+        self.batch_size = batch_size
+        self.max_replays = max_replays
+        self.archive_path = archive_path
+        self.max_messages = max_messages
+        self.max_queue_depth = max_queue_depth
+        self.dry_run = dry_run
+        self.stats = Counter()
+        self._pacer = RatePacer(rate)
+
+        self._connection = pika.BlockingConnection(pika.URLParameters(settings.RABBITMQ_URL))
+        self._channel = self._connection.channel()
+        # Republished votes must be on the broker before their DLQ copy is acked
+        self._channel.confirm_delivery()
+        # A dry run acks nothing, so it must be allowed to hold every message it inspects (0 = no limit)
+        self._channel.basic_qos(prefetch_count=(max_messages or 0) if dry_run else batch_size)
+
+    def _wait_for_queue_capacity(self):
+        """Pauses while the vote queues hold more than max_queue_depth ready messages."""
+        if self.max_queue_depth is None:
+            return
+        while True:
+            depth = sum(
+                self._channel.queue_declare(queue=name, passive=True).method.message_count
+                for name in queue_topology.vote_queue_names()
+            )
+            if depth <= self.max_queue_depth:
+                return
+            logger.info("Vote queues hold %d messages (limit %d). Waiting before re-publishing more.", depth, self.max_queue_depth)
+            self._connection.sleep(5) # Keeps the connection serviced while waiting
+
+    def _handle_batch(self, batch: List[Tuple[Any, pika.BasicProperties, bytes]], archive) -> None:
+        if not self.dry_run:
+            self._wait_for_queue_capacity()
+        for method, properties, body in batch:
+            action, reason = classify(body, properties.headers, self.max_replays)
+            self.stats[reason or action] += 1
+            if self.dry_run:
+                continue
+            if action == "archive":
+                archive.write(json.dumps(archive_record(method, properties, body, reason)) + "\n")
+                continue
+            self._pacer.wait()
+            exchange, routing_key = original_destination(properties, body)
+            self._channel.basic_publish(
+                exchange=exchange,
+                routing_key=routing_key,
+                body=body,
+                properties=pika.BasicProperties(
+                    delivery_mode=pika.DeliveryMode.Persistent,
+                    headers=replay_headers(properties.headers),
+                ),
+            ) # Blocks until confirmed; raises on nack
+
+        if self.dry_run:
+            return
+        archive.flush()
+        # One ack for the whole batch
+        self._channel.basic_ack(delivery_tag=batch[-1][0].delivery_tag, multiple=True)
+
+    def run(self):
+        processed = 0
+        archive = None if self.dry_run else gzip.open(self.archive_path, "at", encoding="utf-8")
+        try:
+            batch = []
+            for method, properties, body in self._channel.consume(settings.RABBITMQ_DLQ_QUEUE, inactivity_timeout=2):
+                if method is None:
+                    break # DLQ drained
+                batch.append((method, properties, body))
+                processed += 1
+                limit_reached = self.max_messages is not None and processed >= self.max_messages
+                if len(batch) >= self.batch_size or limit_reached:
+                    self._handle_batch(batch, archive)
+                    logger.info("Handled %d DLQ messages so far: %s", processed, dict(self.stats))
+                    batch = []
+                if limit_reached:
+                    break
+            if batch:
+                self._handle_batch(batch, archive)
+        finally:
+            # Unacked messages (dry run, errors) go back to the DLQ
+            self._channel.cancel()
+            if archive is not None:
+                archive.close()
+            self._connection.close()
+        logger.info("DLQ replay finished. %d messages handled: %s%s", processed, dict(self.stats),
+                    " (dry run, nothing changed)" if self.dry_run else "")
+        return self.stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-publish retryable votes from the DLQ and archive the rest.")
+    parser.add_argument("--rate", type=float, default=200.0, help="Max votes re-published per second (0 = unlimited).")
+    parser.add_argument("--batch-size", type=int, default=100, help="DLQ messages fetched and acked per batch.")
+    parser.add_argument("--archive", default=f"dlq-archive-{datetime.utcnow():%Y%m%d%H%M%S}.ndjson.gz",
+                        help="Gzip NDJSON file receiving permanently invalid messages (appended to).")
+    parser.add_argument("--max-messages", type=int, default=None, help="Stop after this many DLQ messages.")
+    parser.add_argument("--max-queue-depth", type=int, default=None,
+                        help="Pause re-publishing while the vote queues hold more messages than this.")
+    parser.add_argument("--max-replays", type=int, default=3,
+                        help="Archive votes that already went through the DLQ and back this many times.")
+    parser.add_argument("--dry-run", action="store_true", help="Only classify messages; leave the DLQ unchanged.")
+    args = parser.parse_args(argv)
+
+    configure_logging("dlq-replayer")
+    replayer = DLQReplayer(args.rate, args.batch_size, args.archive, args.max_messages, args.max_queue_depth, args.dry_run,
+                           max_replays=args.max_replays)
+    replayer.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import logging
+from typing import Optional, Tuple
+
+from ..api.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveFlowController:
+    """
+    Chooses the consumer prefetch count and DB batch size from observed load.
+
+    Inputs are the queue depth (from a passive queue_declare), the DB commit latency
+    of each batch and the batch error rate, both smoothed with an EWMA.
+    The policy is AIMD-style:
+    - DB struggling (latency above target or errors above threshold): halve both values.
+    - Backlog building up and DB healthy: grow both values by 50%.
+    - Queue nearly empty: shrink the batch size so single votes are not held back waiting for a batch.
+    All values stay within the configured bounds.
+    """
+
+    def __init__(self):
+        self.min_prefetch = settings.WORKER_PREFETCH_MIN
+        self.max_prefetch = settings.WORKER_PREFETCH_MAX
+        self.min_batch_size = settings.WORKER_BATCH_SIZE_MIN
+        self.max_batch_size = settings.WORKER_BATCH_SIZE_MAX
+        self._target_latency = settings.WORKER_DB_TARGET_LATENCY_SECONDS
+        self._max_error_rate = settings.WORKER_DB_MAX_ERROR_RATE
+        self._alpha = 0.3 # EWMA smoothing factor
+
+        self.prefetch = self._clamp(settings.WORKER_PREFETCH_INITIAL, self.min_prefetch, self.max_prefetch)
+        self.batch_size = self._clamp(settings.WORKER_BATCH_SIZE_INITIAL, self.min_batch_size, self.max_batch_size)
+        self.queue_depth: Optional[int] = None
+        self.latency_ewma: Optional[float] = None
+        self.error_rate_ewma = 0.0
+
+    @staticmethod
+    def _clamp(value: int, low: int, high: int) -> int:
+        return max(low, min(high, value))
+
+    def record_batch(self, latency_seconds: float, failed: bool):
+        """Records the DB commit latency and outcome of one batch."""
+        if self.latency_ewma is None:
+            self.latency_ewma = latency_seconds
+        else:
+            self.latency_ewma += self._alpha * (latency_seconds - self.latency_ewma)
+        self.error_rate_ewma += self._alpha * ((1.0 if failed else 0.0) - self.error_rate_ewma)
+
+    def record_queue_depth(self, depth: int):
+        self.queue_depth = depth
+
+    def adjust(self) -> Tuple[int, int]:
+        """Recomputes and returns (prefetch, batch_size)."""
+        db_struggling = (
+            self.error_rate_ewma > self._max_error_rate
+            or (self.latency_ewma is not None and self.latency_ewma > self._target_latency)
+        )
+        if db_struggling:
+            prefetch = self.prefetch // 2
+            batch_size = self.batch_size // 2
+        elif self.queue_depth is not None and self.queue_depth > self.prefetch:
+            prefetch = int(self.prefetch * 1.5) + 1
+            batch_size = int(self.batch_size * 1.5) + 1
+        elif self.queue_depth is not None and self.queue_depth < self.batch_size:
+            prefetch = self.prefetch
+            batch_size = self.batch_size // 2
+        else:
+            prefetch, batch_size = self.prefetch, self.batch_size
+
+        # A batch can never be larger than what the broker lets us hold unacked
+        prefetch = self._clamp(prefetch, self.min_prefetch, self.max_prefetch)
+        batch_size = self._clamp(min(batch_size, prefetch), self.min_batch_size, self.max_batch_size)
+
+        if (prefetch, batch_size) != (self.prefetch, self.batch_size):
+            logger.info("Flow control: prefetch %d -> %d, batch size %d -> %d (queue_depth=%s, db_latency=%.3fs, error_rate=%.2f)",
+                        self.prefetch, prefetch, self.batch_size, batch_size, self.queue_depth,
+                        self.latency_ewma or 0.0, self.error_rate_ewma)
+        self.prefetch, self.batch_size = prefetch, batch_size
+        return prefetch, batch_size
@@ -1,51 +1,125 @@
 import pika
-import json
+import functools
+import threading
 import time
 import logging
 from uuid import UUID
-from typing import Dict, Any
-from datetime import datetime
-from jose import jwt, JWTError # For decoding user_token
-from tenacity import Retrying, stop_after_attempt, wait_fixed, retry_if_exception_type # Removed unused retry_if_not_result
+from typing import Dict, Any, List, NamedTuple, Optional, Tuple
+from datetime import datetime, timedelta, timezone
+from prometheus_client import start_http_server
 
 from ..api.core.config import settings
-from ..api.core.database import SessionLocal # Import SessionLocal
+from ..api.core import queue_topology, redis_keys
+from ..api.core.database import SessionLocal, is_transient_db_error # Import SessionLocal
 from ..api.models.database_models import User # Import User model if needed for token logic
+from ..api.core.logging_config import configure_logging, EventLog
+from ..api.core.circuit_breaker import CircuitBreaker, CircuitOpenError
+from ..api.core.connections import Backoff, ConnectionManager
+from ..api.core.candidate_catalog import CandidateCatalog, load_candidate_ids
+from ..api.core.vote_rollups import mirror_rollups
+from ..api.core.tracing import configure_tracing, get_tracer, extract_trace_context
+from opentelemetry import trace
+from opentelemetry.trace import SpanKind, Link, SpanContext
+from ..api.core.metrics import (
+    MESSAGE_HANDLING_LATENCY, REDIS_INCREMENT_LATENCY, QUEUE_LAG, VOTE_MESSAGES,
+    VOTE_BATCH_SIZE, QUEUE_DEPTH, WORKER_PREFETCH, WORKER_BATCH_SIZE, DEPENDENCY_UP, UNKNOWN_CANDIDATE_VOTES,
+)
+from .abuse_detector import AbuseDetector
 from .db_handler import DBHandler
+from .flow_control import AdaptiveFlowController
+from .vote_processor import VoteMessage, InvalidVoteMessage, parse_vote_message
 import redis
 from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError # Import DB error types
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
+vote_events = EventLog(logger, "Vote worker") # Aggregated per-vote counters, logged periodically at INFO
+tracer = get_tracer(__name__)
 
 db_handler = DBHandler() # Initialize DB handler
+# While PostgreSQL or Redis is down, votes go straight to the retry delay queues / skip the counter update
+db_breaker = CircuitBreaker("postgres", is_failure=is_transient_db_error)
+redis_breaker = CircuitBreaker("redis", is_failure=lambda e: isinstance(e, (RedisConnectionError, RedisTimeoutError)))
+# Valid candidate IDs: votes for unknown candidates are rejected before they cost a DB transaction
+candidate_catalog = CandidateCatalog(
+    lambda: db_breaker.call(load_candidate_ids),
+    refresh_seconds=settings.CANDIDATE_CATALOG_REFRESH_SECONDS,
+    miss_refresh_seconds=settings.CANDIDATE_CATALOG_MISS_REFRESH_SECONDS,
+)
+# Per-window vote counts by source IP, IP network and User-Agent (count-min sketches, bounded memory)
+abuse_detector = AbuseDetector()
+
+def connect_redis():
+    client = redis.StrictRedis.from_url(
+        settings.REDIS_URL,
+        socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT_SECONDS,
+        socket_timeout=settings.REDIS_SOCKET_TIMEOUT_SECONDS,
+    )
+    client.ping() # Check connection
+    return client
+
+# Redis connection for updating vote counts, (re)connected in the background once started.
+# While it is down the worker still processes votes into the DB, but Redis counts lag behind.
+redis_manager = ConnectionManager("redis", connect_redis, close=lambda client: client.close(), is_alive=lambda client: client.ping())
+
+
+class PendingVote(NamedTuple):
+    """A validated vote waiting for the next DB batch, with what is needed to ack, retry and trace it."""
+    delivery_tag: int
+    vote: VoteMessage
+    span_context: SpanContext
+    queue_name: str # Queue the message was consumed from; retries return to it
+    body: bytes
+    headers: Optional[Dict[str, Any]]
 
-# Redis connection for updating vote counts
-redis_client = None
-try:
-    @retry(stop=stop_after_attempt(5), wait=wait_fixed(settings.WORKER_RECONNECT_DELAY_SECONDS/2),
-           retry=retry_if_exception_type(RedisConnectionError))
-    def connect_redis():
-        client = redis.StrictRedis.from_url(settings.REDIS_URL) # Keep decode_responses=True for Redis HASH field (UUID string)
-        client.ping() # Check connection
-        logger.info("Worker successfully connected to Redis.")
-        return client
-
-    redis_client = connect_redis()
-except RedisConnectionError as e:
-    logger.error(f"Worker failed to connect to Redis after multiple retries: {e}. Vote counts in Redis will be inaccurate/delayed.")
-    # Worker can still process votes into DB, but Redis counts will be affected.
 
 class VoteMessageProcessor:
     def __init__(self):
         self._connection = None
         self._channel = None
-        self._consumer_tag = None
-        self._introspect_delay = settings.WORKER_RECONNECT_DELAY_SECONDS # Delay for scheduled checks/reconnects
+        self._consumer_tags: Dict[str, str] = {} # consumer tag -> queue name
+        self._consumed_queues = queue_topology.worker_queue_names() # Main queue, or the shards assigned to this worker
+        self._queues_to_declare = []
+        self._queues_to_bind = []
+        self._queue_depths: Dict[str, int] = {}
+        self._backoff = Backoff() # Delay between RabbitMQ reconnect attempts, reset once connected
+        self._stopping = False
+        self._flow = AdaptiveFlowController() # Chooses prefetch and batch size from queue depth and DB health
+        self._pending = [] # PendingVote list for the next DB batch
+        self._receipts: List[Tuple[str, str]] = [] # (receipt id, outcome) not yet written to Redis
+        self._publish_seq = 0 # Sequence number of our last publish on the channel (confirm mode numbers them from 1)
+        self._unconfirmed: Dict[int, int] = {} # Publish sequence number -> delivery tag to ack once the broker confirms it
+        self._flush_timer = None
+        self._flow_timer = None
+        self._rollup_timer = None
+        self._rollup_thread: Optional[threading.Thread] = None
+
+    def run(self):
+        """
+        Connects and consumes until stop() is called. Each connection runs its own IOLoop;
+        when the connection is lost the IOLoop stops and we reconnect here after a backoff delay.
+        """
+        redis_manager.start() # Redis connects in the background; votes are processed without it meanwhile
+        while not self._stopping:
+            self.connect()
+            if self._stopping:
+                break
+            delay = self._backoff.next_delay()
+            logger.warning(f"Reconnecting to RabbitMQ in {delay:.1f} seconds.")
+            time.sleep(delay)
+
+    def stop(self):
+        """Stops consuming and closes the connection, then lets the IOLoop finish the close handshake."""
+        self._stopping = True
+        self.stop_consuming()
+        self.close_connection()
+        if self._connection is not None and not self._connection.is_closed:
+            self._connection.ioloop.start() # Returns once on_connection_closed stops the loop
+        redis_manager.stop()
+        vote_events.flush(force=True)
 
     def connect(self):
-        """Connect to RabbitMQ using async SelectConnection."""
+        """Connect to RabbitMQ using async SelectConnection. Blocks until the connection's IOLoop stops."""
         if self._connection is None or self._connection.is_closed:
             logger.info(f"Attempting to connect to RabbitMQ: {settings.RABBITMQ_URL}")
             try:
@@ -70,27 +144,28 @@ class VoteMessageProcessor:
 
     def on_connection_open(self, connection):
         logger.info("RabbitMQ connection opened successfully.")
-        self._connection.add_on_close_callback(self.on_connection_closed)
+        self._backoff.reset()
         self.open_channel()
 
     def on_connection_closed(self, connection, reason):
         self._channel = None
-        # Use the IOLoop to schedule a reconnect attempt
-        if self._connection and self._connection.ioloop: # Check if ioloop is available before scheduling
-             if self._connection.is_open:
-                  logger.warning(f"RabbitMQ connection closed unexpectedly: {reason}. Scheduling reconnect.")
-                  self._schedule_reconnect()
-             else:
-                 logger.info(f"RabbitMQ connection closed: {reason}. If not graceful shutdown, maybe due to error.")
-                 if reason is not None: # If reason is None, it might be a planned close
-                      self._schedule_reconnect() # Schedule reconnect on unplanned closes
+        DEPENDENCY_UP.labels(dependency="rabbitmq").set(0)
+        # Timers belong to the closed connection's IOLoop
+        self._pending = []
+        self._flush_timer = None
+        self._flow_timer = None
+        self._rollup_timer = None
+        self._consumer_tags.clear()
+        if self._stopping:
+            logger.info(f"RabbitMQ connection closed: {reason}.")
+            connection.ioloop.stop()
         else:
-             logger.error("IOLoop not available. Cannot schedule RabbitMQ reconnect.")
+            logger.warning(f"RabbitMQ connection closed unexpectedly: {reason}. Scheduling reconnect.")
+            self._schedule_reconnect()
 
 
     def on_connection_open_error(self, connection, err):
          logger.error(f"RabbitMQ connection open error: {err}. Scheduling reconnect.")
-         self._connection = None # Ensure connection is None for proper reconnect
          self._schedule_reconnect() # Attempt to schedule reconnect
 
     def open_channel(self):
@@ -106,6 +181,13 @@ class VoteMessageProcessor:
         logger.info("RabbitMQ channel opened.")
         self._channel = channel
         self._channel.add_on_close_callback(self.on_channel_closed)
+        self._publish_seq = 0
+        self._unconfirmed = {}
+        # Retried and rejected votes are re-published before their original is acked: only ack once the broker has the copy
+        self._channel.confirm_delivery(ack_nack_callback=self.on_delivery_confirmation, callback=self.on_confirm_mode)
+
+    def on_confirm_mode(self, frame):
+        logger.info("Publisher confirms enabled on the channel.")
         # Declare queues and exchanges after channel opened
         self.declare_dead_letter_exchange(settings.RABBITMQ_DLX_EXCHANGE)
 
@@ -113,8 +195,16 @@ class VoteMessageProcessor:
     def on_channel_closed(self, channel, reason):
         logger.warning(f"RabbitMQ channel closed: {reason}")
         self._channel = None
+        # Unacked messages are redelivered by the broker; their delivery tags are now invalid.
+        # That includes originals whose re-published copy was not confirmed yet (the copy may exist too:
+        # the redelivered vote is then a duplicate, which ON CONFLICT absorbs).
+        self._pending = []
+        self._unconfirmed = {}
+        self._cancel_flush_timer()
+        self._consumer_tags.clear()
+        DEPENDENCY_UP.labels(dependency="rabbitmq").set(0)
         # Channel closed, connection might still be open. Attempt to reopen channel.
-        if self._connection and self._connection.is_open:
+        if self._connection and self._connection.is_open and not self._stopping:
              logger.info("Scheduling channel reopen.")
              # Schedule channel reopen via IOLoop
              self._connection.ioloop.call_later(1, self.open_channel) # Short delay before reopening channel
@@ -155,37 +245,72 @@ class VoteMessageProcessor:
 
 
     def on_dlq_bound(self, frame):
-        logger.info("DLQ bound to DLX. Declaring main queue.")
-        self.declare_main_queue(settings.RABBITMQ_QUEUE_NAME, settings.RABBITMQ_DLX_EXCHANGE)
-
-
-    def declare_main_queue(self, queue_name, dlx_exchange_name):
-        """Declare the main message queue with DLX argument."""
-        logger.info(f"Declaring main queue '{queue_name}' with DLX argument.")
+        logger.info("DLQ bound to DLX. Declaring vote queue(s) and their retry delay queues.")
+        # Queues are declared one after another through the callback chain
+        self._queues_to_declare = [(name, queue_topology.vote_queue_arguments()) for name in queue_topology.vote_queue_names()]
+        for queue_name in queue_topology.vote_queue_names():
+            for delay in queue_topology.retry_delays():
+                self._queues_to_declare.append((queue_topology.retry_queue_name(queue_name, delay),
+                                                queue_topology.retry_queue_arguments(queue_name, delay)))
+        self.declare_queue(*self._queues_to_declare.pop(0))
+
+
+    def declare_queue(self, queue_name, arguments):
+        """Declare a vote queue (the main queue or one shard) or one of its retry delay queues."""
+        logger.info(f"Declaring queue '{queue_name}' with arguments {arguments}.")
         self._channel.queue_declare(
             queue=queue_name,
             durable=True, # Ensure queue survives broker restart
-            arguments={'x-dead-letter-exchange': dlx_exchange_name}, # Route rejected messages to DLX
+            arguments=arguments, # Queue type, DLX routing of rejected / expired messages, TTL
             callback=self.on_main_queue_declared
         )
 
 
     def on_main_queue_declared(self, frame):
-        logger.info("Main queue declared. Starting to consume messages.")
-        self.start_consuming()
+        if self._queues_to_declare:
+            self.declare_queue(*self._queues_to_declare.pop(0))
+        elif settings.RABBITMQ_ROUTING_MODE == "consistent_hash":
+            logger.info("Vote queues declared. Declaring consistent-hash exchange.")
+            self._channel.exchange_declare(
+                exchange=settings.RABBITMQ_SHARD_EXCHANGE,
+                exchange_type='x-consistent-hash', # Requires the rabbitmq_consistent_hash_exchange plugin
+                durable=True,
+                callback=self.on_shard_exchange_declared
+            )
+        else:
+            logger.info("Vote queues declared. Starting to consume messages.")
+            self.start_consuming()
+
+    def on_shard_exchange_declared(self, frame):
+        self._queues_to_bind = queue_topology.vote_queue_names()
+        self.on_shard_queue_bound(None)
+
+    def on_shard_queue_bound(self, frame):
+        if not self._queues_to_bind:
+            logger.info("Shard queues bound to consistent-hash exchange. Starting to consume messages.")
+            self.start_consuming()
+            return
+        self._channel.queue_bind(
+            queue=self._queues_to_bind.pop(0),
+            exchange=settings.RABBITMQ_SHARD_EXCHANGE,
+            routing_key='1', # For x-consistent-hash the binding key is the shard's weight
+            callback=self.on_shard_queue_bound
+        )
 
     def start_consuming(self):
-         """Start consuming messages from the queue."""
+         """Start consuming messages from the vote queue(s) assigned to this worker."""
          if self._channel:
              try:
-                 # Set prefetch count for fair dispatch among workers
-                 self._channel.basic_qos(prefetch_count=10) # Process up to 10 messages concurrently per worker
-                 self._consumer_tag = self._channel.basic_consume(
-                     settings.RABBITMQ_QUEUE_NAME,
-                     on_message_callback=self.on_message,
-                     auto_ack=False  # Important: Manual acknowledgement
-                 )
-                 logger.info(f"Started consuming from '{settings.RABBITMQ_QUEUE_NAME}' with consumer tag: {self._consumer_tag}. Auto-ack is OFF.")
+                 # Set prefetch count for fair dispatch among workers; flow control adjusts it as load changes.
+                 # The prefetch applies to each consumer, i.e. to each consumed shard.
+                 self._channel.basic_qos(prefetch_count=self._flow.prefetch)
+                 WORKER_PREFETCH.set(self._flow.prefetch)
+                 WORKER_BATCH_SIZE.set(self._flow.batch_size)
+                 for queue_name in self._consumed_queues:
+                     self._consume(queue_name)
+                 DEPENDENCY_UP.labels(dependency="rabbitmq").set(1) # Ready: consuming
+                 self._schedule_flow_control()
+                 self._schedule_rollup_mirror()
              except pika.exceptions.ChannelClosedByBroker as e:
                  logger.error(f"Channel closed by broker when starting to consume: {e}")
                  # Handled by on_channel_closed callback
@@ -194,12 +319,24 @@ class VoteMessageProcessor:
                  # Decide whether to retry starting consume or rely on channel/connection reconnect
                  # Generally, rely on reconnects.
 
+    def _consume(self, queue_name: str):
+        consumer_tag = self._channel.basic_consume(
+            queue_name,
+            on_message_callback=self.on_message,
+            auto_ack=False,  # Important: Manual acknowledgement (streams require it too)
+            arguments=queue_topology.consume_arguments(), # Start offset for stream queues
+        )
+        self._consumer_tags[consumer_tag] = queue_name
+        logger.info(f"Started consuming from '{queue_name}' with consumer tag: {consumer_tag}. Auto-ack is OFF.")
+
     def stop_consuming(self):
         """Stop consuming messages and gracefully shutdown."""
-        if self._channel and self._consumer_tag:
-            logger.info(f"Stopping consumer tag: {self._consumer_tag}")
-            self._channel.basic_cancel(self._consumer_tag) # Removed callback, basic_cancel is often blocking/initiates shutdown sequence
-            self._consumer_tag = None
+        self._flush_batch() # Don't leave already-received votes waiting for redelivery
+        if self._channel:
+            for consumer_tag in list(self._consumer_tags):
+                logger.info(f"Stopping consumer tag: {consumer_tag}")
+                self._channel.basic_cancel(consumer_tag) # Removed callback, basic_cancel is often blocking/initiates shutdown sequence
+        self._consumer_tags.clear()
         logger.info("Consumer stopping.")
 
 
@@ -213,152 +350,464 @@ class VoteMessageProcessor:
 
 
     def _schedule_reconnect(self):
-         """Schedule a reconnect attempt after a delay using the IOLoop."""
-         if self._connection is not None and self._connection.ioloop:
-             logger.warning(f"Scheduling RabbitMQ reconnect attempt in {self._introspect_delay} seconds.")
-             # Cancel previous scheduled calls if any? Not strictly needed with simple retry
-             self._connection.ioloop.call_later(self._introspect_delay, self.connect)
-         else:
-              logger.error("IOLoop not available. Cannot schedule RabbitMQ reconnect.")
-
+         """Stops this connection's IOLoop; run() then reconnects with backoff on a fresh connection."""
+         if self._connection is not None:
+             self._connection.ioloop.stop()
+
+    def _reject(self, delivery_tag, body: bytes, headers: Optional[Dict[str, Any]], reason: str, queue_name: Optional[str] = None,
+                outcome='dlq', receipt_id=None):
+        """
+        Sends a message to the DLQ with the reason it was rejected (see queue_topology), so the DLQ replayer
+        can tell votes worth replaying from permanent failures, and counts the outcome.
+        """
+        VOTE_MESSAGES.labels(outcome=outcome).inc()
+        vote_events.event(outcome)
+        self._record_receipt(receipt_id, outcome)
+        if settings.RABBITMQ_QUEUE_TYPE == "stream":
+            self._channel.basic_reject(delivery_tag=delivery_tag, requeue=False) # Streams never dead-letter: dropped
+            return
+        headers = {key: value for key, value in (headers or {}).items() if key != "x-death"} # Delay queue hops, not the origin
+        headers[queue_topology.REJECTION_REASON_HEADER] = reason
+        if queue_name:
+            headers[queue_topology.ORIGINAL_QUEUE_HEADER] = queue_name
+        self._publish_then_ack(delivery_tag, settings.RABBITMQ_DLQ_QUEUE, body, headers) # basic_reject cannot add headers
+
+    @MESSAGE_HANDLING_LATENCY.time()
     def on_message(self, ch, method, properties, body):
-        """Callback function when a message is received."""
-        logger.info(f"Received message (delivery_tag={method.delivery_tag}): {body}")
+        """Callback function when a message is received. Continues the API's trace from the message headers."""
+        parent_context = extract_trace_context(properties.headers)
+        with tracer.start_as_current_span("vote.consume", context=parent_context, kind=SpanKind.CONSUMER) as span:
+            self._handle_message(ch, method, properties, body, span.get_span_context())
+
+    def _handle_message(self, ch, method, properties, body, span_context):
+        """Validates a vote message and queues it for the next DB batch. Invalid messages go to the DLQ."""
         delivery_tag = method.delivery_tag
+        # In consistent_hash mode the routing key is the user, so resolve the queue from the consumer tag
+        queue_name = self._consumer_tags.get(method.consumer_tag, method.routing_key)
+        # Never log the raw body: it carries the user's JWT
+        logger.debug("Received message (delivery_tag=%s, %d bytes)", delivery_tag, len(body))
 
         try:
-            # Deserialize message
-            message_data = json.loads(body)
-            candidate_id_str = message_data.get("candidate_id")
-            user_token = message_data.get("user_token")
-            vote_timestamp_str = message_data.get("vote_timestamp")
-            source_ip = message_data.get("source_ip")
-            user_agent = message_data.get("user_agent")
-
-            # Basic validation of message structure
-            if not candidate_id_str or not user_token or not vote_timestamp_str:
-                logger.error(f"Invalid message format: Missing required fields in message (delivery_tag={delivery_tag}). Rejecting.")
-                ch.basic_reject(delivery_tag=delivery_tag, requeue=False) # Send to DLQ
-                return
-
-            try:
-                candidate_id = UUID(candidate_id_str)
-                # No need to parse vote_timestamp string here if DBHandler handles it.
-                # Ensure IPs are valid format if needed, or rely on DB INET type casting later.
-            except (ValueError, TypeError) as e:
-                 logger.error(f"Invalid data types in message (delivery_tag={delivery_tag}): {e} for {body}. Rejecting.")
-                 ch.basic_reject(delivery_tag=delivery_tag, requeue=False) # Send to DLQ
-                 return
-
-            # *** Detailed Validation: User Token -> user_identifier ***
-            # Decode the token to get user claims and derive a consistent user_identifier
-            # This identifier is used to link votes to a unique user in the 'users' table.
+            vote = parse_vote_message(body)
+        except InvalidVoteMessage as e:
+            logger.error("Invalid vote message (delivery_tag=%s): %s. Rejecting.", delivery_tag, e)
+            self._reject(delivery_tag, body, properties.headers, e.reason, queue_name, receipt_id=e.receipt_id) # Poison message, do not requeue
+            self._write_receipts()
+            return
+        except Exception as e:
+            # Catch ANY other exceptions before the vote reaches the batch
+            logger.error("A critical error occurred BEFORE vote processing logic (delivery_tag=%s): %s. Rejecting to DLQ.", delivery_tag, e, exc_info=True)
+            self._reject(delivery_tag, body, properties.headers, "unexpected_error", queue_name)
+            self._write_receipts()
+            return
+
+        if candidate_catalog.refresh_due:
+            candidate_catalog.refresh() # Keeps the previous set if the DB is unavailable
+        if candidate_catalog.check(vote.candidate_id) is False:
+            logger.warning("Vote for unknown candidate_id=%s (delivery_tag=%s). Rejecting.", vote.candidate_id, delivery_tag)
+            UNKNOWN_CANDIDATE_VOTES.labels(stage="worker").inc()
+            self._reject(delivery_tag, body, properties.headers, "unknown_candidate", queue_name, receipt_id=vote.receipt_id)
+            self._write_receipts()
+            return
+
+        vote_time = time.time()
+        try:
+            vote_dt = datetime.fromisoformat(vote.vote_timestamp.replace('Z', '+00:00'))
+            vote_time = vote_dt.timestamp()
+            queue_lag = max(0.0, time.time() - vote_dt.timestamp())
+            QUEUE_LAG.observe(queue_lag)
+            trace.get_current_span().set_attribute("messaging.queue_wait_ms", queue_lag * 1000)
+        except (ValueError, TypeError, AttributeError):
+            pass # Lag is best-effort; parse_vote_message already rejected malformed timestamps
+
+        self._check_abuse(vote, vote_time, method, properties)
+
+        self._pending.append(PendingVote(delivery_tag, vote, span_context, queue_name, body, properties.headers))
+        if len(self._pending) >= self._flow.batch_size:
+            self._flush_batch()
+        elif self._flush_timer is None:
+            # Don't hold a partial batch for long when traffic is light
+            self._flush_timer = self._connection.ioloop.call_later(settings.WORKER_BATCH_MAX_WAIT_SECONDS, self._on_flush_timer)
+
+    def _check_abuse(self, vote: VoteMessage, vote_time: float, method, properties):
+        """Flags (or quarantines) the vote if its sources sent too many votes in the abuse detection window."""
+        if settings.ABUSE_ACTION == "off":
+            return
+        # Retried or redelivered messages were counted on their first delivery: only look them up
+        first_delivery = not method.redelivered and not (properties.headers or {}).get(queue_topology.RETRY_ATTEMPT_HEADER)
+        exceeded = abuse_detector.observe(vote, vote_time, count=first_delivery)
+        if not exceeded:
+            return
+        vote.flagged = True
+        vote.is_valid = settings.ABUSE_ACTION != "quarantine"
+        vote_events.event("flagged", "Vote for candidate_id=%s from source_ip=%s flagged (%s above threshold, %s).",
+                          vote.candidate_id, vote.source_ip, ", ".join(exceeded), settings.ABUSE_ACTION)
+
+    def _on_flush_timer(self):
+        self._flush_timer = None
+        self._flush_batch()
+
+    def _cancel_flush_timer(self):
+        if self._flush_timer is not None:
+            if self._connection is not None:
+                self._connection.ioloop.remove_timeout(self._flush_timer)
+            self._flush_timer = None
+
+    def _flush_batch(self):
+        """
+        Writes all pending votes in one DB transaction, increments Redis counts for new votes,
+        then acks, retries (via a delay queue) or rejects each message individually.
+        """
+        self._cancel_flush_timer()
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        VOTE_BATCH_SIZE.observe(len(batch))
+
+        # One span for the whole batch, linked to the consume span of every message in it
+        with tracer.start_as_current_span("vote.batch", links=[Link(p.span_context) for p in batch]) as span:
+            span.set_attribute("vote.batch_size", len(batch))
+            started = time.monotonic()
             try:
-                # Assuming user_identifier is a claim 'user_uid' in the token
-                # Decode without verifying expiry to process historical votes if queuing was delayed
-                payload = jwt.decode(
-                     user_token,
-                     settings.JWT_SECRET_KEY,
-                     algorithms=[settings.JWT_ALGORITHM],
-                     options={"verify_signature": True, "verify_aud": False, "verify_iss": False, "verify_exp": False} # Don't verify expiry here
-                )
-                user_identifier: Optional[str] = payload.get("user_uid") # Assuming 'user_uid' claim
-
-                if not user_identifier:
-                     logger.error(f"User identifier claim ('user_uid') missing in valid token payload (delivery_tag={delivery_tag}). Rejecting.")
-                     ch.basic_reject(delivery_tag=delivery_tag, requeue=False) # Send to DLQ
-                     return
-
-            except JWTError as e:
-                logger.error(f"Invalid or malformed JWT token in message payload (delivery_tag={delivery_tag}): {e}. Rejecting.")
-                # Invalid token means we cannot identify the user reliably. Reject.
-                ch.basic_reject(delivery_tag=delivery_tag, requeue=False) # Send to DLQ
-                return
+                statuses = db_breaker.call(db_handler.execute_batch, [p.vote for p in batch])
+                self._flow.record_batch(time.monotonic() - started, failed=False)
+            except CircuitOpenError:
+                # No DB call was made; let the votes wait in a delay queue until the circuit probes again
+                logger.warning("PostgreSQL circuit open. Scheduling retries for a batch of %d.", len(batch))
+                statuses = ['retry'] * len(batch)
             except Exception as e:
-                 # Catch other token processing errors
-                 logger.error(f"Unexpected error during JWT processing (delivery_tag={delivery_tag}): {e} for {body}. Rejecting.")
-                 ch.basic_reject(delivery_tag=delivery_tag, requeue=False) # Send to DLQ
-                 return
-
+                if is_transient_db_error(e):
+                    # Transient errors (connection lost, serialization failure, ...) are retried later
+                    # from a delay queue instead of sleeping here and stalling every prefetched message.
+                    self._flow.record_batch(time.monotonic() - started, failed=True)
+                    logger.warning("Vote batch of %d failed with a transient DB error: %s. Scheduling retries.", len(batch), e)
+                    statuses = ['retry'] * len(batch)
+                else:
+                    # Some vote in the batch is bad data (unknown candidate, value the DB rejects, ...).
+                    # This is not a DB health problem: isolate the offending vote(s) so the rest get written.
+                    self._flow.record_batch(time.monotonic() - started, failed=False)
+                    logger.warning("Vote batch of %d failed (%s). Processing votes individually.", len(batch), getattr(e, "orig", None) or e)
+                    statuses = [self._process_single(p.vote) for p in batch]
+
+            # Only increment Redis counts for successfully inserted *new* votes, and not quarantined ones
+            self._increment_vote_counts([p.vote for p, st in zip(batch, statuses) if st == 'processed' and p.vote.is_valid])
+
+            if self._channel is None or not self._channel.is_open:
+                # Delivery tags died with the channel; the broker redelivers these messages
+                # and ON CONFLICT turns them into duplicates, so counts are not incremented twice.
+                logger.warning("Channel closed before %d messages could be acknowledged. They will be redelivered.", len(batch))
+                return
 
-            # *** Process Vote (DB and Redis Write) ***
-            # Call DBHandler to insert/upsert user and insert vote, handling ON CONFLICT internally with retries
+            for pending, vote_status in zip(batch, statuses):
+                if vote_status in ('processed', 'duplicate'):
+                    # Acknowledge message ONLY if database transaction (insert or conflict) was handled
+                    self._channel.basic_ack(pending.delivery_tag)
+                    self._record_receipt(pending.vote.receipt_id, vote_status)
+                    VOTE_MESSAGES.labels(outcome=vote_status).inc()
+                    vote_events.event(vote_status, "Message acknowledged (delivery_tag=%s, status=%s) for user_identifier=%s, candidate_id=%s.",
+                                      pending.delivery_tag, vote_status, pending.vote.user_identifier, pending.vote.candidate_id)
+                elif vote_status == 'retry':
+                    self._retry_later(pending)
+                else:
+                    # The DB refused this vote on its own: send to DLQ for investigation
+                    self._reject(pending.delivery_tag, pending.body, pending.headers, "db_rejected", pending.queue_name,
+                                 outcome='failed', receipt_id=pending.vote.receipt_id)
+            self._write_receipts()
+
+    def _retry_later(self, pending: PendingVote):
+        """
+        Re-publishes a vote to the delay queue of its next retry tier and acks the original once the copy is confirmed.
+        The broker routes it back to its queue when the delay expires. After the last tier it goes to the DLQ.
+        """
+        headers = dict(pending.headers or {})
+        attempt = int(headers.get(queue_topology.RETRY_ATTEMPT_HEADER, 0))
+        delays = queue_topology.retry_delays()
+        if attempt >= len(delays):
+            logger.error("Vote for candidate_id=%s still failing after %d retries. Rejecting to DLQ.", pending.vote.candidate_id, attempt)
+            self._reject(pending.delivery_tag, pending.body, pending.headers, "retries_exhausted", pending.queue_name,
+                         outcome='failed', receipt_id=pending.vote.receipt_id)
+            return
+
+        headers[queue_topology.RETRY_ATTEMPT_HEADER] = attempt + 1
+        headers.pop("x-death", None) # Broker-managed; it is re-added when the delay queue dead-letters
+        self._publish_then_ack(pending.delivery_tag, queue_topology.retry_queue_name(pending.queue_name, delays[attempt]),
+                               pending.body, headers)
+        self._record_receipt(pending.vote.receipt_id, 'retry')
+        VOTE_MESSAGES.labels(outcome='retry').inc()
+        vote_events.event('retry', "Vote for candidate_id=%s scheduled for retry %d in %ds.",
+                          pending.vote.candidate_id, attempt + 1, delays[attempt])
+
+    def _publish_then_ack(self, delivery_tag: int, routing_key: str, body: bytes, headers: Dict[str, Any]):
+        """
+        Publishes a copy of a consumed message and acks the original once the broker confirms the copy
+        (see on_delivery_confirmation). Until then a lost channel means redelivery, never a lost vote.
+        """
+        self._channel.basic_publish(
+            exchange='', # Straight to the queue
+            routing_key=routing_key,
+            body=body,
+            properties=pika.BasicProperties(delivery_mode=pika.DeliveryMode.Persistent, headers=headers),
+        )
+        self._publish_seq += 1
+        self._unconfirmed[self._publish_seq] = delivery_tag
+
+    def on_delivery_confirmation(self, frame):
+        """Acks the originals of confirmed copies. A nacked copy was not stored: its original is requeued instead."""
+        confirmed = frame.method.delivery_tag
+        sequence_numbers = [seq for seq in self._unconfirmed if seq <= confirmed] if frame.method.multiple else [confirmed]
+        stored = isinstance(frame.method, pika.spec.Basic.Ack)
+        for seq in sequence_numbers:
+            delivery_tag = self._unconfirmed.pop(seq, None)
+            if delivery_tag is None or self._channel is None or not self._channel.is_open:
+                continue
+            if stored:
+                self._channel.basic_ack(delivery_tag)
+            else:
+                logger.warning("Broker nacked a re-published vote (delivery_tag=%s). Requeueing the original.", delivery_tag)
+                self._channel.basic_nack(delivery_tag, requeue=True)
+
+    def _process_single(self, vote: VoteMessage) -> str:
+        """Writes one vote on its own (used to isolate a vote that broke its batch). Returns its status."""
+        try:
+            return db_breaker.call(
+                db_handler.execute_transaction,
+                user_identifier=vote.user_identifier,
+                candidate_id=vote.candidate_id,
+                vote_timestamp=vote.vote_timestamp, # Pass the original string timestamp
+                source_ip=vote.source_ip,
+                user_agent=vote.user_agent,
+                is_valid=vote.is_valid,
+                flagged=vote.flagged,
+            )
+        except CircuitOpenError:
+            return 'retry'
+        except (SQLAlchemyError, IntegrityError) as e:
+            if is_transient_db_error(e):
+                logger.warning("Transient DB error processing vote for candidate_id=%s: %s. Scheduling retry.", vote.candidate_id, e)
+                return 'retry'
+            logger.error("DB error processing vote for candidate_id=%s: %s. Rejecting to DLQ.", vote.candidate_id, e)
+        except Exception as e:
+            logger.error("An unexpected error occurred processing vote for candidate_id=%s: %s. Rejecting to DLQ.", vote.candidate_id, e, exc_info=True)
+        return 'failed'
+
+    def _increment_vote_counts(self, votes):
+        """
+        Increments the Redis HASH counters for new votes, one HINCRBY per candidate in a single round trip.
+        The whole batch goes to one counter shard (see redis_keys), so writes spread over the shards.
+        The distinct voter / source IP HyperLogLogs and the minute / hour rollups are updated in the same round trip.
+        """
+        redis_client = redis_manager.current
+        if not votes or redis_client is None:
+            return
+        increments: Dict[UUID, int] = {}
+        for vote in votes:
+            increments[vote.candidate_id] = increments.get(vote.candidate_id, 0) + 1
+        try:
+            with REDIS_INCREMENT_LATENCY.time(), tracer.start_as_current_span("redis.increment"):
+                counter_key = redis_keys.vote_counter_write_key()
+                pipe = redis_client.pipeline(transaction=False)
+                for candidate_id, count in increments.items():
+                    # Use HINCRBY to atomically increment the vote count in Redis HASH
+                    pipe.hincrby(counter_key, str(candidate_id), count)
+                for key, members in self._cardinality_updates(votes).items():
+                    pipe.pfadd(key, *members)
+                for (key, expire_at), counts in self._rollup_updates(votes).items():
+                    for candidate_id, count in counts.items():
+                        pipe.hincrby(key, candidate_id, count)
+                    pipe.expireat(key, expire_at)
+                redis_breaker.call(pipe.execute)
+            logger.debug("Incremented Redis vote counts: %s", increments)
+        except CircuitOpenError:
+            logger.error("Redis circuit open. Skipping vote count increment for %d votes. Votes recorded in DB.", len(votes))
+        except (RedisConnectionError, RedisTimeoutError) as e:
+            # This is an edge case. Votes are in PG, but counts might be slightly off in Redis.
+            # Log error but do NOT NACK messages just because Redis failed if DB was successful.
+            logger.error("Failed to increment Redis vote counts for %d votes: %s. Votes recorded in DB.", len(votes), e)
+        except Exception as e:
+            logger.error("Unexpected error during Redis HINCRBY for %d votes: %s. Votes recorded in DB.", len(votes), e)
+
+    @staticmethod
+    def _cardinality_updates(votes) -> Dict[str, set]:
+        """HyperLogLog key -> members to add for new votes (see redis_keys)."""
+        updates: Dict[str, set] = {}
+        def add(key, member):
+            updates.setdefault(key, set()).add(member)
+        for vote in votes:
+            add(redis_keys.VOTERS_HLL_KEY, vote.user_identifier)
+            add(redis_keys.candidate_voters_hll_key(vote.candidate_id), vote.user_identifier)
+            if vote.source_ip:
+                add(redis_keys.SOURCE_IPS_HLL_KEY, vote.source_ip)
+                add(redis_keys.candidate_source_ips_hll_key(vote.candidate_id), vote.source_ip)
+                block = redis_keys.source_ip_block(vote.source_ip)
+                if block is not None:
+                    add(redis_keys.ip_block_voters_hll_key(block), vote.user_identifier)
+        return updates
+
+    @staticmethod
+    def _rollup_updates(votes) -> Dict[Tuple[str, int], Dict[str, int]]:
+        """(rollup key, unix time it expires) -> candidate ID -> new votes, by vote_timestamp (see redis_keys)."""
+        updates: Dict[Tuple[str, int], Dict[str, int]] = {}
+        for vote in votes:
             try:
-                vote_processing_status = db_handler.execute_transaction(
-                    user_identifier=user_identifier,
-                    candidate_id=candidate_id,
-                    vote_timestamp=vote_timestamp_str, # Pass the original string timestamp
-                    source_ip=source_ip,
-                    user_agent=user_agent
-                )
-
-                if vote_processing_status == 'processed':
-                    # Only increment Redis count on a successfully inserted *new* vote
-                    if redis_client is not None:
-                         try:
-                              # Use HINCRBY to atomically increment the vote count in Redis HASH
-                              redis_key = "candidate_votes" # Key for the HASH storing all counts
-                              redis_field = str(candidate_id) # Field is the candidate UUID string
-                              # HINCRBY returns the new value after increment
-                              new_count = redis_client.hincrby(redis_key, redis_field, 1)
-                              logger.info(f"Incremented Redis vote count for candidate_id={candidate_id}. New count: {new_count}")
-                         except (RedisConnectionError, RedisTimeoutError) as e:
-                             # This is an edge case. Vote is in PG, but count might be slightly off in Redis.
-                             # Log error but do NOT NACK message just because Redis failed if DB was successful.
-                             logger.error(f"Failed to increment Redis vote count for candidate_id={candidate_id}: {e}. Vote recorded in DB.")
-                         except Exception as e:
-                             logger.error(f"Unexpected error during Redis HINCRBY for candidate_id={candidate_id}: {e}. Vote recorded in DB.")
-
-                    # Acknowledge message ONLY if database transaction (insert or conflict) was handled (processed or duplicate)
-                    ch.basic_ack(delivery_tag)
-                    logger.info(f"Message acknowledged (delivery_tag={delivery_tag}) after successful DB operation (status={vote_processing_status}).")
-
-                elif vote_processing_status == 'duplicate':
-                    # Vote was a duplicate (handled by ON CONFLICT). Acknowledge the message.
-                    # No Redis HASH increment for duplicates based on typical requirements.
-                    ch.basic_ack(delivery_tag)
-                    logger.info(f"Duplicate vote message (delivery_tag={delivery_tag}) acknowledged for user_identifier={user_identifier}, candidate_id={candidate_id}.")
-
-                elif vote_processing_status == 'failed':
-                     # DB operation failed *after* retries within DBHandler.
-                     # This indicates a persistent DB error or unhandled exception.
-                     # Reject without requeue to send to DLQ.
-                     logger.error(f"Vote processing failed after DB retries for message (delivery_tag={delivery_tag}): {body}. Rejecting to DLQ.")
-                     ch.basic_reject(delivery_tag=delivery_tag, requeue=False) # Send to DLQ
-
-            except (SQLAlchemyError, IntegrityError) as e:
-                # Catch DB errors not fully handled or retried by DBHandler (e.g. Integrity Errors)
-                # Log and reject to DLQ for investigation.
-                logger.error(f"Persistent DB error during vote processing (delivery_tag={delivery_tag}): {e}. Rejecting to DLQ.", exc_info=True)
-                ch.basic_reject(delivery_tag=delivery_tag, requeue=False) # Send to DLQ
-            except Exception as e:
-                # Catch any other unexpected exceptions during the main processing logic
-                logger.error(f"An unexpected error occurred during vote processing logic (delivery_tag={delivery_tag}): {e} for message: {body}. Rejecting to DLQ.", exc_info=True)
-                # Reject message. If DLQ is configured, it goes there. If not, it might be lost.
-                ch.basic_reject(delivery_tag=delivery_tag, requeue=False) # safer to send to DLQ
-
-        except json.JSONDecodeError:
-            logger.error(f"Failed to decode JSON message (delivery_tag={delivery_tag}): {body}. Rejecting.")
-            # Negative acknowledgement for bad message format, do not requeue (poison message)
-            ch.basic_reject(delivery_tag=delivery_tag, requeue=False) # Send to DLQ
+                timestamp = datetime.fromisoformat(vote.vote_timestamp.replace('Z', '+00:00')).timestamp()
+            except (ValueError, TypeError, AttributeError):
+                continue # Stored by DBHandler all the same; the table rollups will count it
+            for granularity in redis_keys.ROLLUP_GRANULARITIES:
+                bucket = redis_keys.rollup_bucket(timestamp, granularity)
+                location = (redis_keys.rollup_key(granularity, bucket), bucket + redis_keys.rollup_ttl_seconds(granularity))
+                counts = updates.setdefault(location, {})
+                counts[str(vote.candidate_id)] = counts.get(str(vote.candidate_id), 0) + 1
+        return updates
+
+    # --- Vote receipts ---
+    def _record_receipt(self, receipt_id: Optional[str], outcome: str):
+        if receipt_id:
+            self._receipts.append((receipt_id, outcome))
+
+    def _write_receipts(self):
+        """
+        Writes the recorded outcomes to the receipt hashes (see redis_keys) in one round trip, for
+        GET /vote/{receipt}. Best effort: without Redis the receipts just stay "pending".
+        """
+        receipts, self._receipts = self._receipts, []
+        redis_client = redis_manager.current
+        if not receipts or redis_client is None:
+            return
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            expiry: Dict[str, int] = {}
+            for receipt_id, outcome in receipts:
+                try:
+                    key, field, expire_at = redis_keys.vote_receipt_location(receipt_id)
+                except ValueError:
+                    logger.warning("Ignoring malformed vote receipt %r.", receipt_id)
+                    continue
+                pipe.hset(key, field, redis_keys.vote_receipt_value(outcome))
+                expiry[key] = expire_at
+            for key, expire_at in expiry.items():
+                pipe.expireat(key, expire_at)
+            redis_breaker.call(pipe.execute)
+        except CircuitOpenError:
+            logger.warning("Redis circuit open. Skipping %d vote receipt(s).", len(receipts))
+        except (RedisConnectionError, RedisTimeoutError) as e:
+            logger.error("Failed to write %d vote receipt(s): %s.", len(receipts), e)
         except Exception as e:
-            # Catch ANY other top-level exceptions before main processing logic starts
-            logger.error(f"A critical error occurred BEFORE vote processing logic (delivery_tag={delivery_tag}): {e} for {body}. Rejecting to DLQ.", exc_info=True)
-            ch.basic_reject(delivery_tag=delivery_tag, requeue=False) # Send to DLQ
+            logger.error("Unexpected error while writing %d vote receipt(s): %s.", len(receipts), e)
+
+    # --- Adaptive flow control ---
+    def _schedule_flow_control(self):
+        if self._flow_timer is not None:
+            self._connection.ioloop.remove_timeout(self._flow_timer)
+        self._flow_timer = self._connection.ioloop.call_later(settings.WORKER_FLOW_CONTROL_INTERVAL_SECONDS, self._on_flow_control_tick)
+
+    def _on_flow_control_tick(self):
+        """Samples the depth of every consumed queue with a passive declare; limits are adjusted once all have answered."""
+        self._flow_timer = None
+        vote_events.flush() # Report event counts even when no vote arrives after the summary interval
+        if self._channel is None or not self._channel.is_open:
+            return # Rescheduled when consuming restarts on a new channel
+        self._queue_depths = {}
+        for queue_name in self._consumed_queues:
+            self._channel.queue_declare(queue=queue_name, passive=True,
+                                        callback=functools.partial(self._on_queue_depth, queue_name))
+        self._schedule_flow_control()
+
+    def _on_queue_depth(self, queue_name, frame):
+        self._queue_depths[queue_name] = frame.method.message_count
+        if len(self._queue_depths) < len(self._consumed_queues):
+            return
+        depth = sum(self._queue_depths.values())
+        QUEUE_DEPTH.set(depth)
+        self._flow.record_queue_depth(depth)
+        previous_prefetch = self._flow.prefetch
+        prefetch, batch_size = self._flow.adjust()
+        WORKER_PREFETCH.set(prefetch)
+        WORKER_BATCH_SIZE.set(batch_size)
+        if prefetch != previous_prefetch and self._channel is not None and self._channel.is_open:
+            self._apply_prefetch(prefetch)
+
+    def _apply_prefetch(self, prefetch: int):
+        """
+        basic.qos only limits consumers created after it, so the running consumers are cancelled and
+        re-created with the new prefetch. Their unacked deliveries stay valid on the channel meanwhile.
+        Stream consumers keep their prefetch: a new one would restart at WORKER_STREAM_OFFSET and skip or replay votes.
+        """
+        if settings.RABBITMQ_QUEUE_TYPE == "stream":
+            return
+        logger.info("Changing prefetch to %d. Restarting %d consumer(s).", prefetch, len(self._consumer_tags))
+        self._channel.basic_qos(prefetch_count=prefetch)
+        for consumer_tag in list(self._consumer_tags):
+            # The tag keeps resolving its queue until the broker confirms: deliveries may still arrive on it
+            self._channel.basic_cancel(consumer_tag, callback=functools.partial(self._on_consumer_restarted, consumer_tag))
+
+    def _on_consumer_restarted(self, consumer_tag, frame):
+        queue_name = self._consumer_tags.pop(consumer_tag, None)
+        if queue_name is None or self._stopping or self._channel is None or not self._channel.is_open:
+            return
+        self._consume(queue_name)
+
+
+    # --- Vote rollups table ---
+    def _schedule_rollup_mirror(self):
+        if self._rollup_timer is not None:
+            self._connection.ioloop.remove_timeout(self._rollup_timer)
+        self._rollup_timer = self._connection.ioloop.call_later(settings.ROLLUP_MIRROR_INTERVAL_SECONDS, self._on_rollup_mirror_tick)
+
+    def _on_rollup_mirror_tick(self):
+        """
+        Refreshes the recent vote_rollups rows (see core/vote_rollups.py), if no other worker did this interval.
+        The refresh runs in a thread: the IOLoop keeps consuming and servicing heartbeats meanwhile.
+        """
+        self._rollup_timer = None
+        if self._channel is None or not self._channel.is_open:
+            return # Rescheduled when consuming restarts on a new channel
+        if self._rollup_thread is not None and self._rollup_thread.is_alive():
+            logger.warning("Previous vote rollups refresh still running. Skipping this one.")
+        elif self._claim_rollup_mirror():
+            self._rollup_thread = threading.Thread(target=self._refresh_rollups, name="rollup-mirror", daemon=True)
+            self._rollup_thread.start()
+        self._schedule_rollup_mirror()
+
+    @staticmethod
+    def _refresh_rollups():
+        end = datetime.now(timezone.utc)
+        try:
+            db_breaker.call(mirror_rollups, end - timedelta(seconds=settings.ROLLUP_MIRROR_LOOKBACK_SECONDS), end)
+        except CircuitOpenError:
+            logger.warning("PostgreSQL circuit open. Skipping the vote rollups refresh.")
+        except SQLAlchemyError as e:
+            logger.error("Failed to refresh vote rollups: %s", e)
+
+    @staticmethod
+    def _claim_rollup_mirror() -> bool:
+        """One refresh per interval across workers. Without Redis every worker refreshes (the refresh is idempotent)."""
+        redis_client = redis_manager.current
+        if redis_client is None:
+            return True
+        try:
+            ttl = max(1, int(settings.ROLLUP_MIRROR_INTERVAL_SECONDS) - 1)
+            return bool(redis_breaker.call(redis_client.set, redis_keys.ROLLUP_MIRROR_LOCK_KEY, "1", nx=True, ex=ttl))
+        except (CircuitOpenError, RedisConnectionError, RedisTimeoutError):
+            return True
 
 
 # Entry point for the worker script IF RUNNING STANDALONE
 if __name__ == "__main__":
+    configure_logging("worker")
+    configure_tracing("voting-worker")
+
+    # Expose worker metrics (DB transaction time, queue lag, outcomes) for Prometheus scraping
+    start_http_server(settings.WORKER_METRICS_PORT)
+    logger.info(f"Worker metrics exporter listening on port {settings.WORKER_METRICS_PORT}.")
+
     processor = VoteMessageProcessor()
     logger.info("Starting Vote Processor Worker.")
     try:
-        processor.connect() # This call is blocking due to IOLoop.start()
+        processor.run() # Blocks; reconnects to RabbitMQ with backoff until stopped
     except KeyboardInterrupt:
-        # Graceful shutdown on Ctrl+C (relies on pika's IOLoop handling)
+        # Graceful shutdown on Ctrl+C
         logger.info("KeyboardInterrupt received. Stopping worker gracefully.")
-        processor.stop_consuming()
-        processor.close_connection() # Initiates graceful close of the connection
-        # The IOLoop will stop automatically after these close ops complete
+        processor.stop()
 
     logger.info("Worker shutdown complete.")
 
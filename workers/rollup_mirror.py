@@ -0,0 +1,41 @@
+import argparse
+import logging
+from datetime import datetime, timedelta, timezone
+
+from ..api.core.logging_config import configure_logging
+from ..api.core.vote_rollups import mirror_rollups
+
+logger = logging.getLogger(__name__)
+
+# Rebuilds the vote_rollups table for a vote_timestamp range, e.g. history from before the table
+# existed or after votes were corrected. The worker keeps recent rollups up to date on its own:
+# see api/core/vote_rollups.py. One transaction per day of votes.
+#
+# Usage: python -m workers.rollup_mirror --start 2024-05-01T00:00:00Z --end 2024-05-08T00:00:00Z
+
+
+def _parse_time(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recompute minute and hour vote rollups from the votes table.")
+    parser.add_argument("--start", type=_parse_time, required=True, help="Votes with vote_timestamp >= START (ISO 8601).")
+    parser.add_argument("--end", type=_parse_time, default=None, help="Votes with vote_timestamp < END (ISO 8601, default now).")
+    args = parser.parse_args(argv)
+
+    configure_logging("rollup-mirror")
+    end = args.end or datetime.now(timezone.utc)
+    chunk_start = args.start
+    written = 0
+    while chunk_start < end:
+        chunk_end = min(chunk_start + timedelta(days=1), end)
+        written += mirror_rollups(chunk_start, chunk_end)
+        logger.info("Rollups rebuilt up to %s.", chunk_end.isoformat())
+        chunk_start = chunk_end
+    logger.info("Wrote %d minute rollup row(s) from %s to %s.", written, args.start.isoformat(), end.isoformat())
+
+
+if __name__ == "__main__":
+    main()
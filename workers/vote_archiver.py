@@ -0,0 +1,50 @@
+import argparse
+import logging
+import sys
+from datetime import datetime, timezone
+
+from ..api.core.logging_config import configure_logging
+from ..api.core.vote_archive import ArchiveError, archive_round, delete_archived_votes, load_manifest
+
+logger = logging.getLogger(__name__)
+
+# Moves a closed election round from the votes table to Parquet files (see api/core/vote_archive.py):
+# archive and verify first, then (with --delete) remove the archived votes from the hot table.
+# Re-running with --delete for an archived round only deletes. Archived rounds are served by
+# GET /api/v1/admin/archive/rounds.
+#
+# Usage: python -m workers.vote_archiver --round 2024-spring --start 2024-03-01T00:00:00Z --end 2024-03-15T00:00:00Z --delete
+
+
+def _parse_time(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Archive the votes of a closed round to Parquet and optionally delete them.")
+    parser.add_argument("--round", required=True, help="Name of the round, e.g. 2024-spring.")
+    parser.add_argument("--start", type=_parse_time, help="First vote_timestamp of the round (ISO 8601, inclusive).")
+    parser.add_argument("--end", type=_parse_time, help="End of the round (ISO 8601, exclusive); must be in the past.")
+    parser.add_argument("--delete", action="store_true", help="Delete the archived votes from the votes table once verified.")
+    parser.add_argument("--directory", default=None, help="Archive directory (default ARCHIVE_DIR).")
+    args = parser.parse_args(argv)
+
+    configure_logging("vote-archiver")
+    try:
+        try:
+            manifest = load_manifest(args.round, args.directory)
+            logger.info("Round %s is already archived (%d votes).", args.round, manifest["rows"])
+        except ArchiveError:
+            if args.start is None or args.end is None:
+                parser.error("--start and --end are required to archive a new round")
+            archive_round(args.round, args.start, args.end, args.directory)
+        if args.delete:
+            delete_archived_votes(args.round, args.directory)
+    except ArchiveError as e:
+        logger.error("Archiving round %s failed: %s", args.round, e)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
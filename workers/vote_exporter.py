@@ -0,0 +1,50 @@
+import argparse
+import logging
+import sys
+from datetime import datetime, timezone
+
+from ..api.core.logging_config import configure_logging
+from ..api.core.vote_export import FORMATS, open_export_connection, stream_votes
+
+logger = logging.getLogger(__name__)
+
+# Dumps the votes table (joined with users and candidates) for auditors, with constant memory:
+# see api/core/vote_export.py. The same export is served by GET /api/v1/admin/votes/export.
+#
+# Usage: python -m workers.vote_exporter --format csv --start 2024-05-01T00:00:00Z --end 2024-05-02T00:00:00Z
+
+
+def _parse_time(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc) # Like the export endpoint
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream votes to a (compressed) CSV or NDJSON file.")
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument("--start", type=_parse_time, default=None, help="Only votes with vote_timestamp >= START (ISO 8601).")
+    parser.add_argument("--end", type=_parse_time, default=None, help="Only votes with vote_timestamp < END (ISO 8601).")
+    parser.add_argument("--output", default=None, help="Output file ('-' for stdout). Default: votes-<time>.<format>[.gz]")
+    parser.add_argument("--no-compress", action="store_true", help="Write plain text instead of gzip.")
+    parser.add_argument("--chunk-rows", type=int, default=None, help="Rows per server-side cursor fetch (default EXPORT_CHUNK_ROWS).")
+    args = parser.parse_args(argv)
+    if args.start is not None and args.end is not None and args.start >= args.end:
+        parser.error("--start must be before --end")
+
+    configure_logging("vote-exporter")
+    compress = not args.no_compress
+    output = args.output or f"votes-{datetime.utcnow():%Y%m%dT%H%M%SZ}.{args.format}" + (".gz" if compress else "")
+    chunks = stream_votes(open_export_connection(), args.format, args.start, args.end, compress, args.chunk_rows)
+    if output == "-":
+        for chunk in chunks:
+            sys.stdout.buffer.write(chunk)
+        sys.stdout.buffer.flush()
+        return
+    with open(output, "wb") as f:
+        for chunk in chunks:
+            f.write(chunk)
+    logger.info("Export written to %s.", output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from uuid import UUID
+from typing import Optional
+from jose import jwt, JWTError # For decoding user_token
+
+from ..api.core.config import settings
+from ..api.core.tracing import get_tracer
+
+# Core vote message validation shared by the consumer and operational tools.
+
+tracer = get_tracer(__name__)
+
+
+class InvalidVoteMessage(Exception):
+    """
+    A message that can never be processed, whatever the state of the DB.
+    `reason` is a short machine-readable code: bad_json, missing_fields, bad_data, bad_jwt.
+    """
+    def __init__(self, reason: str, detail: str):
+        super().__init__(f"{reason}: {detail}")
+        self.reason = reason
+        self.detail = detail
+        self.receipt_id: Optional[str] = None # Set when the message could be read far enough
+
+
+@dataclass
+class VoteMessage:
+    """A validated vote, ready to be written to the DB."""
+    user_identifier: str
+    candidate_id: UUID
+    vote_timestamp: str # ISO 8601 UTC string as sent by the API; DBHandler converts it
+    source_ip: Optional[str]
+    user_agent: Optional[str]
+    receipt_id: Optional[str] = None # Issued by the API; absent in messages published before receipts existed
+    flagged: bool = False # Set by the abuse detector: stored with processing_status 'validating' for review
+    is_valid: bool = True # False when the abuse detector quarantines the vote (stored, but not counted)
+
+
+def decode_user_identifier(user_token: str) -> str:
+    """
+    Decodes the user token and returns the user identifier ('user_uid' claim).
+    Expiry is not verified so votes delayed in the queue are still processed.
+    """
+    try:
+        with tracer.start_as_current_span("vote.jwt_decode"):
+            payload = jwt.decode(
+                 user_token,
+                 settings.JWT_SECRET_KEY,
+                 algorithms=[settings.JWT_ALGORITHM],
+                 options={"verify_signature": True, "verify_aud": False, "verify_iss": False, "verify_exp": False} # Don't verify expiry here
+            )
+    except JWTError as e:
+        # Invalid token means we cannot identify the user reliably.
+        raise InvalidVoteMessage("bad_jwt", f"invalid or malformed JWT: {e}")
+
+    user_identifier: Optional[str] = payload.get("user_uid") # Assuming 'user_uid' claim
+    if not user_identifier:
+        raise InvalidVoteMessage("bad_jwt", "user identifier claim ('user_uid') missing in token payload")
+    return user_identifier
+
+
+def parse_vote_message(body: bytes) -> VoteMessage:
+    """Deserializes and validates a vote message body. Raises InvalidVoteMessage."""
+    try:
+        message_data = json.loads(body)
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        raise InvalidVoteMessage("bad_json", str(e))
+    if not isinstance(message_data, dict):
+        raise InvalidVoteMessage("bad_json", "message is not a JSON object")
+
+    receipt_id = message_data.get("receipt_id")
+    if not isinstance(receipt_id, str):
+        receipt_id = None
+    try:
+        return _validate_vote_message(message_data, receipt_id)
+    except InvalidVoteMessage as e:
+        e.receipt_id = receipt_id # So the rejection can still be reported on the receipt
+        raise
+
+
+def _validate_vote_message(message_data: dict, receipt_id: Optional[str]) -> VoteMessage:
+    candidate_id_str = message_data.get("candidate_id")
+    user_token = message_data.get("user_token")
+    vote_timestamp_str = message_data.get("vote_timestamp")
+
+    # Basic validation of message structure
+    if not candidate_id_str or not user_token or not vote_timestamp_str:
+        raise InvalidVoteMessage("missing_fields", "candidate_id, user_token and vote_timestamp are required")
+
+    try:
+        candidate_id = UUID(candidate_id_str)
+    except (ValueError, TypeError, AttributeError) as e:
+        raise InvalidVoteMessage("bad_data", f"invalid candidate_id: {e}")
+    try:
+        # Parsed here rather than in DBHandler, where one bad value would fail a whole batch
+        datetime.fromisoformat(vote_timestamp_str.replace('Z', '+00:00'))
+    except (ValueError, TypeError, AttributeError) as e:
+        raise InvalidVoteMessage("bad_data", f"invalid vote_timestamp: {e}")
+
+    return VoteMessage(
+        user_identifier=decode_user_identifier(user_token),
+        candidate_id=candidate_id,
+        vote_timestamp=vote_timestamp_str,
+        source_ip=message_data.get("source_ip"),
+        user_agent=message_data.get("user_agent"),
+        receipt_id=receipt_id,
+    )